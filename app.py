@@ -1,22 +1,36 @@
+import json
 import logging
 import os
+import threading
 import traceback
 
-from flask import Flask, g, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from services import metrics
 from services.ai_service import (
+    MAX_AUDIO_BYTES,
+    QueueFullError,
+    admit_transcription,
+    cancel_admission,
     generate_text,
     generate_rewrite,
     create_transcription_job,
     create_transcription_job_from_url,
+    discard_upload_dir,
     get_transcription_job,
+    reserve_upload_dir,
+    start_job_recovery,
+    stream_transcription_job,
+    wait_for_transcription_job,
 )
 from services.auth import authenticate_request
 from services.observability import init_sentry
 from services.rewrite_registry import REWRITE_CONFIGS
+from services.audio_formats import AudioRejected, require_audio
+from services.uploads import AudioTooLarge, UploadRequest
 
 load_dotenv()
 
@@ -31,6 +45,14 @@ logger = logging.getLogger("FlaskApp")
 init_sentry()
 
 app = Flask(__name__)
+# Lets /transcribe receive its upload straight into the job's scratch directory.
+app.request_class = UploadRequest
+
+# Renews this worker's job leases and resumes jobs orphaned by dead workers.
+# Not in the encoder processes `normalise` spawns: under `python app.py` each
+# re-imports this file as __mp_main__, and must not adopt jobs of its own.
+if __name__ != "__mp_main__":
+    start_job_recovery()
 
 # Routes reachable without a Supabase session. Everything else is authenticated
 # by the before_request hook below, so a new endpoint is private by default.
@@ -89,21 +111,75 @@ def summarize_text():
     return jsonify({"summary": result})
 
 
+def _queue_full(error):
+    """503 rather than 429: the server is saturated, not this client."""
+    logger.warning(f"Transcription queue full, retry after {error.retry_after}s")
+    response = jsonify(
+        {"error": "The server is busy transcribing. Please try again shortly."}
+    )
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
+# Room for the multipart boundaries and the language/locale fields on top of the
+# audio itself, when judging an upload by its Content-Length.
+MAX_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
 @app.route("/transcribe", methods=["POST"])
 @limiter.limit("20 per hour; 5 per minute")
 def transcribe_audio():
-    """Multipart upload path, used by the mobile app."""
-    if "file" not in request.files:
-        return jsonify({"error": "file missing"}), 400
+    """Multipart upload path, used by the mobile app.
+
+    The audio is written into the job's scratch directory as it arrives,
+    so the job id is issued, and the pool's admission given, before the body
+    is read: a busy server refuses the upload before receiving any of it.
+    """
+    if (request.content_length or 0) > MAX_AUDIO_BYTES + MAX_FORM_OVERHEAD_BYTES:
+        return jsonify({"error": "Audio file is too large."}), 413
+
+    try:
+        ticket = admit_transcription(g.user_id)
+    except QueueFullError as e:
+        return _queue_full(e)
+
+    job_id, upload_dir = reserve_upload_dir()
+
+    def refuse(error, status):
+        cancel_admission(ticket)
+        discard_upload_dir(job_id)
+        return jsonify({"error": error}), status
+
+    request.stream_upload_to(upload_dir, MAX_AUDIO_BYTES)
+    try:
+        file_storage = request.files.get("file")
+        if file_storage is not None and request.upload is not None:
+            require_audio(request.upload.head)
+    except AudioTooLarge:
+        return refuse("Audio file is too large.", 413)
+    except AudioRejected as e:
+        return refuse(str(e), 415)
+    except Exception:
+        # A client that disconnects mid-upload, say: leave nothing behind.
+        cancel_admission(ticket)
+        discard_upload_dir(job_id)
+        raise
+
+    if file_storage is None:
+        return refuse("file missing", 400)
 
     try:
         job_id = create_transcription_job(
             g.user_id,
-            request.files["file"],
+            file_storage,
             language=request.form.get("language"),
             locale=request.form.get("locale"),
+            job_id=job_id,
+            ticket=ticket,
         )
         return jsonify({"job_id": job_id, "status": "pending"}), 202
+    except QueueFullError as e:
+        return _queue_full(e)
     except Exception as e:
         logger.error(f"Failed to start transcription job: {e}")
         logger.error(traceback.format_exc())
@@ -132,19 +208,58 @@ def transcribe_audio_url():
             locale=body.get("locale"),
         )
         return jsonify({"job_id": job_id, "status": "pending"}), 202
+    except QueueFullError as e:
+        return _queue_full(e)
+    except AudioRejected as e:
+        # Too large, empty or not audio: the client's input, not our failure.
+        return jsonify({"error": str(e)}), 422
     except Exception as e:
         logger.error(f"Failed to start transcription job from url: {e}")
         logger.error(traceback.format_exc())
         return jsonify({"error": "Could not start transcription."}), 500
 
 
+# Longest a status request may be held open with ?wait=. Kept under the usual
+# 60s proxy idle timeout.
+MAX_STATUS_WAIT_SECONDS = 30
+
+# ?wait= requests held at once in this process. Each holds a gthread thread,
+# like an SSE stream; past this, a request is answered at once, as a plain poll.
+MAX_STATUS_WAITS = int(os.getenv("STATUS_WAIT_MAX_OPEN") or 8)
+_status_waits = threading.BoundedSemaphore(MAX_STATUS_WAITS)
+
+# An SSE stream ends after this long; EventSource reconnects on its own if the
+# job is still running. Kept short because every open stream holds one of the
+# worker's gthread threads, which rewrite and upload requests need too.
+MAX_STATUS_STREAM_SECONDS = 2 * 60
+
+# Comment lines sent on an idle stream so proxies don't cut it.
+STATUS_STREAM_HEARTBEAT_SECONDS = 15
+
+# SSE streams open at once in this process; further ones are refused with a
+# 503 that points the client at ?wait= long-polling, which hands its thread
+# back every 30s at most. Keep it well under the gunicorn --threads count.
+MAX_STATUS_STREAMS = int(os.getenv("STATUS_STREAM_MAX_OPEN") or 8)
+_status_streams = threading.BoundedSemaphore(MAX_STATUS_STREAMS)
+
+
 @app.route("/transcribe/status/<job_id>", methods=["GET"])
 # Clients poll this every 2s for up to 15 minutes, so it must sit outside the
 # default limits or a single normal transcription would rate-limit itself.
 @limiter.exempt
 def transcribe_status(job_id):
+    """The job's state. With ?wait=N (seconds, up to 30) an unfinished job is
+    held until its status changes, so clients need not poll every 2s."""
+    try:
+        wait = float(request.args.get("wait") or 0)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    wait = min(max(wait, 0.0), MAX_STATUS_WAIT_SECONDS)
+
     try:
         job = get_transcription_job(job_id, g.user_id)
+        if job is not None and wait > 0:
+            job = _wait_for_status(job_id, job, wait)
     except Exception as e:
         logger.error(f"Failed to read transcription job {job_id}: {e}")
         return jsonify({"error": "Could not read the job status."}), 503
@@ -157,6 +272,74 @@ def transcribe_status(job_id):
     return jsonify(job)
 
 
+def _wait_for_status(job_id, job, wait):
+    if not _status_waits.acquire(blocking=False):
+        logger.info(f"Not holding a status request: {MAX_STATUS_WAITS} already waiting")
+        return job
+    try:
+        return wait_for_transcription_job(job_id, g.user_id, job, wait)
+    finally:
+        _status_waits.release()
+
+
+@app.route("/transcribe/status/<job_id>/events", methods=["GET"])
+@limiter.exempt
+def transcribe_status_events(job_id):
+    """Server-Sent Events: one `status` event per state, ending when the job
+    finishes."""
+    user_id = g.user_id
+    try:
+        job = get_transcription_job(job_id, user_id)
+    except Exception as e:
+        logger.error(f"Failed to read transcription job {job_id}: {e}")
+        return jsonify({"error": "Could not read the job status."}), 503
+
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+
+    if not _status_streams.acquire(blocking=False):
+        logger.warning(f"Refusing a status stream: {MAX_STATUS_STREAMS} already open")
+        response = jsonify({
+            "error": "Too many open status streams. "
+            f"Use /transcribe/status/{job_id}?wait={MAX_STATUS_WAIT_SECONDS} instead."
+        })
+        response.headers["Retry-After"] = str(STATUS_STREAM_HEARTBEAT_SECONDS)
+        return response, 503
+
+    def events():
+        try:
+            for state in stream_transcription_job(
+                job_id,
+                user_id,
+                job,
+                MAX_STATUS_STREAM_SECONDS,
+                STATUS_STREAM_HEARTBEAT_SECONDS,
+            ):
+                if state is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: status\ndata: {json.dumps(state)}\n\n"
+        except Exception as e:
+            logger.error(f"Status stream for job {job_id} failed: {e}")
+            yield "event: error\ndata: {}\n\n"
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Runs however the stream ends, including a client that goes away.
+    response.call_on_close(_status_streams.release)
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+@limiter.exempt
+def process_metrics():
+    """Queue depth, worker usage and friends for the answering process."""
+    return jsonify(metrics.snapshot())
+
+
 # ============================================================
 # Shared helper — all rewrite routes use this
 # ============================================================
@@ -0,0 +1,64 @@
+"""Local stand-in servers for the benchmarks in this directory.
+
+Nothing here is imported by the app. The servers are deliberately minimal:
+they exist to put a real socket (and optionally a real TLS handshake) between
+the client code being measured and its response.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple, Type
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1; BaseHTTPRequestHandler defaults to 1.0.
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs
+    # add ~40 ms to every kept-alive response and swamp what is measured.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+        pass
+
+
+def self_signed_context() -> Optional[ssl.SSLContext]:
+    """A server TLS context with a throwaway certificate, or None when the
+    openssl CLI isn't available to make one."""
+    if shutil.which("openssl") is None:
+        return None
+
+    directory = tempfile.mkdtemp(prefix="bench-tls-")
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def serve(
+    handler: Type[BaseHTTPRequestHandler], tls: Optional[ssl.SSLContext] = None
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Starts [handler] on a free localhost port. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if tls is not None:
+        server.socket = tls.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
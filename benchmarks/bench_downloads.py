@@ -0,0 +1,125 @@
+"""Download time of a large recording: one streamed GET vs parallel ranges.
+
+    python benchmarks/bench_downloads.py [--mb 120] [--per-connection-mbps 200]
+
+Serves a random file from a localhost stand-in that honours `Range` and caps
+each connection's throughput, the way an object store or CDN edge does, then
+times the old single-stream download (`httpx.stream`, as `_download_audio` used
+to) against `services.downloads.download` at a few connection counts. Also
+drops one connection partway through to show the resumed download finishing
+without starting over.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from benchmarks._standin import QuietHandler, serve  # noqa: E402
+from services import downloads  # noqa: E402
+
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def make_handler(body: bytes, bytes_per_second: float, drop_at: list):
+    class RangeHandler(QuietHandler):
+        def do_GET(self):
+            first, last = 0, len(body) - 1
+            match = _RANGE.match(self.headers.get("Range", ""))
+            if match:
+                first = int(match.group(1))
+                if match.group(2):
+                    last = min(int(match.group(2)), last)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {first}-{last}/{len(body)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(last - first + 1))
+            self.end_headers()
+
+            slice_bytes = 64 * 1024
+            started = time.perf_counter()
+            sent = 0
+            for offset in range(first, last + 1, slice_bytes):
+                piece = body[offset : min(offset + slice_bytes, last + 1)]
+                if drop_at and first < drop_at[0] <= offset:
+                    drop_at.clear()
+                    self.close_connection = True
+                    return
+                self.wfile.write(piece)
+                sent += len(piece)
+                # Throttle to the per-connection rate.
+                ahead = sent / bytes_per_second - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    return RangeHandler
+
+
+def single_stream(url: str, destination: str) -> str:
+    digest = hashlib.sha256()
+    with httpx.stream("GET", url, timeout=120.0) as response:
+        response.raise_for_status()
+        with open(destination, "wb") as handle:
+            for chunk in response.iter_bytes(chunk_size=1024 * 256):
+                digest.update(chunk)
+                handle.write(chunk)
+    return digest.hexdigest()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=120)
+    parser.add_argument("--per-connection-mbps", type=float, default=200.0)
+    args = parser.parse_args()
+
+    # An m4a header so the download's container sniffing accepts it.
+    body = b"\x00\x00\x00\x18ftypM4A " + os.urandom(args.mb * 1024 * 1024 - 12)
+    expected = hashlib.sha256(body).hexdigest()
+    drop_at: list = []
+    server, base_url = serve(
+        make_handler(body, args.per_connection_mbps * 1_000_000 / 8, drop_at)
+    )
+    url = f"{base_url}/audio.m4a"
+    destination = os.path.join(tempfile.mkdtemp(prefix="bench-dl-"), "audio.m4a")
+
+    print(f"{args.mb} MB, {args.per_connection_mbps:g} Mbit/s per connection")
+
+    def report(label, run):
+        started = time.perf_counter()
+        digest = run()
+        elapsed = time.perf_counter() - started
+        assert digest == expected, f"{label}: wrong bytes"
+        print(f"  {label:<28} {elapsed:6.2f} s  {args.mb / elapsed:7.1f} MB/s")
+
+    try:
+        report("single stream", lambda: single_stream(url, destination))
+        for connections in (1, 4, 8):
+            report(
+                f"ranged, {connections} connection(s)",
+                lambda: downloads.download(
+                    url, destination, max_bytes=len(body), connections=connections
+                ).sha256,
+            )
+        drop_at.append(len(body) // 2)
+        report(
+            "ranged, 4, one drop",
+            lambda: downloads.download(
+                url, destination, max_bytes=len(body), connections=4
+            ).sha256,
+        )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
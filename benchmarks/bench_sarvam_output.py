@@ -0,0 +1,137 @@
+"""Memory and time to turn a large Sarvam job output into a transcript.
+
+    python benchmarks/bench_sarvam_output.py [--hours 4]
+
+Builds a synthetic diarized output for a recording of the given length (an
+entry every few seconds, with the per-entry fields Sarvam sends, and word
+timestamps for the whole recording) and serves it from a localhost stand-in.
+Then measures the old path against the new:
+
+  file + json.load   download to a file, `json.load` it whole, `_parse` (what
+                     `download_outputs` and the provider used to do)
+  streamed           `sarvam_provider._fetch`: `_parse` over a `SarvamOutput`
+                     reading the response as it arrives
+
+Peak memory is Python allocations during each run, from `tracemalloc`; both
+produce the same transcript, which is checked.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from benchmarks._standin import QuietHandler, serve  # noqa: E402
+from services.stt import sarvam_provider  # noqa: E402
+
+_WORDS = (
+    "haan theek hai main kal office aaunga meeting ka time kya hai please "
+    "send the report by friday accha bilkul sure let me check and confirm"
+).split()
+
+
+def synthetic_output(hours: float) -> bytes:
+    rng = random.Random(7)
+    entries = []
+    words, starts, ends = [], [], []
+    at = 0.0
+    while at < hours * 3600:
+        length = rng.uniform(2, 9)
+        spoken = [rng.choice(_WORDS) for _ in range(int(length * 2.5))]
+        for index, word in enumerate(spoken):
+            words.append(word)
+            starts.append(round(at + index * length / len(spoken), 2))
+            ends.append(round(at + (index + 1) * length / len(spoken), 2))
+        text = " ".join(spoken)
+        entries.append({
+            "transcript": text,
+            "start_time_seconds": round(at, 2),
+            "end_time_seconds": round(at + length, 2),
+            "speaker_id": f"SPEAKER_{rng.randrange(3):02d}",
+        })
+        at += length
+    payload = {
+        "request_id": "bench",
+        "transcript": " ".join(entry["transcript"] for entry in entries),
+        "language_code": "hi-IN",
+        "timestamps": {"words": words, "start_time_seconds": starts, "end_time_seconds": ends},
+        "diarized_transcript": {"entries": entries},
+    }
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def make_handler(body: bytes):
+    class OutputHandler(QuietHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            for offset in range(0, len(body), 64 * 1024):
+                self.wfile.write(body[offset : offset + 64 * 1024])
+
+    return OutputHandler
+
+
+def via_file(url: str, directory: str):
+    path = os.path.join(directory, "output.json")
+    response = httpx.get(url, timeout=120.0)
+    response.raise_for_status()
+    with open(path, "wb") as handle:
+        handle.write(response.content)
+    del response
+    with open(path, "r", encoding="utf-8") as handle:
+        payload = json.load(handle)
+    return sarvam_provider._parse(payload, "hi")
+
+
+def streamed(url: str, directory: str):
+    return sarvam_provider._fetch(url, "hi")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=4)
+    args = parser.parse_args()
+
+    body = synthetic_output(args.hours)
+    server, base_url = serve(make_handler(body))
+    url = f"{base_url}/0.json"
+    directory = tempfile.mkdtemp(prefix="bench-sarvam-")
+    print(f"{args.hours:g} h of diarized output: {len(body) / 1e6:.1f} MB of JSON")
+
+    results = {}
+    try:
+        for label, run in (("file + json.load", via_file), ("streamed", streamed)):
+            tracemalloc.start()
+            started = time.perf_counter()
+            results[label] = run(url, directory)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            segments = len(results[label].segments)
+            print(
+                f"  {label:<18} {elapsed:6.2f} s  peak {peak / 1e6:7.1f} MB"
+                f"  ({segments} segments)"
+            )
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    first, second = results.values()
+    assert first == second, "the two paths disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Per-call latency of Supabase requests: one-shot httpx calls vs the pooled client.
+
+    python benchmarks/bench_supabase_client.py [--calls 300] [--plain-http]
+
+Runs a PostgREST-shaped stand-in on localhost, over TLS with a throwaway
+certificate when openssl is available, and times the same GET made the old way
+(`httpx.get`, a new connection and handshake per call) and through
+`services.supabase_http`. Localhost hides network round trips, so against the
+real Supabase the gap is wider: each avoided handshake there costs one or two
+RTTs on top of the CPU measured here.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from benchmarks._standin import QuietHandler, self_signed_context, serve  # noqa: E402
+from services import supabase_http  # noqa: E402
+
+_BODY = json.dumps(
+    [{"id": "job-1", "user_id": "user-1", "status": "processing",
+      "transcript": None, "error": None}]
+).encode()
+
+
+class PostgrestHandler(QuietHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+
+def _time(call, calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        response = call()
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * 0.95)],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--plain-http", action="store_true")
+    args = parser.parse_args()
+
+    tls = None if args.plain_http else self_signed_context()
+    server, base_url = serve(PostgrestHandler, tls)
+    url = f"{base_url}/rest/v1/transcription_jobs?id=eq.job-1"
+
+    # The stand-in's certificate is self-signed; verification is not what is
+    # being measured, and both sides skip it equally.
+    pooled = supabase_http.build_client(verify=False)
+
+    results = {
+        "one-shot httpx.get": _time(
+            lambda: httpx.get(url, verify=False, timeout=15.0), args.calls
+        ),
+        "pooled client": _time(lambda: pooled.get(url, timeout=15.0), args.calls),
+    }
+    server.shutdown()
+
+    print(f"{args.calls} GETs against {base_url} ({'TLS' if tls else 'plain HTTP'})")
+    for name, stats in results.items():
+        print(
+            f"  {name:<20} mean {stats['mean_ms']:6.2f} ms"
+            f"   p50 {stats['p50_ms']:6.2f} ms   p95 {stats['p95_ms']:6.2f} ms"
+        )
+    speedup = results["one-shot httpx.get"]["mean_ms"] / results["pooled client"]["mean_ms"]
+    print(f"  pooled client is {speedup:.1f}x faster per call")
+
+
+if __name__ == "__main__":
+    main()
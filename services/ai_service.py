@@ -1,14 +1,33 @@
+import asyncio
 import os
 import shutil
 import logging
+import time
 import traceback
-import threading
-import httpx
 from dotenv import load_dotenv
 from openai import OpenAI
 
-from services import stt
-from services.job_store import create_job, get_job, update_job
+from services import audio_formats, downloads, job_events, job_leases, stt
+from services.job_store import (
+    LEASE_SECONDS,
+    JobStoreError,
+    claim_job,
+    create_job,
+    get_job,
+    get_job_statuses,
+    job_inserted,
+    list_expired_jobs,
+    list_unclaimed_jobs,
+    new_job_id,
+    release_job,
+    update_job,
+)
+from services.transcript_cache import cache_key, in_flight, transcripts
+from services.transcription_pool import get_pool
+from services.uploads import PARTIAL_SUFFIX, AudioUpload
+
+# Re-exported so the routes can map a refusal to 503 without importing the pool.
+from services.transcription_pool import QueueFullError  # noqa: F401
 
 # Re-exported: this module was the historical home of the error type.
 from services.stt import TranscriptionError  # noqa: F401
@@ -18,107 +37,479 @@ logger = logging.getLogger("AI_Service")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Guards against a malicious or accidental multi-gigabyte download.
+# Guards against a malicious or accidental multi-gigabyte download or upload.
 MAX_AUDIO_BYTES = 500 * 1024 * 1024
 
+# Where uploaded audio waits for its worker. It must outlive the process that
+# received it, so a job orphaned by a restart can be resumed by another worker;
+# point this at a persistent disk where deploys would otherwise wipe it.
+JOB_SCRATCH_DIR = os.getenv("JOB_SCRATCH_DIR") or "temp_jobs"
+
+# A job that has killed its worker this many times is failed, not retried.
+MAX_JOB_ATTEMPTS = 3
+
+# "inline": the web process that accepts a job also transcribes it.
+# "queue": the web tier only saves the audio and records a pending job, and
+# separate `python -m services.worker` processes claim and run it.
+TRANSCRIPTION_MODE = (os.getenv("TRANSCRIPTION_MODE") or "inline").strip().lower()
+
 _openai_client = None
 
 
 def _job_dir(job_id):
-    path = os.path.join("temp_jobs", job_id)
+    path = os.path.join(JOB_SCRATCH_DIR, job_id)
     os.makedirs(path, exist_ok=True)
     return path
 
 
-def create_transcription_job(user_id, file_storage, language=None, locale=None):
+def _audio_size(path):
+    """Scheduling cost of a recording; missing files sort first and fail fast."""
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _find_job_audio(job_id):
+    """The saved recording for [job_id], or None if the scratch copy is gone
+    or never finished arriving."""
+    path = os.path.join(JOB_SCRATCH_DIR, job_id)
+    try:
+        names = sorted(os.listdir(path))
+    except FileNotFoundError:
+        return None
+    for name in names:
+        if name.endswith(PARTIAL_SUFFIX):
+            continue
+        candidate = os.path.join(path, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _audio_arriving(job_id):
+    """True while [job_id]'s recording is still being written: its scratch
+    directory holds a partial file touched within a lease. One left behind by
+    a process that died stops counting once the lease would have lapsed."""
+    path = os.path.join(JOB_SCRATCH_DIR, job_id)
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return False
+    for name in names:
+        if not name.endswith(PARTIAL_SUFFIX):
+            continue
+        try:
+            modified = os.path.getmtime(os.path.join(path, name))
+        except FileNotFoundError:
+            continue
+        if time.time() - modified < LEASE_SECONDS:
+            return True
+    return False
+
+
+def reserve_upload_dir():
+    """A fresh job id and its scratch directory, for an upload to be streamed
+    into before the job itself is created."""
+    job_id = new_job_id()
+    return job_id, _job_dir(job_id)
+
+
+def discard_upload_dir(job_id):
+    shutil.rmtree(os.path.join(JOB_SCRATCH_DIR, job_id), ignore_errors=True)
+
+
+def create_transcription_job(
+    user_id, file_storage, language=None, locale=None, job_id=None, ticket=None
+):
     """Starts a job from a direct multipart upload (used by the mobile app).
 
     [language] is the user's Settings choice (None or "auto" to detect) and
     [locale] is the device locale; together they pick the STT provider.
+    [job_id] comes from `reserve_upload_dir` when the upload was streamed
+    straight into its scratch directory, and [ticket] from an
+    `admit_transcription` made before it was.
+
+    Without a [ticket], raises QueueFullError before creating anything when
+    this process already has as much transcription work as it can take.
     """
-    job_id = create_job(user_id, requested_language=language)
-    temp_dir = _job_dir(job_id)
-    filename = os.path.basename(file_storage.filename or "audio.m4a")
-    temp_audio_path = os.path.join(temp_dir, filename)
-    file_storage.save(temp_audio_path)
+    try:
+        if ticket is None:
+            ticket = admit_transcription(user_id)
+        job_id = _create_job(user_id, language, locale, job_id=job_id)
+        temp_dir = _job_dir(job_id)
+        temp_audio_path, audio_sha256 = _place_upload(file_storage, temp_dir)
+    except Exception:
+        cancel_admission(ticket)
+        if job_id:
+            discard_upload_dir(job_id)
+        raise
 
-    _start_worker(job_id, temp_audio_path, temp_dir, language, locale)
+    _dispatch(ticket, job_id, temp_audio_path, temp_dir, language, locale, audio_sha256)
     return job_id
 
 
+def _place_upload(file_storage, temp_dir):
+    """Path of the uploaded audio inside [temp_dir], copying it there only if
+    it was not already received in place, and its SHA-256 if known."""
+    stream = file_storage.stream
+    if isinstance(stream, AudioUpload) and os.path.dirname(stream.path) == temp_dir:
+        stream.finish()
+        logger.info(f"Received {stream.size} byte upload, sha256 {stream.sha256}")
+        container = audio_formats.sniff(stream.head)
+        if container is None:
+            return stream.path, stream.sha256
+        return _name_for_container(stream.path, container), stream.sha256
+
+    filename = os.path.basename(file_storage.filename or "audio.m4a")
+    temp_audio_path = os.path.join(temp_dir, filename)
+    file_storage.save(temp_audio_path + PARTIAL_SUFFIX)
+    os.replace(temp_audio_path + PARTIAL_SUFFIX, temp_audio_path)
+    return temp_audio_path, None
+
+
 def create_transcription_job_from_url(user_id, audio_url, language=None, locale=None):
     """Starts a job from a Storage object (used by the web app).
 
     The browser uploads straight to Supabase Storage, which sidesteps the 4.5 MB
     serverless request body limit that a proxied upload would hit.
     """
-    job_id = create_job(user_id, requested_language=language)
-    temp_dir = _job_dir(job_id)
+    ticket = admit_transcription(user_id)
+    try:
+        job_id = _create_job(user_id, language, locale)
+    except Exception:
+        cancel_admission(ticket)
+        raise
 
+    temp_dir = _job_dir(job_id)
     try:
-        temp_audio_path = _download_audio(audio_url, temp_dir)
+        temp_audio_path, audio_sha256 = _download_audio(audio_url, temp_dir)
     except Exception as e:
+        cancel_admission(ticket)
         shutil.rmtree(temp_dir, ignore_errors=True)
         update_job(job_id, status="failed", error=str(e))
         raise
 
-    _start_worker(job_id, temp_audio_path, temp_dir, language, locale)
+    _dispatch(ticket, job_id, temp_audio_path, temp_dir, language, locale, audio_sha256)
     return job_id
 
 
-def _download_audio(audio_url, temp_dir):
-    extension = os.path.splitext(audio_url.split("?")[0])[1] or ".m4a"
-    destination = os.path.join(temp_dir, f"audio{extension}")
-
-    written = 0
-    with httpx.stream("GET", audio_url, timeout=120.0, follow_redirects=True) as response:
-        response.raise_for_status()
-        with open(destination, "wb") as handle:
-            for chunk in response.iter_bytes(chunk_size=1024 * 256):
-                written += len(chunk)
-                if written > MAX_AUDIO_BYTES:
-                    raise ValueError("That recording is too large to transcribe.")
-                handle.write(chunk)
-
-    if written == 0:
-        raise ValueError("The recording was empty.")
-
-    return destination
-
-
-def _start_worker(job_id, temp_audio_path, temp_dir, language=None, locale=None):
-    thread = threading.Thread(
-        target=_run_transcription_job,
-        args=(job_id, temp_audio_path, temp_dir, language, locale),
-        daemon=True,
+def queued_mode():
+    """True when `services.worker` processes, not the web tier, run jobs."""
+    return TRANSCRIPTION_MODE == "queue"
+
+
+def admit_transcription(user_id):
+    """A pool ticket for inline mode; None when a worker process will run it.
+
+    Raises QueueFullError when this process already has as much transcription
+    work as it can take. Give the ticket to `create_transcription_job`, or hand
+    it back with `cancel_admission`.
+    """
+    return None if queued_mode() else get_pool().admit(user_id)
+
+
+def cancel_admission(ticket):
+    if ticket is not None:
+        ticket.cancel()
+
+
+def _create_job(user_id, language, locale, job_id=None):
+    # Leased to this process even when queued: an unleased row is what the
+    # workers claim, and its audio has not arrived yet. `_dispatch` releases it.
+    return create_job(
+        user_id,
+        requested_language=language,
+        requested_locale=locale,
+        lease_owner=job_leases.lease_owner(),
+        job_id=job_id,
+    )
+
+
+def _dispatch(ticket, job_id, temp_audio_path, temp_dir, language, locale, audio_sha256=None):
+    container = audio_formats.container_of(temp_audio_path)
+    if container is not None:
+        update_job(job_id, audio_container=container)
+
+    key = cache_key(audio_sha256, language, locale) if audio_sha256 else None
+    if key is not None and _reuse_transcription(ticket, job_id, temp_dir, key):
+        return
+
+    if ticket is None:
+        release_job(job_id, job_leases.lease_owner())
+        logger.info(f"Queued transcription job {job_id} for a worker")
+        return
+    ticket.submit(
+        _run_transcription_job,
+        job_id,
+        temp_audio_path,
+        temp_dir,
+        language,
+        locale,
+        key,
+        cost=os.path.getsize(temp_audio_path),
     )
-    thread.start()
+
+
+def _reuse_transcription(ticket, job_id, temp_dir, key):
+    """Settles [job_id] from an identical earlier recording instead of
+    transcribing it, if there is one. True when it did.
+
+    A stored transcript completes the job at once. Otherwise, in inline mode,
+    the job is attached to a job here already transcribing the same audio, or
+    becomes the one that others attach to.
+    """
+    cached = transcripts.get(key)
+    if cached is None and (ticket is None or not in_flight.join(key, job_id)):
+        return False
+
+    cancel_admission(ticket)
+    if cached is not None:
+        logger.info(f"Transcription job {job_id} served from the transcript cache")
+        _complete(job_id, cached)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    else:
+        # The audio stays until the job it is attached to settles this one:
+        # should that job's process die first, recovery retries this one from it.
+        logger.info(f"Transcription job {job_id} attached to an identical job in flight")
+    return True
+
+
+def _download_audio(audio_url, temp_dir):
+    """Downloads [audio_url] into [temp_dir]. Returns (path, sha256).
+
+    Raises audio_formats.AudioRejected for input that is too large, empty or
+    not audio, usually after reading only its first few KB.
+    """
+    destination = os.path.join(temp_dir, "audio" + PARTIAL_SUFFIX)
+    fetched = downloads.download(audio_url, destination, MAX_AUDIO_BYTES)
+    return _name_for_container(destination, fetched.container), fetched.sha256
+
+
+def _name_for_container(path, container):
+    """Renames the job's audio to carry its container as its extension, which
+    is how later stages (and the providers) learn the format without probing."""
+    named = os.path.splitext(path)[0] + audio_formats.extension_for(container)
+    if named != path:
+        os.replace(path, named)
+    return named
 
 
 def get_transcription_job(job_id, user_id):
     return get_job(job_id, user_id)
 
 
-def _run_transcription_job(job_id, temp_audio_path, temp_dir, language=None, locale=None):
+def wait_for_transcription_job(job_id, user_id, job, timeout):
+    """Returns [job] re-read once its status changes, or unchanged at [timeout].
+
+    [job] is the caller's current view. Finished jobs return at once.
+    """
+    if job is None or job_events.is_terminal(job.get("status")):
+        return job
+    if not job_events.wait_for_change(
+        job_id, job.get("status"), timeout, get_job_statuses
+    ):
+        return job
+    return get_job(job_id, user_id)
+
+
+def stream_transcription_job(job_id, user_id, job, max_seconds, heartbeat_seconds):
+    """Yields [job] and then each new state of it, until it finishes.
+
+    Yields None every [heartbeat_seconds] without a change, so the caller can
+    keep the connection alive, and stops after [max_seconds] regardless.
+    """
+    deadline = time.monotonic() + max_seconds
+    yield job
+
+    while job is not None and not job_events.is_terminal(job.get("status")):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        latest = wait_for_transcription_job(
+            job_id, user_id, job, min(heartbeat_seconds, remaining)
+        )
+        if latest is job:
+            yield None
+            continue
+        if latest is None:
+            # Deleted under us; the client's next plain read will say 404.
+            return
+        job = latest
+        yield job
+
+
+def start_job_recovery(force=False):
+    """Starts lease renewal and orphan recovery for this process.
+
+    A web process in queue mode runs no jobs, so it has nothing to renew and no
+    business adopting orphans; the worker processes do that. [force] is how the
+    worker entry point opts in regardless of mode.
+    """
+    if queued_mode() and not force:
+        return False
+    return job_leases.start(recover_orphaned_jobs)
+
+
+def claim_pending_jobs():
+    """Claims jobs queued by the web tier, as many as the pool can start.
+
+    Used by `services.worker`. Returns the number claimed.
+    """
+    return _claim_into_pool(list_unclaimed_jobs())
+
+
+def recover_orphaned_jobs():
+    """Claims jobs whose worker died and queues them here. Returns the count.
+
+    Stops early when the local pool is full: leaving an orphan for a less busy
+    process beats claiming it and letting it sit in this one's queue.
+    """
+    return _claim_into_pool(list_expired_jobs())
+
+
+def _claim_into_pool(jobs):
+    """Claims [jobs] into the local pool, shortest recording first.
+
+    Skips users already at their running cap here, leaving those jobs to a
+    process with fewer of theirs in flight.
+    """
+    owner = job_leases.lease_owner()
+    pool = get_pool()
+    resumed = 0
+
+    candidates = [(job, _find_job_audio(job["id"])) for job in jobs]
+    candidates.sort(key=lambda pair: _audio_size(pair[1]))
+
+    for job, audio_path in candidates:
+        job_id = job["id"]
+
+        # Its web process may have stopped renewing the lease, but not writing.
+        if audio_path is None and _audio_arriving(job_id):
+            continue
+
+        if audio_path is None or (job.get("attempts") or 0) >= MAX_JOB_ATTEMPTS:
+            if claim_job(job, owner):
+                reason = (
+                    "The recording was lost before it could be transcribed. "
+                    "Please try again."
+                    if audio_path is None
+                    else "Transcription kept failing. Please try again."
+                )
+                logger.warning(f"Abandoning transcription job {job_id}: {reason}")
+                update_job(job_id, status="failed", error=reason)
+                shutil.rmtree(os.path.join(JOB_SCRATCH_DIR, job_id), ignore_errors=True)
+            continue
+
+        user_id = job.get("user_id")
+        if pool.running_for(user_id) >= pool.max_running_per_user:
+            continue
+
+        try:
+            ticket = pool.admit(user_id)
+        except QueueFullError:
+            break
+
+        if not claim_job(job, owner):
+            ticket.cancel()
+            continue
+
+        logger.info(f"Claimed transcription job {job_id}")
+        ticket.submit(
+            _run_transcription_job_async if pool.on_loop else _run_transcription_job,
+            job_id,
+            audio_path,
+            os.path.dirname(audio_path),
+            job.get("requested_language"),
+            job.get("requested_locale"),
+            cost=_audio_size(audio_path),
+        )
+        resumed += 1
+
+    return resumed
+
+
+def _run_transcription_job(
+    job_id, temp_audio_path, temp_dir, language=None, locale=None, cache_key=None
+):
+    """Transcribes one job. With a [cache_key], the result is stored for
+    repeats of the same audio and given to any jobs attached to this one."""
+    attached = []
     try:
+        _require_row(job_id)
         update_job(job_id, status="processing")
         result = stt.transcribe(temp_audio_path, language=language, locale=locale)
-        # Recording which provider ran is the difference between diagnosing a bad
-        # transcript and guessing at it.
-        update_job(
-            job_id,
-            status="complete",
-            transcript=result.to_text(),
-            provider=result.provider,
+        if cache_key is not None:
+            _remember(cache_key, result, language, locale)
+            attached = in_flight.finish(cache_key)
+        for settled_id in [job_id, *attached]:
+            _complete(settled_id, result)
+            _discard_attached_audio(settled_id, job_id)
+    except Exception as e:
+        logger.error(f"Transcription job {job_id} failed: {e}")
+        logger.error(traceback.format_exc())
+        if cache_key is not None and not attached:
+            attached = in_flight.finish(cache_key)
+        for settled_id in [job_id, *attached]:
+            update_job(settled_id, status="failed", error=str(e))
+            _discard_attached_audio(settled_id, job_id)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _discard_attached_audio(settled_id, job_id):
+    # An attached job's own copy of the audio, kept until it was settled.
+    if settled_id != job_id:
+        shutil.rmtree(os.path.join(JOB_SCRATCH_DIR, settled_id), ignore_errors=True)
+
+
+async def _run_transcription_job_async(
+    job_id, temp_audio_path, temp_dir, language=None, locale=None
+):
+    """`_run_transcription_job` as a task on a `LoopPool`'s event loop, for a
+    job claimed from the store. The job store's requests run on helper threads;
+    the transcription itself holds none while it waits on a vendor."""
+    try:
+        await asyncio.to_thread(_require_row, job_id)
+        await asyncio.to_thread(update_job, job_id, status="processing")
+        result = await stt.transcribe_async(
+            temp_audio_path, language=language, locale=locale
         )
+        await asyncio.to_thread(_complete, job_id, result)
     except Exception as e:
         logger.error(f"Transcription job {job_id} failed: {e}")
         logger.error(traceback.format_exc())
-        update_job(job_id, status="failed", error=str(e))
+        await asyncio.to_thread(update_job, job_id, status="failed", error=str(e))
     finally:
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+def _require_row(job_id):
+    # A job whose row was never created has nowhere to put its transcript;
+    # transcribing it would only pay the vendor for a result nobody can read.
+    if not job_inserted(job_id):
+        raise JobStoreError(
+            "The transcription job could not be saved. Please try again."
+        )
+
+
+def _remember(cache_key, result, language, locale):
+    # Only a clean first-choice transcript is worth pinning: an empty one may
+    # be a provider that choked quietly, and a fallback's is a degraded one.
+    chain = stt.provider_chain(language, locale)
+    if not result.is_empty and chain and result.provider == chain[0]:
+        transcripts.put(cache_key, result)
+
+
+def _complete(job_id, result):
+    # Recording which provider ran, and what the pipeline spent getting there,
+    # is the difference between diagnosing a bad transcript and guessing at it.
+    fields = {"transcript": result.to_text(), "provider": result.provider}
+    if result.stats:
+        fields["stt_stats"] = result.stats
+    update_job(job_id, status="complete", **fields)
+
+
 def _get_openai_client():
     global _openai_client
     if _openai_client is None:
@@ -0,0 +1,115 @@
+"""Recognises audio containers from their first bytes, and rejects the rest.
+
+A URL to an HTML error page, a PDF or a photo used to be downloaded in full and
+handed to Sarvam or OpenAI, which rejected it minutes later with an error the
+user could not act on. The download and upload paths now look at the response
+headers and the first few KB before committing to anything, and fail at once
+with a message that says what is wrong.
+
+The container found is kept as the audio file's extension in the job
+directory (`extension_for`), so later stages, a resumed job included, know it
+without probing again. Providers infer the format from the file name too.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+# How much of the start of a file `sniff` needs to see.
+SNIFF_BYTES = 4096
+
+# container -> extension the audio file is stored under.
+_EXTENSIONS = {
+    "mp4": ".m4a",
+    "ogg": ".ogg",
+    "webm": ".webm",
+    "matroska": ".mka",
+    "wav": ".wav",
+    "mp3": ".mp3",
+    "aac": ".aac",
+    "flac": ".flac",
+    "amr": ".amr",
+    "caf": ".caf",
+    "asf": ".wma",
+}
+
+_NOT_AUDIO_TYPES = ("text/", "image/", "application/json", "application/pdf",
+                    "application/xml", "application/zip", "application/javascript")
+
+_ASF_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+
+
+class AudioRejected(ValueError):
+    """The input will not be transcribed. Message is safe to show the user."""
+
+
+class TooLarge(AudioRejected):
+    def __init__(self, message: str = "That recording is too large to transcribe."):
+        super().__init__(message)
+
+
+class NotAudio(AudioRejected):
+    def __init__(self, message: str = "That file doesn't look like an audio recording."):
+        super().__init__(message)
+
+
+class Empty(AudioRejected):
+    def __init__(self, message: str = "The recording was empty."):
+        super().__init__(message)
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """The container [head], the first SNIFF_BYTES of a file, belongs to."""
+    if len(head) >= 12 and head[4:8] == b"ftyp":
+        return "mp4"  # m4a, mp4, mov and 3gp all use ISO base media boxes
+    if head.startswith(b"OggS"):
+        return "ogg"  # opus and vorbis alike
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm" if b"webm" in head[:64] else "matroska"
+    if len(head) >= 12 and head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "wav"
+    if head.startswith(b"fLaC"):
+        return "flac"
+    if head.startswith(b"#!AMR"):
+        return "amr"
+    if head.startswith(b"caff"):
+        return "caf"
+    if head.startswith(_ASF_GUID):
+        return "asf"
+    if head.startswith(b"ID3"):
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # MPEG frame sync. Layer bits 00 mean ADTS AAC rather than MP3.
+        return "aac" if head[1] & 0x06 == 0 else "mp3"
+    return None
+
+
+def require_audio(head: bytes) -> str:
+    """The container of [head], or NotAudio. Empty input is Empty."""
+    if not head:
+        raise Empty()
+    container = sniff(head)
+    if container is None:
+        raise NotAudio()
+    return container
+
+
+def check_content_type(content_type: Optional[str]) -> None:
+    """Rejects a declared type that is certainly not audio. Absent and generic
+    types (application/octet-stream) pass: Storage often serves those."""
+    declared = (content_type or "").split(";")[0].strip().lower()
+    if declared and declared.startswith(_NOT_AUDIO_TYPES):
+        raise NotAudio()
+
+
+def extension_for(container: str) -> str:
+    return _EXTENSIONS.get(container, ".m4a")
+
+
+def container_of(path: str) -> Optional[str]:
+    """The container recorded in a job audio file's extension, if any."""
+    lowered = path.lower()
+    for container, extension in _EXTENSIONS.items():
+        if lowered.endswith(extension):
+            return container
+    return None
@@ -22,6 +22,8 @@ from typing import Dict, Tuple
 import httpx
 from flask import g, jsonify, request
 
+from . import supabase_http
+
 logger = logging.getLogger("Auth")
 
 SUPABASE_URL = (os.getenv("SUPABASE_URL") or "").rstrip("/")
@@ -74,13 +76,12 @@ def verify_token(token: str) -> str:
         )
 
     try:
-        response = httpx.get(
+        response = supabase_http.get_client().get(
             f"{SUPABASE_URL}/auth/v1/user",
             headers={
                 "Authorization": f"Bearer {token}",
                 "apikey": SUPABASE_ANON_KEY,
             },
-            timeout=10.0,
         )
     except httpx.HTTPError as exc:
         logger.error(f"Auth lookup failed: {exc}")
@@ -0,0 +1,98 @@
+"""Coalesces concurrent single-key lookups into one bulk fetch.
+
+The dataloader pattern, for threads: the first caller to arrive opens a batch
+and waits a few milliseconds while other callers add their keys to it, then
+makes one bulk call and hands each caller its own result. With hundreds of
+clients polling job status, that turns hundreds of PostgREST reads a second
+into a handful.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Generic, Hashable, Iterable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Batch:
+    def __init__(self):
+        # A dict rather than a set, so keys are fetched in the order they came.
+        self.keys: dict = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+
+class Batcher(Generic[K, V]):
+    """Calls fetch(keys) -> {key: value} once per window for all waiting callers.
+
+    [window] is how long the first caller waits for company, in seconds; zero
+    disables batching and every `load` is a fetch of its own. A batch that
+    reaches [max_size] keys is sent at once. An exception from fetch is raised
+    in every caller of that batch.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Iterable[K]], Dict[K, V]],
+        window: float,
+        max_size: int = 100,
+    ):
+        self._fetch = fetch
+        self.window = window
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+        self._stats = {"loads": 0, "fetches": 0, "largest_batch": 0}
+
+    def load(self, key: K) -> Optional[V]:
+        with self._lock:
+            self._stats["loads"] += 1
+            if self.window <= 0:
+                batch, leader = _Batch(), True
+            else:
+                batch = self._open
+                leader = batch is None
+                if leader:
+                    batch = self._open = _Batch()
+            batch.keys[key] = None
+            if len(batch.keys) >= self.max_size and self._open is batch:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            self._run(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return (batch.results or {}).get(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            fetches = self._stats["fetches"]
+            return {
+                **self._stats,
+                "avg_batch": round(self._stats["loads"] / fetches, 2) if fetches else 0.0,
+            }
+
+    def _run(self, batch: _Batch) -> None:
+        if self.window > 0:
+            batch.full.wait(self.window)
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+            keys = list(batch.keys)
+            self._stats["fetches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(keys))
+
+        try:
+            batch.results = self._fetch(keys)
+        except BaseException as exc:
+            batch.error = exc
+        finally:
+            batch.done.set()
@@ -0,0 +1,343 @@
+"""Fetches recordings from signed Storage URLs, in parallel ranges when possible.
+
+A single streamed GET was the slowest stage of a long job before transcription
+even started: a 100+ MB lecture recording came down one connection at a time,
+and any dropped connection restarted it from zero.
+
+The first request asks for just the first range. A 206 answer confirms the
+server honours `Range` and, through `Content-Range`, gives the total size, which
+is checked against the byte cap before anything else is fetched. The file is
+then preallocated and the remaining ranges fetched concurrently over a pooled
+client, each written at its own offset. A range whose connection fails is
+resumed from the last byte it wrote, not restarted; a range that fails for good
+stops the others rather than waiting for them. A server that answers the probe
+with a plain 200 gets the old single sequential stream, and one that answers
+206 without saying how large the file is gets a fresh request for all of it.
+
+The SHA-256 the transcript cache needs is computed while the file arrives:
+behind the contiguous prefix that has been written so far, straight from the
+page cache, never as a second pass over the finished file.
+
+Nothing beyond the probe is fetched for input that is obviously not a
+recording: a declared size over the cap, a declared type that is not audio, or
+first bytes that match no audio container (see `audio_formats`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import httpx
+
+from .audio_formats import SNIFF_BYTES, Empty, TooLarge, check_content_type, require_audio
+
+logger = logging.getLogger("Downloads")
+
+# Concurrent range requests per download. 1 fetches ranges one at a time.
+CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS") or 4)
+
+# Recordings are not split into ranges smaller than this: below it another
+# connection's setup costs more than it saves.
+MIN_RANGE_BYTES = int(os.getenv("DOWNLOAD_MIN_RANGE_BYTES") or 8 * 1024 * 1024)
+
+# Attempts per range, each resuming where the last one stopped.
+RANGE_ATTEMPTS = 3
+
+_HASH_READ_BYTES = 1024 * 1024
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+@dataclass(frozen=True)
+class Downloaded:
+    sha256: str
+    size: int
+    container: str
+
+
+class _Abandoned(Exception):
+    """The download this range belonged to failed elsewhere and was given up."""
+
+
+class _Range:
+    def __init__(self, start: int, end: int):
+        # Inclusive, as in the Range header.
+        self.start = start
+        self.end = end
+        self.received = 0
+
+    @property
+    def done(self) -> bool:
+        return self.start + self.received > self.end
+
+
+class _Download:
+    """One ranged download into [fd], hashing its contiguous prefix as it grows."""
+
+    def __init__(self, client: httpx.Client, url: str, fd: int, total: int, etag: Optional[str]):
+        self.client = client
+        self.url = url
+        self.fd = fd
+        self.total = total
+        self.etag = etag
+        self.ranges: List[_Range] = []
+        self._digest = hashlib.sha256()
+        self._hashed = 0
+        self._progress_lock = threading.Lock()
+        self._hash_lock = threading.Lock()
+        # Held for each read or write of [fd], so that once `abandon` returns
+        # the caller may close it under ranges still running.
+        self._fd_lock = threading.Lock()
+        self._abandoned = False
+
+    def abandon(self) -> None:
+        """Stops every range: from now on each raises at its next write."""
+        with self._fd_lock:
+            self._abandoned = True
+
+    def write(self, part: _Range, data: bytes) -> None:
+        with self._fd_lock:
+            if self._abandoned:
+                raise _Abandoned()
+            os.pwrite(self.fd, data, part.start + part.received)
+        with self._progress_lock:
+            part.received += len(data)
+        # Whoever is not already hashing catches the digest up; the others
+        # carry on downloading.
+        if self._hash_lock.acquire(blocking=False):
+            try:
+                self._hash_up_to(self._frontier())
+            finally:
+                self._hash_lock.release()
+
+    def fetch(self, part: _Range) -> None:
+        for attempt in range(RANGE_ATTEMPTS):
+            if part.done:
+                return
+            if self._abandoned:
+                raise _Abandoned()
+            try:
+                self._fetch_from(part, part.start + part.received)
+                if part.done:
+                    return
+                raise httpx.ReadError("range ended early")
+            except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                if attempt + 1 == RANGE_ATTEMPTS:
+                    raise
+                logger.warning(
+                    "Range %s-%s failed at byte %s (%s); resuming.",
+                    part.start, part.end, part.start + part.received, exc,
+                )
+
+    def hexdigest(self) -> str:
+        with self._hash_lock:
+            self._hash_up_to(self.total)
+        return self._digest.hexdigest()
+
+    def _fetch_from(self, part: _Range, first: int) -> None:
+        headers = {"Range": f"bytes={first}-{part.end}"}
+        with self.client.stream("GET", self.url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RuntimeError("The recording changed while it was downloading.")
+            _check_same_object(response, self.total, self.etag)
+            # Unchunked: a range cut off midway keeps every byte it received.
+            for chunk in response.iter_bytes():
+                room = part.end + 1 - (part.start + part.received)
+                self.write(part, chunk[:room])
+
+    def _frontier(self) -> int:
+        with self._progress_lock:
+            for part in self.ranges:
+                if not part.done:
+                    return part.start + part.received
+        return self.total
+
+    def _hash_up_to(self, frontier: int) -> None:
+        while self._hashed < frontier:
+            with self._fd_lock:
+                if self._abandoned:
+                    return
+                data = os.pread(
+                    self.fd, min(_HASH_READ_BYTES, frontier - self._hashed), self._hashed
+                )
+            if not data:
+                break
+            self._digest.update(data)
+            self._hashed += len(data)
+
+
+def download(
+    url: str,
+    destination: str,
+    max_bytes: int,
+    timeout: float = 120.0,
+    connections: int = CONNECTIONS,
+) -> Downloaded:
+    """Downloads [url] to [destination].
+
+    Raises an `audio_formats.AudioRejected` for input that is too large
+    (before fetching, when the size is declared), empty or not audio.
+    """
+    connections = max(1, connections)
+    limits = httpx.Limits(max_connections=connections)
+    with httpx.Client(timeout=timeout, follow_redirects=True, limits=limits) as client:
+        headers = {"Range": f"bytes=0-{MIN_RANGE_BYTES - 1}"}
+        with client.stream("GET", url, headers=headers) as probe:
+            if probe.status_code == 416:
+                raise Empty()
+            probe.raise_for_status()
+            check_content_type(probe.headers.get("content-type"))
+
+            if probe.status_code != 206:
+                return _download_sequentially(probe, destination, max_bytes)
+
+            span = _content_range(probe)
+            if span is not None:
+                return _download_in_ranges(
+                    client, url, probe, span, destination, max_bytes, connections
+                )
+
+        # A 206 of unknown total ("bytes 0-N/*"): its body is only the first
+        # range, and the ranges cannot be planned. Ask for the whole file.
+        logger.info("Range response gave no total size; downloading in one piece.")
+        with client.stream("GET", url) as response:
+            response.raise_for_status()
+            check_content_type(response.headers.get("content-type"))
+            return _download_sequentially(response, destination, max_bytes)
+
+
+def _download_in_ranges(
+    client, url, probe, span, destination, max_bytes, connections
+) -> Downloaded:
+    total = span[2]
+    if total > max_bytes:
+        raise TooLarge()
+    if total == 0:
+        raise Empty()
+
+    chunks = probe.iter_bytes()
+    leading = _leading_chunks(chunks)
+    container = require_audio(b"".join(leading)[:SNIFF_BYTES])
+
+    fd = os.open(destination, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, total)
+        digest = _download_ranges(client, url, fd, probe, span, connections, leading, chunks)
+    finally:
+        os.close(fd)
+    return Downloaded(digest, total, container)
+
+
+def _leading_chunks(chunks: Iterator[bytes]) -> List[bytes]:
+    """Chunks from the front of [chunks] until SNIFF_BYTES have been seen."""
+    taken: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        taken.append(chunk)
+        size += len(chunk)
+        if size >= SNIFF_BYTES:
+            break
+    return taken
+
+
+def _download_ranges(client, url, fd, probe, span, connections, leading, chunks) -> str:
+    """The rest of a download whose probe answered 206 with [span].
+
+    The probe's own body is the first range: [leading] chunks already read
+    from it, then the rest of [chunks], read on this thread while the other
+    ranges are fetched on the pool's.
+    """
+    total = span[2]
+    job = _Download(client, url, fd, total, probe.headers.get("etag"))
+    head = _Range(0, span[1])
+    # The head holds one connection already.
+    job.ranges = [head, *_plan(span[1] + 1, total, max(1, connections - 1))]
+    for chunk in leading:
+        job.write(head, chunk[: span[1] + 1 - head.received])
+
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, connections - 1), thread_name_prefix="download-range"
+    )
+    try:
+        futures = [pool.submit(job.fetch, part) for part in job.ranges[1:]]
+        try:
+            for chunk in chunks:
+                job.write(head, chunk[: span[1] + 1 - head.received])
+        except httpx.TransportError as exc:
+            logger.warning("First range failed at byte %s (%s); resuming.", head.received, exc)
+        # Resumes the head if the probe's connection dropped; a no-op if not.
+        job.fetch(head)
+        for future in futures:
+            future.result()
+    except BaseException:
+        # One range failing fails the download: stop the others at their next
+        # write and drop those not started, instead of waiting them all out.
+        job.abandon()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    logger.info("Downloaded %s bytes in %s ranges", total, len(job.ranges))
+    return job.hexdigest()
+
+
+def _download_sequentially(
+    response: httpx.Response, destination: str, max_bytes: int
+) -> Downloaded:
+    declared = response.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise TooLarge()
+
+    chunks = response.iter_bytes()
+    leading = _leading_chunks(chunks)
+    container = require_audio(b"".join(leading)[:SNIFF_BYTES])
+
+    written = 0
+    digest = hashlib.sha256()
+    with open(destination, "wb") as handle:
+        for chunk in itertools.chain(leading, chunks):
+            written += len(chunk)
+            if written > max_bytes:
+                raise TooLarge()
+            digest.update(chunk)
+            handle.write(chunk)
+
+    return Downloaded(digest.hexdigest(), written, container)
+
+
+def _plan(first: int, total: int, connections: int) -> List[_Range]:
+    """Splits bytes [first, total) into at most [connections] ranges of at
+    least MIN_RANGE_BYTES each."""
+    remaining = total - first
+    if remaining <= 0:
+        return []
+    count = max(1, min(connections, remaining // max(MIN_RANGE_BYTES, 1)))
+    size = -(-remaining // count)
+    return [
+        _Range(start, min(start + size, total) - 1)
+        for start in range(first, total, size)
+    ]
+
+
+def _content_range(response: httpx.Response) -> Optional[Tuple[int, int, int]]:
+    """(first, last, total) from Content-Range, or None if the total is unknown."""
+    match = _CONTENT_RANGE.match(response.headers.get("content-range", ""))
+    if match is None or match.group(3) == "*":
+        return None
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+def _check_same_object(response: httpx.Response, total: int, etag: Optional[str]) -> None:
+    span = _content_range(response)
+    if span is None or span[2] != total:
+        raise RuntimeError("The recording changed while it was downloading.")
+    if etag and response.headers.get("etag") not in (None, etag):
+        raise RuntimeError("The recording changed while it was downloading.")
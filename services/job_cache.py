@@ -0,0 +1,136 @@
+"""In-process read-through cache for transcription job rows.
+
+A job that has reached `complete` or `failed` never changes again, yet clients
+re-fetch it, transcript and all, until they notice, and the web app re-opens
+old notes. Terminal rows are therefore kept until evicted. The cache is bounded
+by the bytes the rows hold rather than by entry count, because one multi-hour
+transcript can outweigh thousands of voice notes.
+
+Unfinished rows are cached too, but only for a moment: long enough to absorb
+a burst of identical polls, short enough that a status change made by another
+process is visible almost at once.
+
+Rows are cached whole, user id included. Scoping a read to its user is the
+caller's job, exactly as it is for a row fresh from PostgREST.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .job_events import is_terminal
+
+MAX_BYTES = int(os.getenv("JOB_CACHE_MAX_BYTES") or 32 * 1024 * 1024)
+
+# How long a pending/processing row may be served from memory.
+UNFINISHED_TTL_SECONDS = float(os.getenv("JOB_CACHE_UNFINISHED_TTL_SECONDS") or 1.0)
+
+# Rough per-entry cost beyond the text itself: dict, key, bookkeeping.
+_ENTRY_OVERHEAD_BYTES = 512
+
+
+def _row_size(row: dict) -> int:
+    size = _ENTRY_OVERHEAD_BYTES
+    for value in row.values():
+        if isinstance(value, str):
+            # UTF-8 length is what a transcript costs on the wire; in memory
+            # CPython may use up to 4 bytes a character, but this is a bound
+            # to stop runaway growth, not an allocator.
+            size += len(value)
+    return size
+
+
+class JobCache:
+    def __init__(
+        self,
+        max_bytes: int = MAX_BYTES,
+        unfinished_ttl: float = UNFINISHED_TTL_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.unfinished_ttl = unfinished_ttl
+        self._lock = threading.Lock()
+        # job id -> (row, size, expires_at or None for terminal rows)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            row, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove_locked(job_id)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(job_id)
+            self._stats["hits"] += 1
+            return row
+
+    def put(self, job_id: str, row: dict) -> None:
+        terminal = is_terminal(row.get("status"))
+        if not terminal and self.unfinished_ttl <= 0:
+            return
+
+        size = _row_size(row)
+        # One row must not flush everything else out.
+        if size > self.max_bytes // 4:
+            return
+
+        expires_at = None if terminal else time.monotonic() + self.unfinished_ttl
+        with self._lock:
+            if job_id in self._entries:
+                self._remove_locked(job_id)
+            self._entries[job_id] = (row, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self._stats["evictions"] += 1
+
+    def status_of(self, job_id: str) -> Optional[str]:
+        """The cached status, if any, without counting as a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(job_id)
+            return entry[0].get("status") if entry else None
+
+    def invalidate(self, job_id: str) -> None:
+        with self._lock:
+            if job_id in self._entries:
+                self._remove_locked(job_id)
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+    def _remove_locked(self, job_id: str) -> None:
+        _, size, _ = self._entries.pop(job_id)
+        self._bytes -= size
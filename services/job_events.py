@@ -0,0 +1,145 @@
+"""Wakes requests waiting for a transcription job to change state.
+
+Clients used to poll `/transcribe/status` every 2 seconds for up to 15 minutes,
+and each poll cost an auth check plus a PostgREST read. Long-polling and the SSE
+stream instead park the request here until the job moves on.
+
+A waiter can be woken two ways:
+
+- Directly, when this process writes the job's new status (`notify`, called by
+  the job store after a successful status write).
+- By the watcher: one thread per process that, while anyone is waiting, reads
+  the status of every watched job in a single query and wakes the waiters
+  whose job changed. That covers jobs finished by another gunicorn worker or a
+  `services.worker` process at a fixed cost, however many requests are parked.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger("JobEvents")
+
+TERMINAL_STATUSES = frozenset({"complete", "failed"})
+
+# How often the watcher re-reads watched jobs. One query per interval per
+# process, however many requests are waiting.
+WATCH_INTERVAL_SECONDS = float(os.getenv("JOB_WATCH_INTERVAL_SECONDS") or 1.0)
+
+_condition = threading.Condition()
+# job id -> waiters, each an event plus the status it is waiting to leave.
+_waiters: Dict[str, List[Tuple[threading.Event, Optional[str]]]] = {}
+_watcher_pid: Optional[int] = None
+_fetch_statuses: Optional[Callable[[Iterable[str]], Dict[str, str]]] = None
+_stats = {"waits": 0, "woken_locally": 0, "woken_by_watcher": 0, "timeouts": 0}
+
+
+def is_terminal(status: Optional[str]) -> bool:
+    return status in TERMINAL_STATUSES
+
+
+def notify(job_id: str) -> None:
+    """Wakes everyone waiting on [job_id]. Cheap when nobody is."""
+    with _condition:
+        waiters = _waiters.get(job_id)
+        if not waiters:
+            return
+        for event, _ in waiters:
+            if not event.is_set():
+                _stats["woken_locally"] += 1
+            event.set()
+
+
+def wait_for_change(
+    job_id: str,
+    status: Optional[str],
+    timeout: float,
+    fetch_statuses: Callable[[Iterable[str]], Dict[str, str]],
+) -> bool:
+    """Blocks until [job_id] leaves [status] or [timeout] passes.
+
+    Returns True when woken by a change. [fetch_statuses] is how the watcher
+    reads job statuses in bulk; it is only called from the watcher thread.
+    """
+    global _fetch_statuses
+    event = threading.Event()
+    entry = (event, status)
+    with _condition:
+        _fetch_statuses = fetch_statuses
+        _stats["waits"] += 1
+        _waiters.setdefault(job_id, []).append(entry)
+        _ensure_watcher_locked()
+        _condition.notify_all()
+
+    try:
+        changed = event.wait(timeout)
+    finally:
+        with _condition:
+            waiters = _waiters.get(job_id, [])
+            if entry in waiters:
+                waiters.remove(entry)
+            if not waiters:
+                _waiters.pop(job_id, None)
+            if not changed:
+                _stats["timeouts"] += 1
+    return changed
+
+
+def stats() -> dict:
+    with _condition:
+        return {
+            **_stats,
+            "watched_jobs": len(_waiters),
+            "waiting_requests": sum(len(w) for w in _waiters.values()),
+        }
+
+
+def _ensure_watcher_locked() -> None:
+    global _watcher_pid
+    pid = os.getpid()
+    if _watcher_pid == pid:
+        return
+    _watcher_pid = pid
+    thread = threading.Thread(target=_watch, name="job-watcher", daemon=True)
+    thread.start()
+
+
+def _watch() -> None:
+    while True:
+        with _condition:
+            while not _waiters:
+                _condition.wait()
+            watched = {
+                job_id: list(waiters) for job_id, waiters in _waiters.items()
+            }
+            fetch_statuses = _fetch_statuses
+
+        try:
+            current = fetch_statuses(list(watched))
+        except Exception as exc:
+            logger.warning("Job watcher read failed: %s", exc)
+            current = None
+
+        if current is not None:
+            with _condition:
+                for job_id, waiters in watched.items():
+                    status = current.get(job_id)
+                    for event, waiting_on in waiters:
+                        # A job that vanished has changed too, as far as a
+                        # waiter is concerned: its next read will say so.
+                        if status != waiting_on and not event.is_set():
+                            _stats["woken_by_watcher"] += 1
+                            event.set()
+
+        # A plain sleep, not a condition wait: new waiters arriving must not
+        # each trigger a read of their own.
+        time.sleep(WATCH_INTERVAL_SECONDS)
+
+
+metrics.register("job_events", stats)
@@ -0,0 +1,89 @@
+"""Keeps this process's job leases alive and adopts jobs orphaned by others.
+
+One daemon thread per process does two things on a timer:
+
+- Renews the lease on every unfinished job this process owns, in one request,
+  so queued jobs are covered as well as running ones.
+- Sweeps for jobs whose lease has expired, meaning the process that owned them
+  is gone, and hands them to a recovery callback to be claimed and resumed.
+
+A stuck "processing" job therefore becomes a retry measured in seconds rather
+than a client polling a dead job for fifteen minutes.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from . import job_store
+
+logger = logging.getLogger("JobLeases")
+
+# Renew well inside the lease so one slow or failed request is survivable.
+HEARTBEAT_SECONDS = max(1.0, job_store.LEASE_SECONDS / 3)
+
+SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS") or 15)
+
+_lock = threading.Lock()
+_owner: Optional[str] = None
+_owner_pid: Optional[int] = None
+_started_pid: Optional[int] = None
+
+
+def lease_owner() -> str:
+    """This process's identity on job leases. A forked child gets its own."""
+    global _owner, _owner_pid
+    pid = os.getpid()
+    with _lock:
+        if _owner_pid != pid:
+            _owner = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+            _owner_pid = pid
+        return _owner
+
+
+def start(sweep: Callable[[], None]) -> bool:
+    """Starts the lease thread for this process, once. Returns False when the
+    job store is not configured (local development, tests)."""
+    global _started_pid
+    if not job_store.is_configured():
+        return False
+
+    pid = os.getpid()
+    with _lock:
+        if _started_pid == pid:
+            return True
+        _started_pid = pid
+
+    thread = threading.Thread(
+        target=_run, args=(sweep,), name="job-leases", daemon=True
+    )
+    thread.start()
+    return True
+
+
+def _run(sweep: Callable[[], None]) -> None:
+    owner = lease_owner()
+    # Jittered so gunicorn workers that booted together don't sweep in lockstep.
+    next_sweep = time.monotonic() + random.uniform(0, SWEEP_SECONDS)
+
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        try:
+            job_store.renew_leases(owner)
+        except Exception as exc:
+            logger.warning("Lease renewal failed: %s", exc)
+
+        if time.monotonic() < next_sweep:
+            continue
+        next_sweep = time.monotonic() + SWEEP_SECONDS * random.uniform(0.8, 1.2)
+        try:
+            sweep()
+        except Exception as exc:
+            logger.warning("Orphaned job sweep failed: %s", exc)
@@ -4,18 +4,40 @@ Job state used to live in a module-level dict, which silently broke under
 `gunicorn --workers 2`: the worker that started a job was often not the worker
 that answered the status poll, so clients saw a 404 partway through.
 
-Reads and writes go through PostgREST with the service role key. Every read is
+Reads and writes go through PostgREST with the service role key, over the
+shared keep-alive client in `supabase_http`. Every read is
 scoped to a user id supplied by the caller, so one user cannot poll another
-user's job.
+user's job. Concurrent `get_job` calls are coalesced into one `id=in.(...)`
+query and the user check is applied to each row on the way back out, after
+the in-process `JobCache` has had a chance to answer without a query at all.
+
+Unfinished jobs carry a lease: the process working on one keeps pushing
+`lease_expires_at` forward, and a job whose lease runs out belonged to a worker
+that died (deploy, restart, OOM kill). Any surviving process may then claim it.
+Claims are compare-and-set PATCHes filtered on the previous owner and attempt
+count, so two processes racing for the same orphan cannot both win.
+
+Job ids are UUIDv7s generated here rather than by Postgres, so `/transcribe`
+can answer 202 without waiting for the insert: the row is written in the
+background, and until it lands a read of the new id answers `pending` (from
+the local registry in this process, and from the timestamp in the id itself
+in any other). Writes to a job whose insert is still in flight wait for it.
 """
 
 from __future__ import annotations
 
 import logging
 import os
-from datetime import datetime, timezone
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-import httpx
+from . import job_events, metrics, supabase_http
+from .batching import Batcher
+from .job_cache import JobCache
+from .write_behind import WriteBehindBuffer, flush_at_exit
 
 logger = logging.getLogger("JobStore")
 
@@ -23,7 +45,38 @@ SUPABASE_URL = (os.getenv("SUPABASE_URL") or "").rstrip("/")
 SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or ""
 
 _TABLE = "transcription_jobs"
-_TIMEOUT = 15.0
+
+# How long a job stays owned by a process that has stopped renewing it.
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS") or 60)
+
+# Statuses a worker may still be responsible for.
+_UNFINISHED = "in.(pending,processing)"
+
+# How long a status read waits for others to share its query. 0 disables it.
+READ_BATCH_WINDOW_SECONDS = float(os.getenv("JOB_READ_BATCH_WINDOW_MS") or 3) / 1000
+
+# How long non-terminal updates are buffered before a bulk write. 0 writes
+# every update through immediately.
+WRITE_BEHIND_SECONDS = float(os.getenv("JOB_WRITE_BEHIND_MS") or 500) / 1000
+
+# "0" makes `create_job` wait for its insert, as it did before job ids were
+# generated locally.
+ASYNC_CREATE = os.getenv("JOB_ASYNC_CREATE", "1") != "0"
+
+# How long after its id was issued a job missing from the table still reads as
+# pending, for status requests that reach a process which did not create it.
+INSERT_GRACE_SECONDS = float(os.getenv("JOB_INSERT_GRACE_SECONDS") or 30)
+
+# Attempts at a background insert before the job is given up on.
+_INSERT_ATTEMPTS = 3
+
+# Columns a client sees from `get_job`.
+_PUBLIC_COLUMNS = ("status", "transcript", "error")
+
+# What a worker needs to claim a job and resume it from scratch.
+_CLAIM_COLUMNS = (
+    "id,user_id,status,requested_language,requested_locale,lease_owner,attempts"
+)
 
 
 class JobStoreError(RuntimeError):
@@ -45,56 +98,442 @@ def _headers(extra: dict[str, str] | None = None) -> dict[str, str]:
     return headers
 
 
+def _http():
+    return supabase_http.get_client()
+
+
 def _endpoint() -> str:
     return f"{SUPABASE_URL}/rest/v1/{_TABLE}"
 
 
-def create_job(user_id: str, requested_language: str | None = None) -> str:
-    payload = {"user_id": user_id, "status": "pending"}
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_expiry() -> str:
+    return (_now() + timedelta(seconds=LEASE_SECONDS)).isoformat()
+
+
+def is_configured() -> bool:
+    return bool(SUPABASE_URL and SERVICE_ROLE_KEY)
+
+
+def new_job_id() -> str:
+    """A UUIDv7: time-ordered, so new rows append to the primary key index
+    instead of landing on random pages of it."""
+    unix_ms = time.time_ns() // 1_000_000
+    random_bits = int.from_bytes(os.urandom(10), "big")
+    value = (unix_ms & (1 << 48) - 1) << 80
+    value |= 0x7 << 76
+    value |= (random_bits >> 62 & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= random_bits & (1 << 62) - 1
+    return str(uuid.UUID(int=value))
+
+
+def _issued_at(job_id: str) -> float | None:
+    """When a UUIDv7 job id was generated, in epoch seconds."""
+    try:
+        parsed = uuid.UUID(job_id)
+    except (ValueError, TypeError):
+        return None
+    if parsed.version != 7:
+        return None
+    return (parsed.int >> 80) / 1000
+
+
+def create_job(
+    user_id: str,
+    requested_language: str | None = None,
+    requested_locale: str | None = None,
+    lease_owner: str | None = None,
+    job_id: str | None = None,
+) -> str:
+    """Creates a pending job, leased to [lease_owner] when one is given.
+
+    Language and locale are stored so a job can be resumed by a process that
+    never saw the original request. [job_id] is one issued earlier by
+    `new_job_id`; a new one is issued otherwise. With ASYNC_CREATE the id is
+    returned before the row is written.
+    """
+    job_id = job_id or new_job_id()
+    payload = {"id": job_id, "user_id": user_id, "status": "pending"}
     if requested_language:
         payload["requested_language"] = requested_language
+    if requested_locale:
+        payload["requested_locale"] = requested_locale
+    if lease_owner:
+        payload["lease_owner"] = lease_owner
+        payload["lease_expires_at"] = _lease_expiry()
+        payload["attempts"] = 1
+
+    if not ASYNC_CREATE:
+        if not _insert(payload):
+            raise JobStoreError("Could not create the transcription job.")
+        return job_id
+
+    # Fail in the request, not in the background, when there is no store.
+    _headers()
+    with _inserts_lock:
+        _pending_inserts[job_id] = (user_id, threading.Event())
+    _inserter().submit(_insert_in_background, payload)
+    return job_id
+
 
-    response = httpx.post(
+def _insert(payload: dict) -> bool:
+    response = _http().post(
         _endpoint(),
-        headers=_headers({"Prefer": "return=representation"}),
+        headers=_headers({"Prefer": "return=minimal"}),
         json=payload,
-        timeout=_TIMEOUT,
     )
-    if response.status_code not in (200, 201):
+    if response.status_code not in (200, 201, 204):
         logger.error(f"create_job failed {response.status_code}: {response.text}")
-        raise JobStoreError("Could not create the transcription job.")
+        return False
+    return True
+
+
+def _insert_in_background(payload: dict) -> None:
+    job_id = payload["id"]
+    inserted = False
+    try:
+        for attempt in range(_INSERT_ATTEMPTS):
+            try:
+                if _insert(payload):
+                    inserted = True
+                    return
+            except Exception as e:
+                logger.error(f"create_job raised for {job_id}: {e}")
+            time.sleep(0.5 * 2**attempt)
+        logger.error(f"Giving up on inserting job {job_id}")
+    finally:
+        with _inserts_lock:
+            entry = _pending_inserts.pop(job_id, None)
+            if not inserted:
+                _lost_jobs.add(job_id)
+        if entry is not None:
+            entry[1].set()
+
+
+def job_inserted(job_id: str) -> bool:
+    """False when this process gave up inserting [job_id]'s row, so there is
+    nowhere to record its result. Waits while the insert is still running."""
+    _await_insert(job_id)
+    return job_id not in _lost_jobs
+
+
+def _await_insert(job_id: str) -> None:
+    """Blocks while [job_id]'s row is still being inserted by this process,
+    so an update can't reach PostgREST ahead of it and match nothing."""
+    entry = _pending_inserts.get(job_id)
+    if entry is not None:
+        entry[1].wait(supabase_http.TIMEOUT_SECONDS * _INSERT_ATTEMPTS)
 
-    rows = response.json()
-    if not rows:
-        raise JobStoreError("Could not create the transcription job.")
-    return rows[0]["id"]
+
+def _inserter() -> ThreadPoolExecutor:
+    global _insert_executor, _insert_executor_pid
+    pid = os.getpid()
+    with _inserts_lock:
+        if _insert_executor is None or _insert_executor_pid != pid:
+            _insert_executor = ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix="job-insert"
+            )
+            _insert_executor_pid = pid
+        return _insert_executor
+
+
+def _not_yet_inserted(job_id: str) -> bool:
+    """Whether [job_id] is a job created moments ago whose row may not exist yet.
+
+    Ids from other processes can only be judged by the timestamp inside them;
+    an id claiming to be seconds old reads as pending to anyone, which reveals
+    nothing.
+    """
+    if job_id in _pending_inserts:
+        return True
+    if job_id in _lost_jobs:
+        return False
+    issued_at = _issued_at(job_id)
+    return issued_at is not None and 0 <= time.time() - issued_at < INSERT_GRACE_SECONDS
 
 
 def update_job(job_id: str, **fields) -> None:
+    """Records new field values for a job.
+
+    Terminal transitions (and everything when write-behind is off) are written
+    before returning, together with any buffered fields for the same job.
+    Anything else is buffered and written in bulk within
+    WRITE_BEHIND_SECONDS.
+    """
     if not fields:
         return
-    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
-    response = httpx.patch(
+    if job_id in _lost_jobs:
+        # There is no row to write to.
+        _write_behind.take(job_id)
+        return
+
+    # An unconfigured store should fail here, in the caller, not later in the
+    # flusher thread.
+    buffered = _write_behind.enabled and is_configured()
+    if buffered and not job_events.is_terminal(fields.get("status")):
+        _write_behind.add(job_id, fields)
+        return
+
+    fields = {**_write_behind.take(job_id), **fields}
+    _await_insert(job_id)
+    fields["updated_at"] = _now().isoformat()
+    response = _http().patch(
         f"{_endpoint()}?id=eq.{job_id}",
         headers=_headers(),
         json=fields,
-        timeout=_TIMEOUT,
     )
+    # Invalidate even on failure: the write may have landed regardless.
+    _job_cache.invalidate(job_id)
+
     if response.status_code not in (200, 204):
         # A failed status write must not kill the worker thread mid-job.
         logger.error(f"update_job failed {response.status_code}: {response.text}")
+        return
+
+    if "status" in fields:
+        job_events.notify(job_id)
+
+
+def flush_updates() -> None:
+    """Writes every buffered update now. For shutdown and tests."""
+    _write_behind.flush()
+
+
+def _write_buffered(job_ids: list[str], fields: dict) -> bool:
+    """One PATCH for every job sharing the same buffered fields.
+
+    Never touches a finished job: a late flush of `processing` must not
+    overwrite a `complete` that was written synchronously in the meantime.
+    """
+    for job_id in job_ids:
+        _await_insert(job_id)
+    response = _http().patch(
+        _endpoint(),
+        params={"id": _in_list(job_ids), "status": "not.in.(complete,failed)"},
+        headers=_headers(),
+        json={**fields, "updated_at": _now().isoformat()},
+    )
+    if response.status_code not in (200, 204):
+        logger.error(f"Buffered update failed {response.status_code}: {response.text}")
+        return False
+    return True
+
+
+def _after_buffered_write(job_ids: list[str], fields: dict) -> None:
+    for job_id in job_ids:
+        _job_cache.invalidate(job_id)
+        if "status" in fields:
+            job_events.notify(job_id)
 
 
 def get_job(job_id: str, user_id: str) -> dict | None:
-    response = httpx.get(
-        f"{_endpoint()}?id=eq.{job_id}&user_id=eq.{user_id}"
-        "&select=status,transcript,error",
+    """The job's public columns, or None if it doesn't exist or isn't the user's."""
+    entry = _pending_inserts.get(job_id)
+    if entry is not None:
+        # Created by this process moments ago; the row may not exist yet.
+        row = {"user_id": entry[0], "status": "pending"}
+    else:
+        row = _job_cache.get(job_id)
+        if row is None:
+            row = _job_reads.load(job_id)
+            if row is not None:
+                _job_cache.put(job_id, row)
+            elif _not_yet_inserted(job_id):
+                row = {"user_id": user_id, "status": "pending"}
+
+    if row is None or row.get("user_id") != user_id:
+        return None
+    return {column: row.get(column) for column in _PUBLIC_COLUMNS}
+
+
+def _fetch_jobs(job_ids) -> dict[str, dict]:
+    """Rows for [job_ids], whoever owns them. Callers must check user_id."""
+    response = _http().get(
+        _endpoint(),
+        params={
+            "select": ",".join(("id", "user_id") + _PUBLIC_COLUMNS),
+            "id": _in_list(job_ids),
+        },
         headers=_headers(),
-        timeout=_TIMEOUT,
     )
     if response.status_code != 200:
         logger.error(f"get_job failed {response.status_code}: {response.text}")
         raise JobStoreError("Could not read the transcription job.")
 
-    rows = response.json()
-    return rows[0] if rows else None
+    return {row["id"]: row for row in response.json()}
+
+
+_job_reads = Batcher(_fetch_jobs, window=READ_BATCH_WINDOW_SECONDS)
+_job_cache = JobCache()
+_inserts_lock = threading.Lock()
+# job id -> (user id, set once the insert has landed or been given up on)
+_pending_inserts: dict[str, tuple[str, threading.Event]] = {}
+# Jobs whose insert was given up on. Kept for the process's life; they are rare.
+_lost_jobs: set[str] = set()
+_insert_executor: ThreadPoolExecutor | None = None
+_insert_executor_pid: int | None = None
+_write_behind = WriteBehindBuffer(
+    _write_buffered, WRITE_BEHIND_SECONDS, on_flushed=_after_buffered_write
+)
+flush_at_exit(_write_behind)
+metrics.register("job_reads", _job_reads.stats)
+metrics.register("job_cache", _job_cache.stats)
+metrics.register("job_writes", _write_behind.stats)
+
+
+def _in_list(values) -> str:
+    """A PostgREST `in` filter with every value quoted, so an id from a URL
+    cannot smuggle in a comma or parenthesis."""
+    quoted = ",".join('"' + str(v).replace('"', "") + '"' for v in values)
+    return f"in.({quoted})"
+
+
+def get_job_statuses(job_ids) -> dict[str, str]:
+    """Current status of each of [job_ids] that exists, in one request.
+
+    Not scoped to a user: for the status watcher, which only uses the result
+    to decide whom to wake. Anything returned to a client goes through
+    `get_job`.
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+    response = _http().get(
+        _endpoint(),
+        params={"select": "id,status", "id": _in_list(job_ids)},
+        headers=_headers(),
+    )
+    if response.status_code != 200:
+        logger.error(f"get_job_statuses failed {response.status_code}: {response.text}")
+        raise JobStoreError("Could not read transcription job statuses.")
+
+    statuses = {row["id"]: row["status"] for row in response.json()}
+    for job_id in job_ids:
+        # Not there yet is not the same as gone: don't wake its waiters.
+        if job_id not in statuses and _not_yet_inserted(job_id):
+            statuses[job_id] = "pending"
+    # Another process moved these jobs on; don't let a cached row contradict
+    # the read that is about to follow.
+    for job_id in job_ids:
+        cached = _job_cache.status_of(job_id)
+        if cached is not None and cached != statuses.get(job_id):
+            _job_cache.invalidate(job_id)
+    return statuses
+
+
+def renew_leases(owner: str) -> None:
+    """Extends every unfinished job leased to [owner] in a single request."""
+    response = _http().patch(
+        _endpoint(),
+        params={"lease_owner": f"eq.{owner}", "status": _UNFINISHED},
+        headers=_headers(),
+        json={"lease_expires_at": _lease_expiry()},
+    )
+    if response.status_code not in (200, 204):
+        logger.error(f"renew_leases failed {response.status_code}: {response.text}")
+
+
+def list_expired_jobs(limit: int = 20) -> list[dict]:
+    """Unfinished jobs whose owner has stopped renewing the lease."""
+    response = _http().get(
+        _endpoint(),
+        params={
+            "select": _CLAIM_COLUMNS,
+            "status": _UNFINISHED,
+            "lease_expires_at": f"lt.{_now().isoformat()}",
+            "order": "lease_expires_at.asc",
+            "limit": str(limit),
+        },
+        headers=_headers(),
+    )
+    if response.status_code != 200:
+        logger.error(f"list_expired_jobs failed {response.status_code}: {response.text}")
+        raise JobStoreError("Could not list expired transcription jobs.")
+    return response.json()
+
+
+def list_unclaimed_jobs(limit: int = 10) -> list[dict]:
+    """Pending jobs queued by the web tier that no worker has picked up yet."""
+    response = _http().get(
+        _endpoint(),
+        params={
+            "select": _CLAIM_COLUMNS,
+            "status": "eq.pending",
+            "lease_owner": "is.null",
+            "order": "created_at.asc",
+            "limit": str(limit),
+        },
+        headers=_headers(),
+    )
+    if response.status_code != 200:
+        logger.error(f"list_unclaimed_jobs failed {response.status_code}: {response.text}")
+        raise JobStoreError("Could not list queued transcription jobs.")
+    return response.json()
+
+
+def release_job(job_id: str, owner: str) -> None:
+    """Hands a pending job leased to [owner] over to the workers, as if it had
+    been created unleased. For queued jobs, once their audio is in place.
+
+    Does nothing if the job has been claimed since: a worker may adopt it once
+    the lease lapses, and its claim must not be undone.
+    """
+    _await_insert(job_id)
+    response = _http().patch(
+        _endpoint(),
+        params={
+            "id": f"eq.{job_id}",
+            "lease_owner": f"eq.{owner}",
+            "status": "eq.pending",
+        },
+        headers=_headers(),
+        json={
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "attempts": 0,
+            "updated_at": _now().isoformat(),
+        },
+    )
+    if response.status_code not in (200, 204):
+        logger.error(f"release_job failed {response.status_code}: {response.text}")
+
+
+def claim_job(job: dict, owner: str) -> bool:
+    """Takes over [job], a row from `list_expired_jobs` or `list_unclaimed_jobs`.
+    False if beaten to it.
+
+    The filter repeats the owner and attempt count that were read, so the PATCH
+    only matches if nobody else has claimed or renewed the job in between.
+    """
+    previous_owner = job.get("lease_owner")
+    attempts = job.get("attempts") or 0
+    params = {
+        "id": f"eq.{job['id']}",
+        "status": _UNFINISHED,
+        "attempts": f"eq.{attempts}",
+    }
+    if previous_owner:
+        params["lease_owner"] = f"eq.{previous_owner}"
+        params["lease_expires_at"] = f"lt.{_now().isoformat()}"
+    else:
+        params["lease_owner"] = "is.null"
+
+    response = _http().patch(
+        _endpoint(),
+        params=params,
+        headers=_headers({"Prefer": "return=representation"}),
+        json={
+            "lease_owner": owner,
+            "lease_expires_at": _lease_expiry(),
+            "attempts": attempts + 1,
+            "updated_at": _now().isoformat(),
+        },
+    )
+    if response.status_code != 200:
+        logger.error(f"claim_job failed {response.status_code}: {response.text}")
+        return False
+    return bool(response.json())
@@ -0,0 +1,43 @@
+"""Process-local operational counters, served by the `/metrics` route.
+
+Each subsystem registers a callable that returns a JSON-serialisable snapshot of
+its own state. Nothing here is aggregated across gunicorn workers: every
+response describes the process that answered it, which is labelled by pid.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger("Metrics")
+
+_lock = threading.Lock()
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, source: Callable[[], dict]) -> None:
+    """Adds (or replaces) the snapshot callable published under [name]."""
+    with _lock:
+        _sources[name] = source
+
+
+def snapshot() -> dict:
+    """Every registered snapshot, keyed by name.
+
+    A source that raises is reported as an error rather than failing the whole
+    response; metrics are how you diagnose a broken subsystem, after all.
+    """
+    with _lock:
+        sources = dict(_sources)
+
+    result: dict = {"pid": os.getpid()}
+    for name, source in sorted(sources.items()):
+        try:
+            result[name] = source()
+        except Exception as exc:  # pragma: no cover - diagnostic path
+            logger.warning("Metrics source %s failed: %s", name, exc)
+            result[name] = {"error": str(exc)}
+    return result
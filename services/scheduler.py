@@ -0,0 +1,193 @@
+"""Orders queued transcriptions: shortest first, with a per-user running cap.
+
+Users mix 20-second voice notes with 90-minute lectures. Under FIFO a couple of
+lectures at the head of the queue push every voice note behind them out to
+minutes, so queued work is ordered by estimated cost (the recording's size on
+disk, a good proxy for its duration within one codec) instead.
+
+Two things keep that from being unfair:
+
+- Ageing. A job's effective cost falls the longer it waits, so a long recording
+  cannot be starved indefinitely by a stream of short ones.
+- A per-user cap on running jobs. One user submitting a batch of lectures can
+  hold at most that many workers; everyone else's work runs beside it.
+
+Queue wait is recorded per size class so the ageing rate and cap can be tuned
+from `/metrics` rather than guessed.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+# How many of one user's jobs may run at once in a process.
+MAX_RUNNING_PER_USER = int(os.getenv("TRANSCRIPTION_MAX_PER_USER") or 2)
+
+# Effective cost shed per second of waiting. At 512 KB/s a 100 MB lecture is
+# ahead of fresh voice notes after roughly three minutes in the queue.
+AGING_BYTES_PER_SECOND = float(
+    os.getenv("TRANSCRIPTION_AGING_BYTES_PER_SECOND") or 512 * 1024
+)
+
+# Upper bounds of each reporting class, in bytes. Roughly: a voice note, a
+# meeting, and anything longer.
+_SIZE_CLASSES = (
+    ("short", 2 * 1024 * 1024),
+    ("medium", 20 * 1024 * 1024),
+    ("long", None),
+)
+
+# Waits kept per class for the percentile estimates.
+_WAIT_SAMPLES = 256
+
+
+def size_class(cost: float) -> str:
+    for name, limit in _SIZE_CLASSES:
+        if limit is None or cost < limit:
+            return name
+    return _SIZE_CLASSES[-1][0]
+
+
+@dataclass
+class ScheduledTask:
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    cost: float = 0.0
+    user_id: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    sequence: int = 0
+
+    def priority(self, now: float) -> tuple:
+        aged = self.cost - (now - self.enqueued_at) * AGING_BYTES_PER_SECOND
+        # Sequence breaks ties in arrival order.
+        return (aged, self.sequence)
+
+
+class _WaitStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.recent)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+        return {
+            "count": self.count,
+            "avg_seconds": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_seconds": percentile(0.50),
+            "p95_seconds": percentile(0.95),
+            "max_seconds": round(self.max, 3),
+        }
+
+
+class FairShareScheduler:
+    """A blocking work queue with cost ordering and per-user caps.
+
+    `get` hands out the cheapest (after ageing) task whose user is under the
+    cap, and `done` must be called when that task finishes so the user's slot
+    is returned. A linear scan picks the next task: the queue is bounded by
+    the pool's admission limit, so it is never more than a few dozen long.
+    """
+
+    def __init__(self, max_running_per_user: int = MAX_RUNNING_PER_USER):
+        self.max_running_per_user = max(1, max_running_per_user)
+        self._condition = threading.Condition()
+        self._tasks: List[ScheduledTask] = []
+        self._running: Dict[str, int] = {}
+        self._unfinished = 0
+        self._sequence = itertools.count()
+        self._waits = {name: _WaitStats() for name, _ in _SIZE_CLASSES}
+
+    def put(self, task: ScheduledTask) -> None:
+        with self._condition:
+            task.sequence = next(self._sequence)
+            task.enqueued_at = time.monotonic()
+            self._tasks.append(task)
+            self._unfinished += 1
+            self._condition.notify_all()
+
+    def get(self) -> ScheduledTask:
+        with self._condition:
+            while True:
+                task = self._pick_locked()
+                if task is not None:
+                    break
+                self._condition.wait()
+
+            self._tasks.remove(task)
+            if task.user_id is not None:
+                self._running[task.user_id] = self._running.get(task.user_id, 0) + 1
+            self._waits[size_class(task.cost)].record(
+                time.monotonic() - task.enqueued_at
+            )
+            return task
+
+    def done(self, task: ScheduledTask) -> None:
+        with self._condition:
+            if task.user_id is not None:
+                remaining = self._running.get(task.user_id, 0) - 1
+                if remaining > 0:
+                    self._running[task.user_id] = remaining
+                else:
+                    self._running.pop(task.user_id, None)
+            self._unfinished -= 1
+            self._condition.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every task put so far has finished."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def running_for(self, user_id: Optional[str]) -> int:
+        with self._condition:
+            return self._running.get(user_id, 0) if user_id is not None else 0
+
+    def qsize(self) -> int:
+        with self._condition:
+            return len(self._tasks)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "queued": len(self._tasks),
+                "users_running": len(self._running),
+                "max_running_per_user": self.max_running_per_user,
+                "queue_wait": {
+                    name: stats.snapshot() for name, stats in self._waits.items()
+                },
+            }
+
+    def _pick_locked(self) -> Optional[ScheduledTask]:
+        now = time.monotonic()
+        best = None
+        best_priority = None
+        for task in self._tasks:
+            if (
+                task.user_id is not None
+                and self._running.get(task.user_id, 0) >= self.max_running_per_user
+            ):
+                continue
+            priority = task.priority(now)
+            if best is None or priority < best_priority:
+                best, best_priority = task, priority
+        return best
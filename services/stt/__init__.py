@@ -1,7 +1,8 @@
 """Speech-to-text providers and the routing between them.
 
 Sarvam handles the Indian languages it specialises in; OpenAI handles everything
-else. `pipeline.transcribe` is the only entry point the rest of the app needs.
+else. `pipeline.transcribe` (or `transcribe_async`, from a coroutine) is the only
+entry point the rest of the app needs.
 """
 
 from .languages import (
@@ -13,7 +14,7 @@ from .languages import (
     normalise_language,
     to_sarvam_mode,
 )
-from .pipeline import transcribe
+from .pipeline import transcribe, transcribe_async
 from .router import OPENAI, SARVAM, provider_chain, select_fallback, select_provider
 from .types import (
     SttProvider,
@@ -40,4 +41,5 @@ __all__ = [
     "select_provider",
     "to_sarvam_mode",
     "transcribe",
+    "transcribe_async",
 ]
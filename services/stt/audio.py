@@ -0,0 +1,170 @@
+"""Decoding recordings to raw PCM for the local analysis stages.
+
+Silence-aware chunking needs samples, not containers. Everything is decoded to
+16 kHz mono signed 16-bit PCM, the rate both providers resample speech to
+anyway, written to a raw file next to the recording and memory-mapped, so a
+multi-hour lecture is analysed without holding it all in memory.
+
+`encode_speech` goes the other way, re-encoding a recording as compact 16 kHz
+mono for upload (see `normalise`).
+
+Decoding compressed audio (m4a, ogg, webm, mp3, ...) needs the `ffmpeg` binary
+on PATH, or wherever FFMPEG_BINARY points. Without it only PCM WAV can be
+decoded, via the standard library, and callers fall back to sending the
+original file as they always did.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("STT.Audio")
+
+SAMPLE_RATE = 16000
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY") or "ffmpeg"
+
+# Generous: decoding is far faster than real time, even for long files.
+_DECODE_TIMEOUT_SECONDS = 600
+
+# AAC at this bitrate is transparent for speech at 16 kHz mono, and about a
+# tenth the size of the same audio as WAV.
+SPEECH_BITRATE = "32k"
+
+
+class DecodeError(RuntimeError):
+    pass
+
+
+def ffmpeg_path() -> Optional[str]:
+    return shutil.which(FFMPEG_BINARY)
+
+
+def can_decode(audio_path: str) -> bool:
+    """True when `decode` will be able to read [audio_path]."""
+    return ffmpeg_path() is not None or _is_pcm_wav(audio_path)
+
+
+def decode(audio_path: str, raw_path: str) -> np.ndarray:
+    """Decodes [audio_path] into [raw_path] as 16 kHz mono int16 PCM and
+    returns it memory-mapped. Raises DecodeError when it can't."""
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is not None:
+        _decode_with_ffmpeg(ffmpeg, audio_path, raw_path)
+    elif _is_pcm_wav(audio_path):
+        _decode_wav(audio_path, raw_path)
+    else:
+        raise DecodeError("No decoder for this recording (ffmpeg is not installed).")
+
+    if os.path.getsize(raw_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(raw_path, dtype=np.int16, mode="r")
+
+
+def write_wav(samples: np.ndarray, path: str, sample_rate: int = SAMPLE_RATE) -> None:
+    """Writes int16 mono [samples] as a WAV file, which every provider accepts."""
+    with wave.open(path, "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(sample_rate)
+        handle.writeframes(np.ascontiguousarray(samples, dtype="<i2").tobytes())
+
+
+def speech_extension() -> str:
+    """The extension `encode_speech` will write: AAC when ffmpeg is here,
+    otherwise WAV, the only thing the fallback can produce."""
+    return ".m4a" if ffmpeg_path() is not None else ".wav"
+
+
+def encode_speech(audio_path: str, target_path: str) -> None:
+    """Re-encodes [audio_path] as 16 kHz mono into [target_path], whose
+    extension should come from `speech_extension`. Raises DecodeError."""
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is not None:
+        _run_ffmpeg([
+            ffmpeg, "-nostdin", "-v", "error", "-y", "-i", audio_path, "-vn",
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "aac", "-b:a", SPEECH_BITRATE,
+            target_path,
+        ])
+        return
+    if not _is_pcm_wav(audio_path):
+        raise DecodeError("No encoder for this recording (ffmpeg is not installed).")
+
+    raw_path = target_path + ".pcm"
+    try:
+        _decode_wav(audio_path, raw_path)
+        with open(raw_path, "rb") as raw, wave.open(target_path, "wb") as target:
+            target.setnchannels(1)
+            target.setsampwidth(2)
+            target.setframerate(SAMPLE_RATE)
+            for block in iter(lambda: raw.read(1 << 20), b""):
+                target.writeframes(block)
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+
+def is_speech_format(audio_path: str) -> bool:
+    """True for a WAV already at 16 kHz mono, which re-encoding can't shrink
+    without ffmpeg."""
+    try:
+        with wave.open(audio_path, "rb") as handle:
+            return handle.getnchannels() == 1 and handle.getframerate() == SAMPLE_RATE
+    except (OSError, EOFError, wave.Error):
+        return False
+
+
+def _decode_with_ffmpeg(ffmpeg: str, audio_path: str, raw_path: str) -> None:
+    _run_ffmpeg([
+        ffmpeg, "-nostdin", "-v", "error", "-y", "-i", audio_path,
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", raw_path,
+    ])
+
+
+def _run_ffmpeg(command) -> None:
+    try:
+        completed = subprocess.run(
+            command, capture_output=True, timeout=_DECODE_TIMEOUT_SECONDS
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise DecodeError(f"ffmpeg could not run: {exc}") from exc
+    if completed.returncode != 0:
+        message = completed.stderr.decode("utf-8", "replace").strip()[-500:]
+        raise DecodeError(f"ffmpeg failed: {message}")
+
+
+def _is_pcm_wav(audio_path: str) -> bool:
+    try:
+        with wave.open(audio_path, "rb") as handle:
+            return handle.getsampwidth() == 2 and handle.getcomptype() == "NONE"
+    except (OSError, EOFError, wave.Error):
+        return False
+
+
+def _decode_wav(audio_path: str, raw_path: str) -> None:
+    """16-bit PCM WAV at any rate and channel count, block by block."""
+    with wave.open(audio_path, "rb") as source, open(raw_path, "wb") as target:
+        channels = source.getnchannels()
+        rate = source.getframerate()
+        while True:
+            frames = source.readframes(rate * 30)
+            if not frames:
+                break
+            block = np.frombuffer(frames, dtype="<i2")
+            if channels > 1:
+                block = block.reshape(-1, channels).mean(axis=1)
+            if rate != SAMPLE_RATE:
+                # Linear interpolation is plenty for energy analysis and for
+                # speech models that resample internally regardless.
+                count = int(round(len(block) * SAMPLE_RATE / rate))
+                block = np.interp(
+                    np.linspace(0, len(block) - 1, count), np.arange(len(block)), block
+                )
+            target.write(np.asarray(block).astype("<i2").tobytes())
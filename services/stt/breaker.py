@@ -0,0 +1,226 @@
+"""Per-provider circuit breakers, shared by every worker process on the host.
+
+When Sarvam was down, every job still created a Sarvam job, uploaded to it,
+waited for it to fail, and only then fell back to OpenAI: every user paid the
+full failure latency. The pipeline now skips an open provider straight to its
+fallback, and every call first claims its way in with `try_acquire`.
+
+A breaker opens when at least ERROR_RATE of the provider's last calls within
+WINDOW_SECONDS failed (once there are MIN_CALLS of them). A call slower than
+SLOW_SECONDS counts as a failure too: a vendor that takes that long is as good
+as down. After COOLDOWN_SECONDS one call is let through as a probe
+(half-open); its success closes the breaker and its failure reopens it.
+
+State lives in one small JSON file per provider under STATE_DIR, read and
+updated under `flock`, so gunicorn workers share what each of them learns. It
+is the same on-disk approach as the transcript cache: no extra services, and a
+restart keeps the breaker's memory of a vendor outage.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from .. import metrics
+
+logger = logging.getLogger("STT.Breaker")
+
+ENABLED = (os.getenv("STT_BREAKER") or "1") != "0"
+STATE_DIR = os.getenv("STT_BREAKER_DIR") or "stt_breakers"
+WINDOW_SECONDS = float(os.getenv("STT_BREAKER_WINDOW_SECONDS") or 300)
+MIN_CALLS = int(os.getenv("STT_BREAKER_MIN_CALLS") or 5)
+ERROR_RATE = float(os.getenv("STT_BREAKER_ERROR_RATE") or 0.5)
+SLOW_SECONDS = float(os.getenv("STT_BREAKER_SLOW_SECONDS") or 900)
+COOLDOWN_SECONDS = float(os.getenv("STT_BREAKER_COOLDOWN_SECONDS") or 60)
+# How long a probe may run before another process may probe instead.
+PROBE_SECONDS = float(os.getenv("STT_BREAKER_PROBE_SECONDS") or 900)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Outcomes kept per provider, whatever their age.
+_MAX_OUTCOMES = 100
+
+_counts_lock = threading.Lock()
+_counts: Dict[str, Dict[str, int]] = {}
+
+
+def _fresh() -> dict:
+    return {"state": CLOSED, "opened_at": 0.0, "probe_until": 0.0, "outcomes": []}
+
+
+@contextmanager
+def _locked(provider: str, exclusive: bool) -> Iterator[dict]:
+    """The breaker state for [provider], written back on exit when [exclusive]."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(os.path.join(STATE_DIR, f"{provider}.json"), "a+") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            handle.seek(0)
+            try:
+                state = json.loads(handle.read() or "null") or _fresh()
+            except ValueError:
+                state = _fresh()
+            yield state
+            if exclusive:
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps(state))
+                handle.flush()
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _phase(state: dict, now: float) -> str:
+    if state["state"] == CLOSED:
+        return CLOSED
+    if now < state["opened_at"] + COOLDOWN_SECONDS or now < state["probe_until"]:
+        return OPEN
+    return HALF_OPEN
+
+
+def is_open(provider: str) -> bool:
+    """True while calls to [provider] should be skipped: it is cooling down
+    after failing, or another call is already probing it."""
+    if not ENABLED:
+        return False
+    try:
+        with _locked(provider, exclusive=False) as state:
+            return _phase(state, time.time()) == OPEN
+    except OSError as exc:
+        logger.warning("Could not read the %s breaker: %s", provider, exc)
+        return False
+
+
+def try_acquire(provider: str) -> bool:
+    """True when a call to [provider] may go ahead now; False while it is open.
+
+    A half-open [provider] lets exactly one caller through, as its probe. The
+    check and the claim happen under one exclusive lock, so of the callers
+    arriving together, in any process, only the first gets True; `is_open`
+    alone cannot promise that.
+    """
+    return claim(provider) is not None
+
+
+def claim(provider: str) -> Optional[float]:
+    """`try_acquire`, for a caller that may have to hand its probe back: None
+    when refused, else the claimed probe's deadline, or 0.0 for no probe."""
+    if not ENABLED:
+        return 0.0
+    now = time.time()
+    try:
+        with _locked(provider, exclusive=True) as state:
+            phase = _phase(state, now)
+            if phase == OPEN:
+                return None
+            if phase == HALF_OPEN:
+                state["probe_until"] = now + PROBE_SECONDS
+                logger.info("Probing STT provider %s after its circuit opened.", provider)
+                _count(provider, "probes")
+                return state["probe_until"]
+            return 0.0
+    except OSError as exc:
+        logger.warning("Could not update the %s breaker: %s", provider, exc)
+        return 0.0
+
+
+def release_probe(provider: str, probe: float) -> None:
+    """Hands back [probe], from `claim`, unfinished, so the next caller probes
+    instead of the circuit staying half-open until it lapses. Does nothing if
+    the probe has since been settled or claimed again."""
+    if not ENABLED or not probe:
+        return
+    try:
+        with _locked(provider, exclusive=True) as state:
+            if state["probe_until"] == probe:
+                state["probe_until"] = 0.0
+    except OSError as exc:
+        logger.warning("Could not update the %s breaker: %s", provider, exc)
+
+
+def record(provider: str, ok: bool, seconds: float) -> None:
+    """Notes the outcome of one call to [provider], opening or closing it."""
+    if not ENABLED:
+        return
+    ok = ok and seconds < SLOW_SECONDS
+    now = time.time()
+    try:
+        with _locked(provider, exclusive=True) as state:
+            if state["state"] == OPEN:
+                _settle_probe(provider, state, ok, now)
+                return
+            outcomes = [
+                entry for entry in state["outcomes"] if entry[0] > now - WINDOW_SECONDS
+            ]
+            outcomes.append([now, ok])
+            state["outcomes"] = outcomes[-_MAX_OUTCOMES:]
+            failures = sum(1 for _, succeeded in state["outcomes"] if not succeeded)
+            if (
+                len(state["outcomes"]) >= MIN_CALLS
+                and failures / len(state["outcomes"]) >= ERROR_RATE
+            ):
+                logger.error(
+                    "Opening the circuit for STT provider %s: %d of its last %d calls failed.",
+                    provider, failures, len(state["outcomes"]),
+                )
+                state.update(state=OPEN, opened_at=now, probe_until=0.0, outcomes=[])
+                _count(provider, "opened")
+    except OSError as exc:
+        logger.warning("Could not update the %s breaker: %s", provider, exc)
+
+
+def _settle_probe(provider: str, state: dict, ok: bool, now: float) -> None:
+    # Only the probe's outcome counts; calls that were already running when
+    # the breaker opened tell us nothing new.
+    if not state["probe_until"]:
+        return
+    if ok:
+        logger.warning("Closing the circuit for STT provider %s: its probe succeeded.", provider)
+        state.update(_fresh())
+        _count(provider, "closed")
+    else:
+        logger.error("STT provider %s failed its probe; the circuit stays open.", provider)
+        state.update(opened_at=now, probe_until=0.0)
+        _count(provider, "reopened")
+
+
+def _count(provider: str, event: str) -> None:
+    with _counts_lock:
+        counts = _counts.setdefault(provider, {})
+        counts[event] = counts.get(event, 0) + 1
+
+
+def stats() -> dict:
+    """Each provider's shared state, with this process's transition counts."""
+    if not ENABLED:
+        return {"enabled": False}
+    now = time.time()
+    snapshot: dict = {}
+    try:
+        names = sorted(name[:-5] for name in os.listdir(STATE_DIR) if name.endswith(".json"))
+    except FileNotFoundError:
+        names = []
+    for provider in names:
+        with _locked(provider, exclusive=False) as state:
+            outcomes = state["outcomes"]
+            snapshot[provider] = {
+                "state": _phase(state, now),
+                "recent_calls": len(outcomes),
+                "recent_failures": sum(1 for _, ok in outcomes if not ok),
+            }
+    with _counts_lock:
+        for provider, counts in _counts.items():
+            snapshot.setdefault(provider, {}).update(counts)
+    return snapshot
+
+
+metrics.register("stt_breakers", stats)
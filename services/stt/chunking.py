@@ -0,0 +1,197 @@
+"""Splits long recordings at pauses so the pieces can be transcribed in parallel.
+
+OpenAI refuses uploads over 25 MB and Sarvam works through one long file
+serially, so a lecture was either rejected outright or took as long to
+transcribe as its slowest vendor cared to take. The pipeline now decodes long
+recordings (`audio.decode`), finds the pauses with frame-energy analysis,
+cuts near every CHUNK_SECONDS at the pause closest to that mark, and sends
+the pieces out concurrently.
+
+Cutting inside a pause means no word is split across two pieces. Each piece is
+a 16 kHz mono WAV, about 19 MB for ten minutes, comfortably under OpenAI's cap.
+
+Speakers are the hard part: each request numbers its speakers independently,
+so "Speaker 1" in one piece need not be "Speaker 1" in the next. `stitch`
+relabels every piece's speakers by how much each one talks, matching the most
+talkative speaker of the piece to the most talkative so far, and so on. It is a
+heuristic, but a dependable one for the recordings long enough to be chunked:
+lectures, interviews and meetings have a stable order of who talks most.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, write_wav
+from .types import TranscriptionResult, TranscriptSegment
+
+# Target length of a piece. Cuts land within SEARCH_SECONDS of each mark.
+CHUNK_SECONDS = float(os.getenv("STT_CHUNK_SECONDS") or 600)
+SEARCH_SECONDS = float(os.getenv("STT_CHUNK_SEARCH_SECONDS") or 60)
+
+# Analysis frame, and the shortest run of quiet frames that counts as a pause.
+FRAME_SECONDS = 0.03
+MIN_SILENCE_SECONDS = 0.4
+
+# A frame is quiet below this fraction of the recording's loud (95th
+# percentile) frame energy, or below an absolute floor for near-silent input.
+_RELATIVE_THRESHOLD = 0.1
+_ABSOLUTE_FLOOR = 100.0
+
+# Frames analysed per block, to keep memory flat on memory-mapped input.
+_BLOCK_FRAMES = 1 << 16
+
+
+@dataclass(frozen=True)
+class Chunk:
+    index: int
+    start: int  # first sample
+    end: int  # one past the last sample
+    path: str
+
+
+def frame_rms(samples: np.ndarray, rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Root-mean-square energy of each FRAME_SECONDS frame of [samples]."""
+    frame = max(1, int(rate * FRAME_SECONDS))
+    count = len(samples) // frame
+    rms = np.empty(count, dtype=np.float32)
+    for first in range(0, count, _BLOCK_FRAMES):
+        last = min(count, first + _BLOCK_FRAMES)
+        block = np.asarray(samples[first * frame : last * frame], dtype=np.float32)
+        block = block.reshape(last - first, frame)
+        rms[first:last] = np.sqrt(np.mean(block * block, axis=1))
+    return rms
+
+
+def quiet_frames(rms: np.ndarray) -> np.ndarray:
+    """Boolean mask of frames quiet enough to be a pause."""
+    if len(rms) == 0:
+        return np.zeros(0, dtype=bool)
+    loud = float(np.percentile(rms, 95))
+    threshold = max(loud * _RELATIVE_THRESHOLD, _ABSOLUTE_FLOOR)
+    return rms < threshold
+
+
+def find_silences(samples: np.ndarray, rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """(start, end) sample ranges of pauses at least MIN_SILENCE_SECONDS long."""
+    quiet = quiet_frames(frame_rms(samples, rate))
+    if not quiet.any():
+        return []
+
+    # Edges of each run of quiet frames, found without a Python-level loop.
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_frames = int(np.ceil(MIN_SILENCE_SECONDS / FRAME_SECONDS))
+    keep = ends - starts >= min_frames
+
+    frame = int(rate * FRAME_SECONDS)
+    return [(int(s) * frame, int(e) * frame) for s, e in zip(starts[keep], ends[keep])]
+
+
+def plan_cuts(
+    total: int,
+    silences: Sequence[Tuple[int, int]],
+    rate: int = SAMPLE_RATE,
+    chunk_seconds: Optional[float] = None,
+    search_seconds: Optional[float] = None,
+) -> List[int]:
+    """Sample offsets to cut at: the middle of the pause nearest each
+    [chunk_seconds] mark, or the mark itself when no pause is near."""
+    target = int((chunk_seconds or CHUNK_SECONDS) * rate)
+    window = int((search_seconds if search_seconds is not None else SEARCH_SECONDS) * rate)
+    middles = np.array([(s + e) // 2 for s, e in silences], dtype=np.int64)
+
+    cuts: List[int] = []
+    position = 0
+    while total - position > target + window:
+        mark = position + target
+        cut = mark
+        if len(middles):
+            nearest = middles[np.argmin(np.abs(middles - mark))]
+            if abs(int(nearest) - mark) <= window and nearest > position:
+                cut = int(nearest)
+        cuts.append(cut)
+        position = cut
+    return cuts
+
+
+def split(samples: np.ndarray, directory: str, rate: int = SAMPLE_RATE) -> List[Chunk]:
+    """Writes [samples] as WAV pieces cut at pauses into [directory]. Returns
+    no pieces when the recording is short enough to be sent whole."""
+    cuts = plan_cuts(len(samples), find_silences(samples, rate), rate)
+    if not cuts:
+        return []
+    os.makedirs(directory, exist_ok=True)
+    bounds = [0, *cuts, len(samples)]
+    chunks = []
+    for index, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        path = os.path.join(directory, f"chunk-{index:04d}.wav")
+        write_wav(samples[start:end], path, rate)
+        chunks.append(Chunk(index=index, start=start, end=end, path=path))
+    return chunks
+
+
+def stitch(results: Sequence[TranscriptionResult], provider_order: Sequence[str]) -> TranscriptionResult:
+    """One result from the results for consecutive pieces, speakers reconciled.
+
+    The provider is the one every piece used, or each one used joined with
+    "+" in [provider_order] when fallbacks were involved. Stats are summed.
+    """
+    talk_time: Dict[str, int] = {}
+    segments: List[TranscriptSegment] = []
+
+    for result in results:
+        mapping = _match_speakers(result.segments, talk_time)
+        for segment in result.segments:
+            speaker = mapping.get(segment.speaker) if segment.speaker else None
+            segments.append(TranscriptSegment(text=segment.text, speaker=speaker))
+            if speaker:
+                talk_time[speaker] = talk_time.get(speaker, 0) + len(segment.text or "")
+
+    used = {result.provider for result in results}
+    provider = "+".join(name for name in provider_order if name in used) or (
+        results[0].provider if results else ""
+    )
+    language = next((r.language for r in results if r.language), None)
+    stats: Dict[str, float] = {}
+    for result in results:
+        for name, value in result.stats.items():
+            stats[name] = stats.get(name, 0) + value
+    return TranscriptionResult(
+        segments=segments, provider=provider, language=language, stats=stats
+    )
+
+
+def _match_speakers(
+    segments: Sequence[TranscriptSegment], talk_time: Dict[str, int]
+) -> Dict[Optional[str], str]:
+    """Maps a piece's speaker labels onto the labels used so far, by rank of
+    how much each talks; speakers beyond those seen so far get new labels."""
+    local: Dict[str, int] = {}
+    for segment in segments:
+        if segment.speaker:
+            local[segment.speaker] = local.get(segment.speaker, 0) + len(segment.text or "")
+
+    ranked_local = sorted(local, key=lambda label: (-local[label], label))
+    ranked_global = sorted(talk_time, key=lambda label: (-talk_time[label], label))
+
+    mapping: Dict[Optional[str], str] = {}
+    taken = set(talk_time)
+    for rank, label in enumerate(ranked_local):
+        if rank < len(ranked_global):
+            mapping[label] = ranked_global[rank]
+            continue
+        # A voice not heard before keeps its own label unless that is taken.
+        fresh = label
+        number = len(taken) + 1
+        while fresh in taken:
+            fresh = f"Speaker {number}"
+            number += 1
+        mapping[label] = fresh
+        taken.add(fresh)
+    return mapping
@@ -0,0 +1,66 @@
+"""Async SDK clients, kept one per event loop.
+
+An async client's connections belong to the loop that opened them, so a client
+made on one loop cannot serve another: `transcribe` runs each recording on a
+loop of its own, and a worker may run several loops at once. A loop that is
+about to close hands its clients' connections back with `close_all`, rather
+than leaving their sockets open until the clients are garbage-collected.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger("STT.Clients")
+
+T = TypeVar("T")
+
+_caches: "weakref.WeakSet[PerLoop]" = weakref.WeakSet()
+
+
+class PerLoop(Generic[T]):
+    """The value [factory] made for the running event loop, made on first use
+    there and dropped once the loop is garbage-collected. [close] releases a
+    value's connections when `close_all` runs on its loop."""
+
+    def __init__(
+        self,
+        factory: Callable[[], T],
+        close: Optional[Callable[[T], Awaitable[None]]] = None,
+    ):
+        self._factory = factory
+        self._close = close
+        self._lock = threading.Lock()
+        self._values: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = (
+            weakref.WeakKeyDictionary()
+        )
+        _caches.add(self)
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            value = self._values.get(loop)
+            if value is None:
+                value = self._values[loop] = self._factory()
+            return value
+
+    async def _close_for(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            value = self._values.pop(loop, None)
+        if value is None or self._close is None:
+            return
+        try:
+            await self._close(value)
+        except Exception as exc:
+            logger.warning("Closing an async client failed: %s", exc)
+
+
+async def close_all() -> None:
+    """Closes every client made for the running loop. For a loop's teardown."""
+    loop = asyncio.get_running_loop()
+    for cache in list(_caches):
+        await cache._close_for(loop)
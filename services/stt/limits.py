@@ -0,0 +1,167 @@
+"""Caps on simultaneous calls to each STT provider, across worker processes.
+
+Nothing used to bound how many Sarvam jobs or OpenAI requests were in flight,
+so busy periods ran into the vendors' rate limits, and the failures that came
+back set off fallbacks that were no use either. Each provider now has MAX_CALLS
+slots for the whole host. A call waits for a free slot; the pipeline gives up
+on a provider after WAIT_SECONDS when there is a fallback to spill over to, and
+otherwise keeps waiting.
+
+A slot is an exclusive `flock` on one of the provider's lock files under
+LOCK_DIR, so slots are shared by every gunicorn worker and come free by
+themselves when a process dies holding one. Waiters poll with backoff rather
+than queueing in order: fair enough for a few dozen jobs, and it needs nothing
+beyond the filesystem.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Dict, Generator, Optional
+
+from .. import metrics
+from .router import OPENAI, SARVAM
+
+logger = logging.getLogger("STT.Limits")
+
+ENABLED = (os.getenv("STT_LIMITS") or "1") != "0"
+LOCK_DIR = os.getenv("STT_LIMIT_DIR") or "stt_limits"
+# Slots per provider for the host. 0 leaves a provider unlimited.
+MAX_CALLS: Dict[str, int] = {
+    SARVAM: int(os.getenv("STT_SARVAM_MAX_CONCURRENT") or 8),
+    OPENAI: int(os.getenv("STT_OPENAI_MAX_CONCURRENT") or 16),
+}
+# How long a call waits for a slot before spilling to the fallback.
+WAIT_SECONDS = float(os.getenv("STT_LIMIT_WAIT_SECONDS") or 30)
+
+_POLL_SECONDS = 0.05
+_MAX_POLL_SECONDS = 1.0
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+class Slot:
+    """One of a provider's call slots, held until `release`. [waited] is how
+    long it took to get: 0 when one was free straight away."""
+
+    def __init__(self, handle=None, waited: float = 0.0):
+        self._handle = handle
+        self.waited = waited
+
+    def release(self) -> None:
+        if self._handle is not None:
+            # Closing the descriptor drops the lock.
+            self._handle.close()
+            self._handle = None
+
+    def __enter__(self) -> "Slot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def acquire(
+    provider: str, timeout: Optional[float], cancelled: Optional[threading.Event] = None
+) -> Optional[Slot]:
+    """A slot for a call to [provider], waiting up to [timeout] seconds (None:
+    as long as it takes). None when the wait timed out or [cancelled] was set."""
+    attempts = _attempts(provider, timeout, cancelled)
+    while True:
+        try:
+            time.sleep(next(attempts))
+        except StopIteration as finished:
+            return finished.value
+
+
+async def acquire_async(provider: str, timeout: Optional[float]) -> Optional[Slot]:
+    """`acquire` for a coroutine, which waits without holding a thread and
+    stops waiting when cancelled."""
+    attempts = _attempts(provider, timeout, None)
+    while True:
+        try:
+            pause = next(attempts)
+        except StopIteration as finished:
+            return finished.value
+        await asyncio.sleep(pause)
+
+
+def _attempts(
+    provider: str, timeout: Optional[float], cancelled: Optional[threading.Event]
+) -> Generator[float, None, Optional[Slot]]:
+    """One wait for a slot: yields each pause to take between tries, and
+    returns the slot, or None."""
+    limit = MAX_CALLS.get(provider, 0)
+    if not ENABLED or limit <= 0:
+        return Slot()
+
+    started = time.monotonic()
+    poll = _POLL_SECONDS
+    attempts = 0
+    while True:
+        handle = _try_lock(provider, limit)
+        attempts += 1
+        waited = time.monotonic() - started if attempts > 1 else 0.0
+        if handle is not None:
+            _count(provider, waited, timed_out=False)
+            if waited >= 1:
+                logger.info("Waited %.1fs for a %s call slot.", waited, provider)
+            return Slot(handle, waited)
+        if cancelled is not None and cancelled.is_set():
+            return None
+        if timeout is not None and waited >= timeout:
+            _count(provider, waited, timed_out=True)
+            logger.warning(
+                "No %s call slot free after %.1fs (%d in use).", provider, waited, limit
+            )
+            return None
+        yield poll if timeout is None else min(poll, max(timeout - waited, 0.0))
+        poll = min(poll * 2, _MAX_POLL_SECONDS)
+
+
+def _try_lock(provider: str, limit: int):
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    for index in range(limit):
+        handle = open(os.path.join(LOCK_DIR, f"{provider}.{index}.lock"), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            continue
+        return handle
+    return None
+
+
+def _count(provider: str, waited: float, timed_out: bool) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(
+            provider,
+            {"acquired": 0, "timeouts": 0, "waited_seconds": 0.0, "max_wait_seconds": 0.0},
+        )
+        stats["timeouts" if timed_out else "acquired"] += 1
+        stats["waited_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        snapshot = {
+            provider: {
+                **counts,
+                "waited_seconds": round(counts["waited_seconds"], 3),
+                "max_wait_seconds": round(counts["max_wait_seconds"], 3),
+            }
+            for provider, counts in _stats.items()
+        }
+    for provider, limit in MAX_CALLS.items():
+        snapshot.setdefault(provider, {})["limit"] = limit
+    return snapshot
+
+
+metrics.register("stt_limits", stats)
@@ -0,0 +1,158 @@
+"""Shrinks recordings to 16 kHz mono before they are uploaded to a provider.
+
+Web uploads are often 48 kHz stereo, and were sent to Sarvam and OpenAI as they
+came: several times the bytes either vendor uses, slower to upload, and up
+against OpenAI's 25 MB limit far sooner than the speech in them warrants. Both
+vendors resample to 16 kHz mono regardless, so `normalise` re-encodes to that
+first (`audio.encode_speech`) and keeps the result only when it saves at least
+MIN_SAVING of the original; otherwise the original is sent unchanged.
+
+Encoding is CPU-bound, so it runs in a small process pool rather than on the
+transcription threads, where it would hold the GIL for the numpy fallback and
+compete with request handling in the same worker.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from .. import metrics
+from . import audio
+
+logger = logging.getLogger("STT.Normalise")
+
+ENABLED = (os.getenv("STT_NORMALISE") or "1") != "0"
+# Smaller recordings upload quickly anyway; not worth a trip to the pool.
+MIN_BYTES = int(os.getenv("STT_NORMALISE_MIN_BYTES") or 1024 * 1024)
+# Fraction of the original an encoding must save to be used.
+MIN_SAVING = float(os.getenv("STT_NORMALISE_MIN_SAVING") or 0.25)
+# Encoder processes. 0 encodes on the calling thread.
+WORKERS = int(os.getenv("STT_NORMALISE_WORKERS") or 2)
+
+_SUBDIR = "normalised"
+
+
+@dataclass(frozen=True)
+class Normalised:
+    path: str  # the file to upload: the encoding, or the original
+    bytes_saved: int = 0
+    seconds: float = 0.0
+
+    @property
+    def replaced(self) -> bool:
+        return self.bytes_saved > 0
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"encoded": 0, "kept_original": 0, "failed": 0, "bytes_saved": 0, "seconds": 0.0}
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Spawned, not forked: the parent is a threaded gunicorn worker.
+            # A spawned child re-imports the main module as __mp_main__, so
+            # an entry point run as a script keeps its start-up work behind a
+            # check of __name__ (see app.py).
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def normalise(audio_path: str) -> Normalised:
+    """A 16 kHz mono encoding of [audio_path] when that is worth uploading
+    instead, else [audio_path] itself. Never raises: the original always works.
+
+    The encoding is written to a subdirectory of the recording's; remove it
+    with `discard` once the upload is done.
+    """
+    try:
+        size = os.path.getsize(audio_path)
+    except OSError:
+        return Normalised(audio_path)
+    if not ENABLED or size < MIN_BYTES or not _can_shrink(audio_path):
+        return Normalised(audio_path)
+
+    directory = os.path.join(os.path.dirname(audio_path) or ".", _SUBDIR)
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.splitext(os.path.basename(audio_path))[0]
+    target = os.path.join(directory, base + audio.speech_extension())
+
+    started = time.monotonic()
+    try:
+        if WORKERS > 0:
+            _executor().submit(audio.encode_speech, audio_path, target).result()
+        else:
+            audio.encode_speech(audio_path, target)
+        encoded = os.path.getsize(target)
+    except Exception as exc:
+        logger.warning("Could not normalise %s, sending it as is: %s", audio_path, exc)
+        _discard_file(target)
+        _count("failed")
+        return Normalised(audio_path)
+    seconds = time.monotonic() - started
+
+    saved = size - encoded
+    if saved < size * MIN_SAVING:
+        logger.info(
+            "Normalising %s saved only %d of %d bytes; sending the original.",
+            audio_path, max(saved, 0), size,
+        )
+        _discard_file(target)
+        _count("kept_original", seconds=seconds)
+        return Normalised(audio_path, seconds=seconds)
+
+    logger.info(
+        "Normalised %s from %d to %d bytes in %.2fs.", audio_path, size, encoded, seconds
+    )
+    _count("encoded", bytes_saved=saved, seconds=seconds)
+    return Normalised(target, bytes_saved=saved, seconds=seconds)
+
+
+def discard(normalised: Normalised) -> None:
+    if normalised.replaced:
+        _discard_file(normalised.path)
+
+
+def _can_shrink(audio_path: str) -> bool:
+    if audio.ffmpeg_path() is not None:
+        return True
+    # Without ffmpeg the only output is WAV, which only helps a WAV that is
+    # not 16 kHz mono already.
+    return audio.can_decode(audio_path) and not audio.is_speech_format(audio_path)
+
+
+def _discard_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _count(outcome: str, bytes_saved: int = 0, seconds: float = 0.0) -> None:
+    with _stats_lock:
+        _stats[outcome] += 1
+        _stats["bytes_saved"] += bytes_saved
+        _stats["seconds"] += seconds
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "seconds": round(_stats["seconds"], 3)}
+
+
+metrics.register("stt_normalise", stats)
@@ -8,10 +8,12 @@ routed here instead of to Sarvam.
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 from typing import List, Optional
 
+from .clients import PerLoop
 from .languages import to_openai_code
 from .types import (
     TranscriptionError,
@@ -31,18 +33,37 @@ MAX_UPLOAD_BYTES = 25 * 1024 * 1024
 _client = None
 
 
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise TranscriptionError(
+            "Transcription is not configured on the server.", provider_fault=False
+        )
+    return api_key
+
+
 def _get_client():
     global _client
     if _client is None:
         from openai import OpenAI
 
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise TranscriptionError("Transcription is not configured on the server.")
-        _client = OpenAI(api_key=api_key)
+        _client = OpenAI(api_key=_api_key())
     return _client
 
 
+def _new_async_client():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=_api_key())
+
+
+_async_clients = PerLoop(_new_async_client, close=lambda client: client.close())
+
+
+def _get_async_client():
+    return _async_clients.get()
+
+
 def _parse(response, language: Optional[str]) -> TranscriptionResult:
     """Reads a `diarized_json` response into a provider-neutral result."""
     segments: List[TranscriptSegment] = []
@@ -70,6 +91,7 @@ def _parse(response, language: Optional[str]) -> TranscriptionResult:
 
 class OpenAIProvider:
     name = "openai"
+    model = MODEL
 
     def is_available(self) -> bool:
         return bool(os.getenv("OPENAI_API_KEY"))
@@ -77,34 +99,29 @@ class OpenAIProvider:
     def transcribe(
         self, audio_path: str, language: Optional[str] = None
     ) -> TranscriptionResult:
-        size = os.path.getsize(audio_path)
-        if size > MAX_UPLOAD_BYTES:
-            raise TranscriptionError(
-                "That recording is too long to transcribe in this language. "
-                "Please split it into shorter recordings."
-            )
+        kwargs = _request(audio_path, language)
+        try:
+            with open(audio_path, "rb") as handle:
+                response = _get_client().audio.transcriptions.create(file=handle, **kwargs)
+            return _parse(response, language)
 
-        language_code = to_openai_code(language)
-        logger.info(
-            "OpenAI transcription start (language=%s, bytes=%s)",
-            language_code or "auto",
-            size,
-        )
+        except TranscriptionError:
+            raise
+        except Exception as exc:
+            logger.error("OpenAI transcription error: %s", exc, exc_info=True)
+            raise TranscriptionError("Transcription failed. Please try again.") from exc
 
+    async def transcribe_async(
+        self, audio_path: str, language: Optional[str] = None
+    ) -> TranscriptionResult:
+        kwargs = _request(audio_path, language)
         try:
+            # At most MAX_UPLOAD_BYTES, read off the event loop.
             with open(audio_path, "rb") as handle:
-                kwargs = {
-                    "model": MODEL,
-                    "file": handle,
-                    "response_format": "diarized_json",
-                    # Required for anything over 30 seconds on this model.
-                    "chunking_strategy": "auto",
-                }
-                if language_code:
-                    kwargs["language"] = language_code
-
-                response = _get_client().audio.transcriptions.create(**kwargs)
-
+                data = await asyncio.to_thread(handle.read)
+            response = await _get_async_client().audio.transcriptions.create(
+                file=(os.path.basename(audio_path), data), **kwargs
+            )
             return _parse(response, language)
 
         except TranscriptionError:
@@ -112,3 +129,32 @@ class OpenAIProvider:
         except Exception as exc:
             logger.error("OpenAI transcription error: %s", exc, exc_info=True)
             raise TranscriptionError("Transcription failed. Please try again.") from exc
+
+
+def _request(audio_path: str, language: Optional[str]) -> dict:
+    """The transcription request for [audio_path], less the file itself.
+    Raises when the file is over the upload limit."""
+    size = os.path.getsize(audio_path)
+    if size > MAX_UPLOAD_BYTES:
+        raise TranscriptionError(
+            "That recording is too long to transcribe in this language. "
+            "Please split it into shorter recordings.",
+            provider_fault=False,
+        )
+
+    language_code = to_openai_code(language)
+    logger.info(
+        "OpenAI transcription start (language=%s, bytes=%s)",
+        language_code or "auto",
+        size,
+    )
+
+    kwargs = {
+        "model": MODEL,
+        "response_format": "diarized_json",
+        # Required for anything over 30 seconds on this model.
+        "chunking_strategy": "auto",
+    }
+    if language_code:
+        kwargs["language"] = language_code
+    return kwargs
@@ -70,6 +70,21 @@ def select_fallback(primary: str, language: Optional[str] = None) -> Optional[st
     return None
 
 
+def is_interchangeable(language: Optional[str] = None, locale: Optional[str] = None) -> bool:
+    """True when either provider would serve this recording well enough.
+
+    Only two cases qualify: auto-detect with no locale, where the rules lean to
+    Sarvam for the existing users rather than from anything in the request, and
+    Indian English, which both providers transcribe well. Everywhere else the
+    rules follow a real coverage or accuracy difference and are not negotiable;
+    see `scoring` for what is done with the slack.
+    """
+    normalised = normalise_language(language)
+    if normalised is None:
+        return not locale
+    return normalised == "en-in"
+
+
 def provider_chain(
     language: Optional[str] = None, locale: Optional[str] = None
 ) -> list:
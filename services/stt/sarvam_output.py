@@ -0,0 +1,256 @@
+"""Sarvam job output, read from the download as it arrives.
+
+`download_outputs` wrote every output file to a directory, which the provider
+then read back, `json.load`ed whole and deleted. A diarized transcript of a
+multi-hour recording is tens of megabytes of JSON and several times that once
+loaded, all held at once just to be turned into segments one entry at a time.
+
+`SarvamOutput` wraps the downloaded bytes instead and only decodes as far as it
+is asked to. It answers `get` like the payload dict `_parse` used to receive,
+but `get("diarized_transcript").get("entries")` is an iterator that decodes one
+entry per step, so only the entry being converted is in memory. Asked in
+stream order, as `_parse` asks, nothing is decoded twice or kept longer than
+needed. Asked out of order, the fields passed over are kept so every answer
+is still right.
+
+Only the structure around the entries is walked by hand; every value, an entry
+included, is decoded by the standard library's `json` decoder.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+_WHITESPACE = " \t\n\r"
+
+# Values at least this large are not worth re-scanning every time a little
+# more of them arrives; see `_Reader.value`.
+_MIN_READ = 64 * 1024
+
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_STRING_REST = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+
+class _Reader:
+    """A cursor over JSON text arriving in byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._text = ""
+        self._pos = 0
+        self._exhausted = False
+
+    def _fill(self, at_least: int = 1) -> bool:
+        """Appends at least [at_least] more characters; False at the end."""
+        if self._pos > len(self._text) // 2:
+            self._text = self._text[self._pos:]
+            self._pos = 0
+        added = 0
+        while added < at_least:
+            if self._exhausted:
+                return added > 0
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+                tail = self._utf8.decode(b"", final=True)
+            else:
+                tail = self._utf8.decode(chunk)
+            self._text += tail
+            added += len(tail)
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character, without consuming it."""
+        while True:
+            while self._pos < len(self._text) and self._text[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._text):
+                return self._text[self._pos]
+            if not self._fill():
+                raise ValueError("Sarvam output ended early.")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Sarvam output: expected {char!r} at {self._pos}.")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decodes the next complete value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._text, self._pos)
+            except json.JSONDecodeError:
+                # Incomplete, most likely. Read at least as much again before
+                # retrying, so a large value is re-scanned only a few times.
+                pending = len(self._text) - self._pos
+                if not self._fill(max(pending, _MIN_READ)):
+                    raise
+                continue
+            if end == len(self._text) and not self._exhausted:
+                # A number may go on in the next chunk.
+                if self._fill():
+                    continue
+            self._pos = end
+            return value
+
+    def skip(self) -> None:
+        """Passes over the next value without decoding it."""
+        if self.peek() not in "[{":
+            self.value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self._text, self._pos)
+            if match is not None and match.group() == '"':
+                rest = _STRING_REST.match(self._text, match.end())
+                if rest is not None:
+                    self._pos = rest.end()
+                    continue
+                # The string goes on in the next chunk.
+                self._pos = match.start()
+            elif match is not None:
+                self._pos = match.end()
+                depth += 1 if match.group() in "[{" else -1
+                if depth == 0:
+                    return
+                continue
+            else:
+                self._pos = len(self._text)
+            if not self._fill(max(len(self._text) - self._pos, _MIN_READ)):
+                raise ValueError("Sarvam output ended early.")
+
+    def next_member(self, first: bool) -> Optional[str]:
+        """The next key in the current object, positioned on its value; None
+        (having consumed the "}") when the object ends."""
+        if self.peek() == "}":
+            self._pos += 1
+            return None
+        if not first:
+            self.expect(",")
+        key = self.value()
+        self.expect(":")
+        return key
+
+    def next_item(self, first: bool) -> bool:
+        """Positions on the next array item; False (having consumed the "]")
+        when the array ends."""
+        if self.peek() == "]":
+            self._pos += 1
+            return False
+        if not first:
+            self.expect(",")
+        return True
+
+
+class _Diarized:
+    """The `diarized_transcript` object, read lazily."""
+
+    def __init__(self, output: "SarvamOutput"):
+        self._output = output
+        self.fields: Dict[str, Any] = {}
+        # Entries read past while answering another question.
+        self.skipped: Deque[Any] = deque()
+        self.streaming = False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "entries":
+            self._output._advance(lambda: self.streaming or key in self.fields)
+            if self.streaming:
+                return self._entries()
+        else:
+            self._output._advance(lambda: key in self.fields)
+        return self.fields.get(key, default)
+
+    def _entries(self) -> Iterator[Any]:
+        """Every entry, decoded one at a time. Can be iterated once."""
+        while self.skipped:
+            yield self.skipped.popleft()
+        while True:
+            event = self._output._step()
+            if not event:
+                return
+            yield event[0]
+
+
+class SarvamOutput:
+    """One job output, parsed from [chunks] of its JSON as it is read.
+
+    With [keys], other top-level fields (word timestamps, say) are passed over
+    without being decoded, and `get` does not find them.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], keys: Optional[Iterable[str]] = None):
+        self._reader = _Reader(chunks)
+        self._keys = None if keys is None else frozenset(keys)
+        self._fields: Dict[str, Any] = {}
+        self._walk = self._events()
+        self._done = False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._advance(lambda: key in self._fields)
+        return self._fields.get(key, default)
+
+    def _advance(self, until) -> None:
+        """Reads on until [until]() holds or the output ends. Entries read on
+        the way are kept for whoever iterates them later."""
+        while not until() and not self._done:
+            event = self._step()
+            if event:
+                self._fields["diarized_transcript"].skipped.append(event[0])
+
+    def _step(self) -> Optional[Tuple]:
+        """Steps the walk once; None at the end of the output."""
+        event = next(self._walk, None)
+        if event is None:
+            self._done = True
+        return event
+
+    def _events(self) -> Iterator[Tuple]:
+        """Walks the output, recording fields as it passes them. Yields a
+        1-tuple per entry and an empty tuple after any other step."""
+        reader = self._reader
+        reader.expect("{")
+        first = True
+        while True:
+            key = reader.next_member(first)
+            first = False
+            if key is None:
+                break
+            if self._keys is not None and key not in self._keys:
+                reader.skip()
+                yield ()
+            elif key == "diarized_transcript" and reader.peek() == "{":
+                yield from self._diarized_events()
+            else:
+                self._fields[key] = reader.value()
+                yield ()
+
+    def _diarized_events(self) -> Iterator[Tuple]:
+        reader = self._reader
+        diarized = self._fields["diarized_transcript"] = _Diarized(self)
+        reader.expect("{")
+        first = True
+        while True:
+            key = reader.next_member(first)
+            first = False
+            if key is None:
+                break
+            if key == "entries" and reader.peek() == "[":
+                reader.expect("[")
+                diarized.streaming = True
+                yield ()
+                item_first = True
+                while reader.next_item(item_first):
+                    item_first = False
+                    yield (reader.value(),)
+            else:
+                diarized.fields[key] = reader.value()
+                yield ()
+        yield ()
@@ -0,0 +1,171 @@
+"""One loop that watches every outstanding Sarvam job in the process.
+
+`wait_until_complete()` polled each job from the thread that submitted it, every
+five seconds, for as long as Sarvam took: a transcription worker spent most of
+each job asleep inside the SDK, and every waiting job made its own status
+requests. `watch` now hands a job to a shared poller and returns a Future. The
+poller checks each job on its own schedule, soon after submission and then
+backing off geometrically up to POLL_MAX_SECONDS, so a long recording is not
+asked about every few seconds for half an hour. Status requests run on a few
+threads whatever the number of jobs.
+
+A synchronous caller still waits on the Future, but does so parked
+(`transcription_pool.parked`), so its pool slot goes to another job meanwhile.
+An asyncio caller awaits it without holding a thread at all.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from .. import metrics
+
+logger = logging.getLogger("STT.SarvamPoller")
+
+POLL_MIN_SECONDS = float(os.getenv("SARVAM_POLL_MIN_SECONDS") or 2)
+POLL_MAX_SECONDS = float(os.getenv("SARVAM_POLL_MAX_SECONDS") or 20)
+POLL_BACKOFF = 1.5
+# What `wait_until_complete` allowed by default.
+TIMEOUT_SECONDS = float(os.getenv("SARVAM_JOB_TIMEOUT_SECONDS") or 600)
+POLL_THREADS = int(os.getenv("SARVAM_POLL_THREADS") or 4)
+
+# Consecutive failed status requests before a job is given up on.
+_MAX_STATUS_ERRORS = 3
+
+_FINISHED = {"completed", "failed"}
+
+
+class _Watch:
+    def __init__(self, job, future: Future, timeout: float):
+        now = time.monotonic()
+        self.job = job
+        self.future = future
+        self.deadline = now + timeout
+        self.interval = POLL_MIN_SECONDS
+        self.due = now + self.interval
+        self.errors = 0
+        self.checking = False
+
+
+class SarvamPoller:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._watches: Dict[int, _Watch] = {}
+        self._pid: Optional[int] = None
+        self._checkers: Optional[ThreadPoolExecutor] = None
+        self._stats = {"watched": 0, "completed": 0, "timed_out": 0, "status_requests": 0}
+
+    def watch(self, job, timeout: Optional[float] = None) -> Future:
+        """A Future for [job]'s final status (the SDK's JobStatusResponse).
+
+        Fails with TimeoutError after [timeout] seconds (TIMEOUT_SECONDS by
+        default). Cancelling the Future stops the polling.
+        """
+        future: Future = Future()
+        watch = _Watch(job, future, TIMEOUT_SECONDS if timeout is None else timeout)
+        with self._lock:
+            self._ensure_started()
+            self._watches[id(watch)] = watch
+            self._stats["watched"] += 1
+        self._wake.set()
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._watches)}
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork; a poller inherited from a preloading
+        # master starts its own in the child.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._checkers = ThreadPoolExecutor(
+            max_workers=max(1, POLL_THREADS), thread_name_prefix="sarvam-status"
+        )
+        threading.Thread(target=self._loop, name="sarvam-poller", daemon=True).start()
+
+    def _loop(self) -> None:
+        while True:
+            # Cleared before looking, so a watch added meanwhile wakes the wait.
+            self._wake.clear()
+            now = time.monotonic()
+            due = []
+            next_due = now + POLL_MAX_SECONDS
+            with self._lock:
+                for key, watch in list(self._watches.items()):
+                    if watch.future.cancelled():
+                        del self._watches[key]
+                    elif watch.checking:
+                        continue
+                    elif watch.due <= now:
+                        watch.checking = True
+                        due.append((key, watch))
+                    else:
+                        next_due = min(next_due, watch.due)
+                checkers = self._checkers
+            for key, watch in due:
+                checkers.submit(self._check, key, watch)
+            self._wake.wait(max(0.0, next_due - time.monotonic()))
+
+    def _check(self, key: int, watch: _Watch) -> None:
+        status = None
+        error: Optional[BaseException] = None
+        try:
+            status = watch.job.get_status()
+        except Exception as exc:
+            error = exc
+
+        now = time.monotonic()
+        settle = None
+        with self._lock:
+            self._stats["status_requests"] += 1
+            watch.checking = False
+            if error is not None:
+                watch.errors += 1
+                if watch.errors >= _MAX_STATUS_ERRORS:
+                    settle = ("error", error)
+            else:
+                watch.errors = 0
+                if (status.job_state or "").lower() in _FINISHED:
+                    settle = ("result", status)
+                    self._stats["completed"] += 1
+            if settle is None and now >= watch.deadline:
+                settle = ("error", TimeoutError(
+                    f"Sarvam job {getattr(watch.job, 'job_id', '?')} did not finish in time."
+                ))
+                self._stats["timed_out"] += 1
+            if settle is None:
+                watch.interval = min(watch.interval * POLL_BACKOFF, POLL_MAX_SECONDS)
+                watch.due = now + min(watch.interval, max(0.0, watch.deadline - now))
+            else:
+                self._watches.pop(key, None)
+
+        if settle is not None:
+            self._settle(watch.future, *settle)
+        self._wake.set()
+
+    @staticmethod
+    def _settle(future: Future, kind: str, value) -> None:
+        if kind == "error":
+            if isinstance(value, TimeoutError):
+                logger.warning("%s", value)
+            else:
+                logger.error("Could not get a Sarvam job's status: %s", value)
+        try:
+            if kind == "result":
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        except InvalidStateError:
+            pass  # cancelled by its caller meanwhile
+
+
+poller = SarvamPoller()
+metrics.register("sarvam_poller", poller.stats)
@@ -10,14 +10,23 @@ brittle dig through per-language transliteration objects in the response.
 
 from __future__ import annotations
 
-import glob
-import json
+import asyncio
 import logging
 import os
 import shutil
-from typing import List, Optional
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
 
+import httpx
+
+from .. import metrics
+from ..transcription_pool import parked
+from .clients import PerLoop
 from .languages import to_sarvam_code, to_sarvam_mode
+from .sarvam_output import SarvamOutput
+from .sarvam_poller import poller
 from .types import (
     TranscriptionError,
     TranscriptionResult,
@@ -29,21 +38,57 @@ logger = logging.getLogger("STT.Sarvam")
 
 MODEL = "saaras:v3"
 
+# Batching: recordings with the same model, mode, language and diarization
+# that arrive within BATCH_WINDOW_SECONDS of each other share one Sarvam job,
+# saving each the fixed cost of creating, starting and polling its own.
+BATCH = (os.getenv("SARVAM_BATCH") or "0") == "1"
+BATCH_WINDOW_SECONDS = float(os.getenv("SARVAM_BATCH_WINDOW_SECONDS") or 2)
+BATCH_MAX_FILES = int(os.getenv("SARVAM_BATCH_MAX_FILES") or 20)
+
+# For fetching one job output from its signed URL.
+DOWNLOAD_TIMEOUT_SECONDS = 60.0
+
 _client = None
 
 
+def _api_key() -> str:
+    api_key = os.getenv("SARVAM_API_KEY")
+    if not api_key:
+        raise TranscriptionError(
+            "Transcription is not configured on the server.", provider_fault=False
+        )
+    return api_key
+
+
 def _get_client():
     global _client
     if _client is None:
         from sarvamai import SarvamAI
 
-        api_key = os.getenv("SARVAM_API_KEY")
-        if not api_key:
-            raise TranscriptionError("Transcription is not configured on the server.")
-        _client = SarvamAI(api_subscription_key=api_key)
+        _client = SarvamAI(api_subscription_key=_api_key())
     return _client
 
 
+def _new_async_client():
+    from sarvamai import AsyncSarvamAI
+
+    return AsyncSarvamAI(
+        api_subscription_key=_api_key(), httpx_client=_async_http.get()
+    )
+
+
+# Made here rather than by the SDK, which gives no way to close its own.
+_async_http = PerLoop(
+    lambda: httpx.AsyncClient(timeout=60.0, follow_redirects=True),
+    close=lambda http: http.aclose(),
+)
+_async_clients = PerLoop(_new_async_client)
+
+
+def _get_async_client():
+    return _async_clients.get()
+
+
 def _entry_text(entry: dict) -> str:
     """Best available text for one diarized entry.
 
@@ -69,89 +114,302 @@ def _entry_text(entry: dict) -> str:
     return (transcriptions.get("en-IN") or {}).get("text", "") or ""
 
 
-def _parse(payload: dict, language: Optional[str]) -> TranscriptionResult:
-    """Turns Sarvam's job output into a provider-neutral result."""
+# The output fields `_parse` reads; the rest are not worth decoding.
+_PARSED_KEYS = ("transcript", "diarized_transcript")
+
+
+def _parse(payload, language: Optional[str]) -> TranscriptionResult:
+    """Turns Sarvam's job output into a provider-neutral result.
+
+    [payload] is the output as a dict or a `SarvamOutput` reading it from the
+    download. Entries are converted one at a time as they are iterated, and the
+    plain transcript is looked at only when there are none.
+    """
     entries = ((payload.get("diarized_transcript") or {}).get("entries")) or []
 
-    if not entries:
-        plain = (payload.get("transcript") or "").strip()
-        segments: List[TranscriptSegment] = (
-            [TranscriptSegment(text=plain)] if plain else []
-        )
-    else:
-        segments = []
-        for entry in entries:
-            text = _entry_text(entry).strip()
-            if not text:
-                continue
-            segments.append(
-                TranscriptSegment(
-                    text=text,
-                    speaker=speaker_label(entry.get("speaker_id")),
-                )
+    segments: List[TranscriptSegment] = []
+    diarized = False
+    for entry in entries:
+        diarized = True
+        text = _entry_text(entry).strip()
+        if not text:
+            continue
+        segments.append(
+            TranscriptSegment(
+                text=text,
+                speaker=speaker_label(entry.get("speaker_id")),
             )
+        )
+
+    if not diarized:
+        plain = (payload.get("transcript") or "").strip()
+        if plain:
+            segments = [TranscriptSegment(text=plain)]
 
     return TranscriptionResult(segments=segments, provider="sarvam", language=language)
 
 
-class SarvamProvider:
-    name = "sarvam"
+def _job_settings(language: Optional[str]) -> dict:
+    """create_job arguments for [language]. Recordings with equal settings can
+    share one Sarvam job."""
+    settings = {"model": MODEL, "mode": to_sarvam_mode(language), "with_diarization": True}
+    language_code = to_sarvam_code(language)
+    if language_code:
+        settings["language_code"] = language_code
+    return settings
 
-    def is_available(self) -> bool:
-        return bool(os.getenv("SARVAM_API_KEY"))
 
-    def transcribe(
-        self, audio_path: str, language: Optional[str] = None
-    ) -> TranscriptionResult:
-        out_dir = os.path.join(os.path.dirname(audio_path), "sarvam_out")
-        language_code = to_sarvam_code(language)
-        mode = to_sarvam_mode(language)
-
-        logger.info(
-            "Sarvam transcription start (model=%s, language_code=%s, mode=%s)",
-            MODEL,
-            language_code or "auto",
-            mode,
+_Outcome = Union[TranscriptionResult, TranscriptionError]
+
+
+def _run_job(settings: dict, recordings: Dict[str, Optional[str]]) -> Dict[str, _Outcome]:
+    """Runs one Sarvam job over [recordings] (path: language), whose file names
+    must differ.
+
+    Returns each path's result, or the TranscriptionError for that one file;
+    raises when the job as a whole fails.
+    """
+    client = _get_client()
+    job = client.speech_to_text_job.create_job(**settings)
+    job.upload_files(list(recordings))
+    job.start()
+    # The shared poller does the waiting; meanwhile this thread's pool slot
+    # runs another job.
+    with parked():
+        status = poller.watch(job).result()
+
+    outputs = _output_files(status, len(recordings))
+    links = {}
+    if outputs:
+        links = client.speech_to_text_job.get_download_links(
+            job_id=job.job_id, files=list(outputs.values())
+        ).download_urls
+
+    results: Dict[str, _Outcome] = {}
+    for path, language in recordings.items():
+        url = _output_url(path, outputs, links)
+        results[path] = url if isinstance(url, Exception) else _fetch(url, language)
+    return results
+
+
+async def _run_job_async(
+    settings: dict, recordings: Dict[str, Optional[str]]
+) -> Dict[str, _Outcome]:
+    """`_run_job` on the async client. Nothing holds a thread while the job
+    is queued or running at Sarvam; only each output's download and parse
+    runs on one."""
+    client = _get_async_client()
+    job = await client.speech_to_text_job.create_job(**settings)
+    await job.upload_files(list(recordings))
+    await job.start()
+    # Run from a pool worker (through the sync pipeline), the worker's thread
+    # is idle meanwhile, so it parks just the same.
+    with parked():
+        status = await asyncio.wrap_future(poller.watch(_JobStatus(job.job_id)))
+
+    outputs = _output_files(status, len(recordings))
+    links = {}
+    if outputs:
+        links = (await client.speech_to_text_job.get_download_links(
+            job_id=job.job_id, files=list(outputs.values())
+        )).download_urls
+
+    results: Dict[str, _Outcome] = {}
+    for path, language in recordings.items():
+        url = _output_url(path, outputs, links)
+        if isinstance(url, Exception):
+            results[path] = url
+        else:
+            results[path] = await asyncio.to_thread(_fetch, url, language)
+    return results
+
+
+class _JobStatus:
+    """A job started on the async client, as the poller sees it: its status,
+    asked for through the sync client from the poller's own threads."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def get_status(self):
+        return _get_client().speech_to_text_job.get_status(self.job_id)
+
+
+def _output_files(status, files: int) -> Dict[str, str]:
+    """Input file name -> output file name, for the files [status] (a finished
+    job's over [files] recordings) says succeeded. Raises when the job as a
+    whole failed."""
+    if (status.job_state or "").lower() == "failed":
+        # A job of one recording fails on that recording; a whole batch
+        # failing at once is Sarvam's trouble, not every file's.
+        raise TranscriptionError(
+            "The transcription provider rejected this recording.",
+            provider_fault=files > 1,
+        )
+    return {
+        detail.inputs[0].file_name: detail.outputs[0].file_name
+        for detail in (status.job_details or [])
+        if detail.inputs and detail.outputs and detail.state == "Success"
+    }
+
+
+def _output_url(path: str, outputs: Dict[str, str], links: dict) -> Union[str, TranscriptionError]:
+    output = outputs.get(os.path.basename(path))
+    if output is None:
+        # The job finished but failed this file alone.
+        return TranscriptionError(
+            "No transcript was produced for this recording.", provider_fault=False
         )
+    if output not in links:
+        return TranscriptionError("No transcript was produced for this recording.")
+    return links[output].file_url
 
+
+def _fetch(url: str, language: Optional[str]) -> TranscriptionResult:
+    """Downloads one output and parses it as it arrives, never holding the
+    whole document (see `sarvam_output`)."""
+    with httpx.stream(
+        "GET", url, timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=True
+    ) as response:
+        response.raise_for_status()
+        return _parse(SarvamOutput(response.iter_bytes(), _PARSED_KEYS), language)
+
+
+class _Batch:
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.entries: List[Tuple[str, Optional[str], Future]] = []
+        self.full = threading.Event()
+
+
+class _Batcher:
+    """Collects recordings with the same job settings for BATCH_WINDOW_SECONDS
+    (or until BATCH_MAX_FILES) and runs them as one Sarvam job.
+
+    The first recording's thread leads: it waits out the window, runs the job
+    and hands every other recording its output. The others just wait.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open: Dict[tuple, _Batch] = {}
+        self._stats = {"jobs": 0, "recordings": 0}
+
+    def run(
+        self, audio_path: str, language: Optional[str], settings: dict
+    ) -> TranscriptionResult:
+        """[audio_path]'s result, once its batch has run."""
+        key = tuple(sorted(settings.items()))
+        future: Future = Future()
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch(settings)
+            batch.entries.append((audio_path, language, future))
+            if len(batch.entries) >= BATCH_MAX_FILES:
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(BATCH_WINDOW_SECONDS)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            self._run(batch)
+        with parked():
+            return future.result()
+
+    def _run(self, batch: _Batch) -> None:
+        staging = tempfile.mkdtemp(prefix="sarvam-batch-")
         try:
-            os.makedirs(out_dir, exist_ok=True)
+            # Every job directory holds an "audio.<ext>", and Sarvam keys
+            # uploads and outputs by file name, so each gets a unique link.
+            staged: Dict[str, Optional[str]] = {}
+            for index, (path, language, _) in enumerate(batch.entries):
+                link = os.path.join(staging, f"{index:03d}-{os.path.basename(path)}")
+                os.symlink(os.path.abspath(path), link)
+                staged[link] = language
+
+            logger.info("Sarvam batch job for %d recordings.", len(staged))
+            with self._lock:
+                self._stats["jobs"] += 1
+                self._stats["recordings"] += len(staged)
+            results = _run_job(batch.settings, staged)
+            for link, (_, _, future) in zip(staged, batch.entries):
+                outcome = results[link]
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+        except Exception as exc:
+            for _, _, future in batch.entries:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
 
-            job_kwargs = {
-                "model": MODEL,
-                "mode": mode,
-                "with_diarization": True,
-            }
-            if language_code:
-                job_kwargs["language_code"] = language_code
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "open_batches": len(self._open)}
 
-            job = _get_client().speech_to_text_job.create_job(**job_kwargs)
-            job.upload_files([audio_path])
-            job.start()
-            job.wait_until_complete()
 
-            if job.is_failed():
-                raise TranscriptionError(
-                    "The transcription provider rejected this recording."
-                )
+_batcher = _Batcher()
+metrics.register("sarvam_batches", _batcher.stats)
 
-            job.download_outputs(out_dir)
 
-            json_files = glob.glob(os.path.join(out_dir, "*.json"))
-            if not json_files:
-                raise TranscriptionError(
-                    "No transcript was produced for this recording."
-                )
+class SarvamProvider:
+    name = "sarvam"
+    model = MODEL
+
+    def is_available(self) -> bool:
+        return bool(os.getenv("SARVAM_API_KEY"))
+
+    def transcribe(
+        self, audio_path: str, language: Optional[str] = None
+    ) -> TranscriptionResult:
+        settings = _start(language)
+        try:
+            if BATCH:
+                return _batcher.run(audio_path, language, settings)
+            return _only(_run_job(settings, {audio_path: language}), audio_path)
 
-            with open(json_files[0], "r", encoding="utf-8") as handle:
-                payload = json.load(handle)
+        except TranscriptionError:
+            raise
+        except Exception as exc:
+            logger.error("Sarvam error: %s", exc, exc_info=True)
+            raise TranscriptionError("Transcription failed. Please try again.") from exc
 
-            return _parse(payload, language)
+    async def transcribe_async(
+        self, audio_path: str, language: Optional[str] = None
+    ) -> TranscriptionResult:
+        settings = _start(language)
+        try:
+            if BATCH:
+                # Batches are gathered across threads; this one waits on a thread.
+                return await asyncio.to_thread(_batcher.run, audio_path, language, settings)
+            return _only(await _run_job_async(settings, {audio_path: language}), audio_path)
 
         except TranscriptionError:
             raise
         except Exception as exc:
             logger.error("Sarvam error: %s", exc, exc_info=True)
             raise TranscriptionError("Transcription failed. Please try again.") from exc
-        finally:
-            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def _start(language: Optional[str]) -> dict:
+    settings = _job_settings(language)
+    logger.info(
+        "Sarvam transcription start (model=%s, language_code=%s, mode=%s)",
+        MODEL,
+        settings.get("language_code") or "auto",
+        settings["mode"],
+    )
+    return settings
+
+
+def _only(results: Dict[str, _Outcome], audio_path: str) -> TranscriptionResult:
+    outcome = results[audio_path]
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
@@ -0,0 +1,107 @@
+"""Adjusts the routing rules with what recent calls say about each provider.
+
+`router` decides from the recording alone, which is right almost everywhere:
+a language only one provider covers, or transcribes well, goes there whatever
+either vendor is doing this hour. For the recordings `router.is_interchangeable`
+picks out, though, either provider would do, and the rules' choice of Sarvam
+is a default rather than a need. For those alone, and only with
+STT_ROUTER_SCORING on, `provider_chain` consults each provider's recent latency
+and error rate for recordings that size (`telemetry`) and its circuit
+(`breaker`), and hands the recording to OpenAI while Sarvam is the failing or
+clearly slower one.
+
+The chain is still built by `select_fallback`, so a recording handed to OpenAI
+is tried on OpenAI alone: the asymmetry there is not the scoring's to bend.
+Giving up the fallback is part of the price, which is why OpenAI must be
+healthy itself and faster by MARGIN, not merely faster. Sarvam keeps being
+measured meanwhile on the recordings only it handles, so the decision reverses
+once it recovers.
+
+Every scored decision is logged with the numbers behind it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from . import breaker, telemetry
+from .router import OPENAI, SARVAM, is_interchangeable, select_fallback
+from .router import provider_chain as rule_chain
+
+logger = logging.getLogger("STT.Scoring")
+
+ENABLED = (os.getenv("STT_ROUTER_SCORING") or "0") == "1"
+# The latency compared between providers.
+PERCENTILE = float(os.getenv("STT_ROUTER_PERCENTILE") or 95)
+# OpenAI takes over on speed only when Sarvam is this many times slower.
+MARGIN = float(os.getenv("STT_ROUTER_MARGIN") or 1.5)
+# A provider failing more often than this is not considered healthy.
+MAX_ERROR_RATE = float(os.getenv("STT_ROUTER_MAX_ERROR_RATE") or 0.1)
+
+
+def provider_chain(
+    language: Optional[str] = None, locale: Optional[str] = None, size: int = 0
+) -> List[str]:
+    """`router.provider_chain`, reordered by recent performance for a
+    [size]-byte recording where the rules allow it."""
+    if not ENABLED or not is_interchangeable(language, locale):
+        return rule_chain(language, locale)
+
+    health = {name: _health(name, size) for name in (SARVAM, OPENAI)}
+    primary, reason = _choose(health)
+    fallback = select_fallback(primary, language)
+    chain = [primary] if fallback is None else [primary, fallback]
+
+    logger.info(
+        "Routing a %d-byte recording to %s: %s. sarvam %s; openai %s.",
+        size, " then ".join(chain), reason,
+        _describe(health[SARVAM]), _describe(health[OPENAI]),
+    )
+    telemetry.count(primary, "scored_routes")
+    return chain
+
+
+def _health(provider: str, size: int) -> Dict[str, object]:
+    return {
+        "latency": telemetry.latency_percentile(provider, size, PERCENTILE),
+        "error_rate": telemetry.error_rate(provider, size),
+        "circuit_open": breaker.is_open(provider),
+    }
+
+
+def _healthy(health: Dict[str, object]) -> bool:
+    return (
+        not health["circuit_open"]
+        and health["error_rate"] is not None
+        and health["error_rate"] <= MAX_ERROR_RATE
+    )
+
+
+def _choose(health: Dict[str, Dict[str, object]]) -> Tuple[str, str]:
+    """The provider to lead with, and why. Sarvam, which the rules pick for
+    every interchangeable recording, unless the numbers make a clear case for
+    OpenAI."""
+    sarvam, openai = health[SARVAM], health[OPENAI]
+    if not _healthy(openai):
+        return SARVAM, "openai is not known to be healthy"
+    if sarvam["circuit_open"]:
+        return OPENAI, "sarvam's circuit is open"
+    if sarvam["error_rate"] is not None and sarvam["error_rate"] > MAX_ERROR_RATE:
+        return OPENAI, "sarvam is failing"
+    if sarvam["latency"] is None or openai["latency"] is None:
+        return SARVAM, "not enough recent calls to compare"
+    if openai["latency"] * MARGIN < sarvam["latency"]:
+        return OPENAI, f"sarvam is over {MARGIN:g}x slower"
+    return SARVAM, "sarvam is healthy and not clearly slower"
+
+
+def _describe(health: Dict[str, object]) -> str:
+    latency, error_rate = health["latency"], health["error_rate"]
+    return "p{:g} {}, errors {}{}".format(
+        PERCENTILE,
+        "unknown" if latency is None else f"{latency:.1f}s",
+        "unknown" if error_rate is None else f"{error_rate:.0%}",
+        ", circuit open" if health["circuit_open"] else "",
+    )
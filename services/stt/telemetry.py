@@ -0,0 +1,102 @@
+"""Rolling latency and outcome statistics for each STT provider.
+
+Provider latency grows with the recording, so calls are kept per provider and
+per size band (`_band`), each band a window of the last WINDOW calls. Questions
+like "how long does Sarvam take for 95% of 10 MB recordings?" are answered
+from the band alone and only once it holds MIN_SAMPLES calls; until then the
+answer is None and callers fall back to their old behaviour.
+
+Process-local, like everything under `/metrics`: each worker learns from the
+calls it makes, which for a latency tail is plenty.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from .. import metrics
+
+WINDOW = int(os.getenv("STT_TELEMETRY_WINDOW") or 200)
+MIN_SAMPLES = int(os.getenv("STT_TELEMETRY_MIN_SAMPLES") or 20)
+
+_MB = 1024 * 1024
+# Upper bounds of the size bands, each four times the last.
+_BAND_LIMITS = (2 * _MB, 8 * _MB, 32 * _MB)
+
+_lock = threading.Lock()
+# (provider, band) -> (seconds, ok) of recent calls.
+_calls: Dict[Tuple[str, int], Deque[Tuple[float, bool]]] = {}
+_counts: Dict[str, Dict[str, int]] = {}
+
+
+def _band(size: int) -> int:
+    for index, limit in enumerate(_BAND_LIMITS):
+        if size < limit:
+            return index
+    return len(_BAND_LIMITS)
+
+
+def record(provider: str, size: int, seconds: float, ok: bool) -> None:
+    """Notes one call to [provider] with a [size]-byte recording. [ok] is
+    False for a call that raised; an empty transcript still counts as ok."""
+    with _lock:
+        window = _calls.setdefault((provider, _band(size)), deque(maxlen=WINDOW))
+        window.append((seconds, ok))
+        counts = _counts.setdefault(provider, {"calls": 0, "errors": 0})
+        counts["calls"] += 1
+        counts["errors"] += 0 if ok else 1
+
+
+def count(provider: str, event: str) -> None:
+    """Bumps a named per-provider counter, e.g. "hedges"."""
+    with _lock:
+        counts = _counts.setdefault(provider, {"calls": 0, "errors": 0})
+        counts[event] = counts.get(event, 0) + 1
+
+
+def latency_percentile(provider: str, size: int, percentile: float) -> Optional[float]:
+    """Seconds within which [percentile]% of recent successful calls to
+    [provider] with recordings near [size] finished, or None until known."""
+    with _lock:
+        window = list(_calls.get((provider, _band(size)), ()))
+    latencies = [seconds for seconds, ok in window if ok]
+    if len(latencies) < MIN_SAMPLES:
+        return None
+    return float(np.percentile(latencies, percentile))
+
+
+def error_rate(provider: str, size: int) -> Optional[float]:
+    """Fraction of recent calls to [provider] near [size] that raised, or None
+    until known."""
+    with _lock:
+        window = list(_calls.get((provider, _band(size)), ()))
+    if len(window) < MIN_SAMPLES:
+        return None
+    return sum(1 for _, ok in window if not ok) / len(window)
+
+
+def reset() -> None:
+    with _lock:
+        _calls.clear()
+        _counts.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        snapshot = {provider: dict(counts) for provider, counts in _counts.items()}
+        windows = {key: list(window) for key, window in _calls.items()}
+    for (provider, band), window in sorted(windows.items()):
+        latencies = [seconds for seconds, ok in window if ok]
+        if latencies:
+            snapshot.setdefault(provider, {})[f"p95_seconds_band{band}"] = round(
+                float(np.percentile(latencies, 95)), 2
+            )
+    return snapshot
+
+
+metrics.register("stt_providers", stats)
@@ -7,12 +7,22 @@ has to know which vendor produced a transcript.
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass
-from typing import List, Optional, Protocol
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Protocol
 
 
 class TranscriptionError(RuntimeError):
-    """Message is safe to show the user."""
+    """Message is safe to show the user.
+
+    [provider_fault] is False for a failure the recording or our own setup
+    caused (a file over the upload limit, one the provider refused, a missing
+    API key). Such a failure says nothing about the provider's health, so it is
+    kept out of its circuit breaker and latency statistics.
+    """
+
+    def __init__(self, message: str, provider_fault: bool = True):
+        super().__init__(message)
+        self.provider_fault = provider_fault
 
 
 # Sarvam labels speakers "SPEAKER_00"; OpenAI labels them "A", "B". Without
@@ -49,6 +59,9 @@ class TranscriptionResult:
     segments: List[TranscriptSegment]
     provider: str
     language: Optional[str] = None
+    # What the pipeline spent producing this, e.g. "normalise_seconds"; kept
+    # with the job for diagnosis, never part of the transcript.
+    stats: Dict[str, float] = field(default_factory=dict, compare=False)
 
     def to_text(self) -> str:
         """Renders the transcript the way notes have always stored it."""
@@ -77,3 +90,9 @@ class SttProvider(Protocol):
         self, audio_path: str, language: Optional[str] = None
     ) -> TranscriptionResult:
         """Transcribes a local audio file, raising TranscriptionError on failure."""
+
+    async def transcribe_async(
+        self, audio_path: str, language: Optional[str] = None
+    ) -> TranscriptionResult:
+        """`transcribe` without holding a thread while the vendor works. The
+        pipeline runs a provider that lacks it on a thread instead."""
@@ -0,0 +1,48 @@
+"""Tells recordings with nobody speaking in them from the rest, locally.
+
+`pipeline.transcribe` treats an empty transcript as a provider that may have
+choked and retries it on the fallback, so a silent pocket recording cost a full
+Sarvam job and a full OpenAI call before it came back empty. The pipeline now
+measures the decoded audio first and answers an empty transcript itself when
+there is too little sound in it to hold a word.
+
+The test is deliberately conservative, energy only: a frame is voiced when it
+is louder than SPEECH_RMS, and a recording needs MIN_SPEECH_SECONDS of voiced
+frames to be sent on. Anything noisy still goes to the vendors; only recordings
+that are all but digitally silent are answered here. Missing real speech costs
+the user a transcript, skipping near-silence only saves money.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from .audio import SAMPLE_RATE
+from .chunking import FRAME_SECONDS, frame_rms
+
+ENABLED = (os.getenv("STT_SILENCE_CHECK") or "1") != "0"
+# About -44 dBFS: below room tone in any recording with a person in it.
+SPEECH_RMS = float(os.getenv("STT_SILENCE_RMS") or 200)
+MIN_SPEECH_SECONDS = float(os.getenv("STT_MIN_SPEECH_SECONDS") or 0.5)
+
+
+@dataclass(frozen=True)
+class Activity:
+    voiced_seconds: float
+    ratio: float  # voiced frames / all frames
+
+    @property
+    def has_speech(self) -> bool:
+        return self.voiced_seconds >= MIN_SPEECH_SECONDS
+
+
+def measure(samples: np.ndarray, rate: int = SAMPLE_RATE) -> Activity:
+    """How much of [samples] (16-bit mono) is loud enough to be speech."""
+    rms = frame_rms(samples, rate)
+    if len(rms) == 0:
+        return Activity(voiced_seconds=0.0, ratio=0.0)
+    voiced = int(np.count_nonzero(rms > SPEECH_RMS))
+    return Activity(voiced_seconds=voiced * FRAME_SECONDS, ratio=voiced / len(rms))
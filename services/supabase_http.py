@@ -0,0 +1,100 @@
+"""The shared HTTP client for every Supabase call.
+
+The job store and auth used to call module-level `httpx.get/post/patch`, which
+builds a fresh connection each time: a TCP handshake and a TLS handshake to
+Supabase on every status read, status write and token check. One pooled,
+keep-alive client per process reuses connections instead, and multiplexes
+requests over HTTP/2 when the optional `h2` package is installed.
+
+Connection pools must not be shared across fork: a gunicorn worker that
+inherited its master's sockets would interleave requests with its siblings on
+the same connection. The client is therefore created per process, on first use,
+and dropped in a child right after fork.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger("SupabaseHttp")
+
+MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS") or 20)
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE") or 10)
+KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY") or 60)
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT") or 5)
+
+# The timeout for every Supabase request, reads and writes alike.
+TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_TIMEOUT") or 15)
+
+# "0" forces HTTP/1.1 even when h2 is installed.
+_HTTP2_ENABLED = os.getenv("SUPABASE_HTTP2", "1") != "0"
+
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+_client_pid: Optional[int] = None
+
+
+def _http2_available() -> bool:
+    if not _HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client(**overrides) -> httpx.Client:
+    """A new pooled client with the configured limits. [overrides] go straight
+    to httpx.Client. Mostly for benchmarks; app code should use `get_client`."""
+    http2 = _http2_available()
+    logger.info(
+        "Supabase HTTP client (http2=%s, max_connections=%s, keepalive=%s)",
+        http2,
+        MAX_CONNECTIONS,
+        MAX_KEEPALIVE_CONNECTIONS,
+    )
+    options = {
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "timeout": httpx.Timeout(TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+    }
+    options.update(overrides)
+    return httpx.Client(**options)
+
+
+def get_client() -> httpx.Client:
+    """This process's client, created on first use and after every fork."""
+    global _client, _client_pid
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _client = build_client()
+            _client_pid = pid
+        return _client
+
+
+def _forget_after_fork() -> None:
+    # Don't close it: its sockets belong to the parent, and closing them here
+    # would send a TLS close_notify down the parent's live connections.
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
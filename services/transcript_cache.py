@@ -0,0 +1,221 @@
+"""Finished transcripts, addressed by the audio they came from.
+
+The same recording is submitted again and again: the app retries an upload
+whose response it never saw, the web app re-uploads, the same signed URL is
+sent twice. Every repeat used to be another paid Sarvam or OpenAI job. Now the
+SHA-256 computed while the audio arrives (see `uploads.AudioUpload` and
+`ai_service._download_audio`) keys a store of finished transcripts, together
+with everything else that changes what a transcription would produce: the
+normalised language, Sarvam's output mode, and the provider models `transcribe`
+would try, in order.
+
+Entries are JSON files in TRANSCRIPT_CACHE_DIR, so every gunicorn worker and
+`services.worker` process on a host shares them and they survive a restart.
+The directory is bounded by TRANSCRIPT_CACHE_MAX_BYTES, least recently used
+first out.
+
+A repeat that arrives while the first copy is still being transcribed is
+attached to it instead (`InFlight`), within one process: it gets the first
+job's outcome when that job finishes, and never occupies a worker itself.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+from . import metrics
+from .stt import AUTO, TranscriptSegment, TranscriptionResult, normalise_language, to_sarvam_mode
+from .stt.pipeline import chain_models
+
+logger = logging.getLogger("TranscriptCache")
+
+CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR") or "transcript_cache"
+
+# 0 disables the cache. In-flight attachment still applies.
+MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES") or 256 * 1024 * 1024)
+
+_SUFFIX = ".json"
+
+
+def cache_key(audio_sha256: str, language: Optional[str], locale: Optional[str]) -> str:
+    """The key for transcribing this audio with these settings."""
+    parts = [
+        audio_sha256,
+        normalise_language(language) or AUTO,
+        to_sarvam_mode(language),
+        *chain_models(language, locale),
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _encode(result: TranscriptionResult) -> bytes:
+    return json.dumps(
+        {
+            "provider": result.provider,
+            "language": result.language,
+            "segments": [
+                {"text": segment.text, "speaker": segment.speaker}
+                for segment in result.segments
+            ],
+        }
+    ).encode("utf-8")
+
+
+def _decode(raw: bytes) -> TranscriptionResult:
+    data = json.loads(raw)
+    return TranscriptionResult(
+        segments=[
+            TranscriptSegment(text=segment["text"], speaker=segment.get("speaker"))
+            for segment in data["segments"]
+        ],
+        provider=data["provider"],
+        language=data.get("language"),
+    )
+
+
+class TranscriptCache:
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[TranscriptionResult]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                result = _decode(handle.read())
+            # mtime is the recency eviction goes by.
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Unreadable transcript cache entry %s: %s", key, exc)
+            self._count("errors")
+            return None
+        self._count("hits")
+        return result
+
+    def put(self, key: str, result: TranscriptionResult) -> None:
+        if not self.enabled:
+            return
+        raw = _encode(result)
+        # One recording must not flush everything else out.
+        if len(raw) > self.max_bytes // 4:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename, so a reader in another process never sees half
+            # an entry.
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(raw)
+            os.replace(temp_path, self._path(key))
+        except OSError as exc:
+            logger.warning("Could not store transcript %s: %s", key, exc)
+            self._count("errors")
+            return
+        self._count("stores")
+        self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as listing:
+                for entry in listing:
+                    if not entry.name.endswith(_SUFFIX):
+                        continue
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, entry.path))
+                    total += info.st_size
+        except OSError:
+            return
+
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self._count("evictions")
+
+
+class InFlight:
+    """Jobs in this process transcribing audio, and the repeats waiting on them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # cache key -> job ids attached to the job transcribing it
+        self._followers: Dict[str, List[str]] = {}
+        self._stats = {"attached": 0}
+
+    def join(self, key: str, job_id: str) -> bool:
+        """Attaches [job_id] to the job already transcribing [key] and returns
+        True; or, if there is none, makes [job_id] that job and returns False.
+        The job that got False must call `finish` when it is done."""
+        with self._lock:
+            followers = self._followers.get(key)
+            if followers is None:
+                self._followers[key] = []
+                return False
+            followers.append(job_id)
+            self._stats["attached"] += 1
+            return True
+
+    def finish(self, key: str) -> List[str]:
+        """Ends the transcription of [key], returning the jobs attached to it."""
+        with self._lock:
+            return self._followers.pop(key, [])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._followers)}
+
+
+transcripts = TranscriptCache()
+in_flight = InFlight()
+
+
+def stats() -> dict:
+    return {**transcripts.stats(), **in_flight.stats()}
+
+
+metrics.register("transcript_cache", stats)
@@ -0,0 +1,435 @@
+"""A fixed-size transcription executor with admission control.
+
+Every `/transcribe` used to start its own thread, so a burst of uploads launched
+dozens of concurrent Sarvam and OpenAI calls on each gunicorn worker. They all
+competed for memory and bandwidth and every job slowed down together. Now each
+process runs a fixed number of worker threads fed by a bounded queue. When the
+queue is full, new work is refused up front with a Retry-After hint instead of
+being accepted and then starved. Queued work is ordered by `FairShareScheduler`
+rather than arrival, so short recordings are not stuck behind long ones.
+
+Admission is a two-step ticket so the routes can refuse a request before any
+job row is written or any audio is saved:
+
+    ticket = pool.admit()         # raises QueueFullError
+    try:
+        ...create the job, save the audio...
+    except Exception:
+        ticket.cancel()
+        raise
+    ticket.submit(run_job, job_id, cost=audio_bytes)
+
+A task that spends a long stretch waiting on a vendor can step aside with
+`parked()`: while it waits, the pool runs an extra thread so its slot goes to
+the next job, and admits that many more jobs. Threads above WORKERS retire
+once nothing is parked.
+
+`LoopPool` is the same admission in front of one event loop instead of
+threads, for the asyncio worker: a job there is a task awaiting
+`stt.transcribe_async`, and holds no thread while it waits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from . import metrics
+from .scheduler import MAX_RUNNING_PER_USER, FairShareScheduler, ScheduledTask
+
+logger = logging.getLogger("TranscriptionPool")
+
+# Per gunicorn worker. Transcription is almost entirely waiting on a vendor, so
+# this bounds vendor concurrency and memory rather than CPU.
+WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS") or 4)
+
+# Jobs accepted but not yet running. Past this, new uploads are refused.
+QUEUE_SIZE = int(os.getenv("TRANSCRIPTION_QUEUE_SIZE") or 16)
+
+# Bounds for the Retry-After hint sent with a refusal.
+_MIN_RETRY_AFTER = 5
+_MAX_RETRY_AFTER = 300
+
+# Seed for the job-duration estimate before any job has finished.
+_INITIAL_JOB_SECONDS = 30.0
+
+# Threads a `LoopPool`'s jobs hand their blocking steps to: decoding, output
+# parsing and job-store requests. Short steps, so far fewer than the jobs.
+LOOP_HELPER_THREADS = int(os.getenv("TRANSCRIPTION_LOOP_HELPER_THREADS") or 32)
+
+
+class QueueFullError(RuntimeError):
+    """Raised by `admit` when the process cannot take on more work."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("The transcription queue is full.")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A reserved place in the pool. Exactly one of submit/cancel must follow."""
+
+    def __init__(self, pool: "TranscriptionPool", user_id: Optional[str]):
+        self._pool = pool
+        self._user_id = user_id
+        self._used = False
+
+    def submit(self, fn: Callable, *args, cost: float = 0.0, **kwargs) -> None:
+        """Queues fn(*args, **kwargs). [cost] orders it against other queued
+        work; the recording's size in bytes is the estimate used throughout."""
+        if self._used:
+            raise RuntimeError("Ticket already used.")
+        self._used = True
+        self._pool._enqueue(
+            ScheduledTask(
+                fn=fn, args=args, kwargs=kwargs, cost=cost, user_id=self._user_id
+            )
+        )
+
+    def cancel(self) -> None:
+        if self._used:
+            return
+        self._used = True
+        self._pool._release()
+
+
+class _Claim:
+    """A running task's hold on its worker slot. It travels in the task's
+    context, so coroutines and `asyncio.to_thread` helpers share it."""
+
+    def __init__(self, pool: "TranscriptionPool"):
+        self.pool = pool
+        self.waiting = 0
+        self.finished = False
+
+
+class TranscriptionPool:
+    # Submitted functions are called on a worker thread.
+    on_loop = False
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._lock = threading.Lock()
+        self._scheduler = FairShareScheduler()
+        self._live = 0
+        self._pid: Optional[int] = None
+        # Admitted jobs not yet finished: queued, running, or holding a ticket.
+        self._admitted = 0
+        self._active = 0
+        # Running tasks currently parked; each has a thread standing in for it.
+        self._parked = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._job_seconds = _INITIAL_JOB_SECONDS
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size + self._parked
+
+    def admit(self, user_id: Optional[str] = None) -> Ticket:
+        """Reserves a place for one job belonging to [user_id]."""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._rejected += 1
+                raise QueueFullError(self._retry_after_locked())
+            self._admitted += 1
+        return Ticket(self, user_id)
+
+    def running_for(self, user_id: Optional[str]) -> int:
+        return self._scheduler.running_for(user_id)
+
+    @property
+    def max_running_per_user(self) -> int:
+        return self._scheduler.max_running_per_user
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits for all submitted work to finish. For tests and shutdown."""
+        return self._scheduler.join(timeout)
+
+    def stats(self) -> dict:
+        scheduler = self._scheduler.stats()
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "active": self._active,
+                "parked": self._parked,
+                "threads": self._live,
+                "queued": scheduler.pop("queued"),
+                "queue_capacity": self.queue_size,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_job_seconds": round(self._job_seconds, 2),
+                **scheduler,
+            }
+
+    def _retry_after_locked(self) -> int:
+        # Time for the backlog ahead of a new job to drain, given every worker
+        # is busy. Deliberately rough: it only has to stop clients hammering.
+        backlog = max(1, self._admitted - self.workers + 1)
+        estimate = self._job_seconds * backlog / self.workers
+        return int(min(_MAX_RETRY_AFTER, max(_MIN_RETRY_AFTER, math.ceil(estimate))))
+
+    def _release(self) -> None:
+        with self._lock:
+            self._admitted = max(0, self._admitted - 1)
+
+    def _enqueue(self, task: ScheduledTask) -> None:
+        self._ensure_started()
+        self._scheduler.put(task)
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so a pool inherited by a gunicorn worker
+        # from a preloading master is restarted in the child.
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._live = 0
+            self._parked = 0
+            for _ in range(self.workers):
+                self._start_thread_locked()
+
+    def _start_thread_locked(self) -> None:
+        thread = threading.Thread(
+            target=self._worker,
+            name=f"transcription-{self._live}",
+            daemon=True,
+        )
+        self._live += 1
+        thread.start()
+
+    def _park(self, claim: _Claim) -> None:
+        with self._lock:
+            claim.waiting += 1
+            if claim.waiting > 1 or claim.finished:
+                return
+            self._parked += 1
+            if self._live - self._parked < self.workers:
+                self._start_thread_locked()
+
+    def _unpark(self, claim: _Claim) -> None:
+        with self._lock:
+            claim.waiting -= 1
+            if claim.waiting == 0 and not claim.finished:
+                self._parked -= 1
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                if self._live - self._parked > self.workers:
+                    # A stand-in for a task that is no longer parked.
+                    self._live -= 1
+                    return
+            task = self._scheduler.get()
+            claim = _Claim(self)
+            with self._lock:
+                self._active += 1
+            started = time.monotonic()
+            failed = False
+            token = _current.set(claim)
+            try:
+                task.fn(*task.args, **task.kwargs)
+            except Exception:
+                failed = True
+                logger.exception("Transcription task raised.")
+            finally:
+                _current.reset(token)
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    # Helper threads may outlive the task (a hedge's loser);
+                    # their waits no longer hold a slot.
+                    if claim.waiting and not claim.finished:
+                        self._parked -= 1
+                    claim.finished = True
+                    self._active -= 1
+                    self._admitted = max(0, self._admitted - 1)
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+                    self._job_seconds = 0.8 * self._job_seconds + 0.2 * elapsed
+                self._scheduler.done(task)
+
+
+_current: ContextVar[Optional[_Claim]] = ContextVar("transcription_claim", default=None)
+
+
+@contextmanager
+def parked() -> Iterator[None]:
+    """Marks the calling task as waiting, so its worker slot is lent out.
+    Does nothing off the pool's threads."""
+    claim = _current.get()
+    if claim is None:
+        yield
+        return
+    claim.pool._park(claim)
+    try:
+        yield
+    finally:
+        claim.pool._unpark(claim)
+
+
+class LoopPool:
+    """Runs admitted jobs as tasks on one event loop, [concurrency] at a time.
+
+    Submitted functions must be coroutine functions. Tickets are taken and
+    submitted from any thread, like `TranscriptionPool`'s; the loop runs on a
+    thread of its own, started with the first job. There is no queue: a job
+    waiting on a vendor costs a task rather than a thread, so it is cheaper to
+    start every admitted job than to order them.
+    """
+
+    # Submitted functions are awaited on the pool's event loop.
+    on_loop = True
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_running_per_user: int = MAX_RUNNING_PER_USER,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_running_per_user = max_running_per_user
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._admitted = 0
+        self._running: Dict[Optional[str], int] = {}
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.concurrency
+
+    def admit(self, user_id: Optional[str] = None) -> Ticket:
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._rejected += 1
+                raise QueueFullError(_MIN_RETRY_AFTER)
+            self._admitted += 1
+        return Ticket(self, user_id)
+
+    def running_for(self, user_id: Optional[str]) -> int:
+        with self._lock:
+            return self._running.get(user_id, 0)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits for all admitted work to finish. For tests and shutdown."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._admitted == 0, timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "active": sum(self._running.values()),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def _release(self) -> None:
+        with self._idle:
+            self._admitted = max(0, self._admitted - 1)
+            self._idle.notify_all()
+
+    def _enqueue(self, task: ScheduledTask) -> None:
+        with self._lock:
+            self._running[task.user_id] = self._running.get(task.user_id, 0) + 1
+        self._ensure_started().call_soon_threadsafe(self._start, task)
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        # As with the thread pool, a loop's thread does not survive fork.
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._pid = pid
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(
+                    ThreadPoolExecutor(
+                        max_workers=LOOP_HELPER_THREADS,
+                        thread_name_prefix="transcription-helper",
+                    )
+                )
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="transcription-loop",
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def _start(self, task: ScheduledTask) -> None:
+        running = self._loop.create_task(self._run(task))
+        # The loop holds only weak references to its tasks.
+        self._tasks.add(running)
+        running.add_done_callback(self._tasks.discard)
+
+    async def _run(self, task: ScheduledTask) -> None:
+        failed = False
+        try:
+            await task.fn(*task.args, **task.kwargs)
+        except Exception:
+            failed = True
+            logger.exception("Transcription task raised.")
+        finally:
+            with self._idle:
+                self._running[task.user_id] -= 1
+                if not self._running[task.user_id]:
+                    del self._running[task.user_id]
+                self._admitted = max(0, self._admitted - 1)
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+                self._idle.notify_all()
+
+
+_pool: Optional[TranscriptionPool] = None
+_pool_lock = threading.Lock()
+
+
+def configure(workers: int = WORKERS, queue_size: int = QUEUE_SIZE) -> TranscriptionPool:
+    """Replaces this process's pool before it is used. For the worker entry point,
+    which sizes its pool from the command line."""
+    global _pool
+    with _pool_lock:
+        _pool = TranscriptionPool(workers=workers, queue_size=queue_size)
+    return _pool
+
+
+def configure_loop(concurrency: int) -> LoopPool:
+    """Replaces this process's pool with a `LoopPool`. For the worker entry
+    point's asyncio mode."""
+    global _pool
+    with _pool_lock:
+        _pool = LoopPool(concurrency)
+    return _pool
+
+
+def get_pool() -> TranscriptionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = TranscriptionPool()
+    return _pool
+
+
+metrics.register("transcription_pool", lambda: get_pool().stats())
@@ -0,0 +1,109 @@
+"""Receives `/transcribe` uploads straight into the job's scratch directory.
+
+Werkzeug spools every multipart file part to a temporary file of its own, and
+`create_transcription_job` then copied that file into `temp_jobs/<job_id>`:
+each upload was written to disk twice, and nothing bounded its size until it
+had all arrived. `UploadRequest` lets a view name a directory before the form
+is parsed, and the first file part is then written there as it is received,
+counted against a byte cap and hashed on the way through.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import IO, Optional
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from .audio_formats import SNIFF_BYTES
+
+_DEFAULT_FILENAME = "audio.m4a"
+
+# Audio still arriving carries this suffix until it is complete, so job
+# recovery never mistakes a half-written file for the recording.
+PARTIAL_SUFFIX = ".part"
+
+
+class AudioTooLarge(RequestEntityTooLarge):
+    description = "The audio file is too large."
+
+
+class AudioUpload:
+    """A file being received for [path], at most [max_bytes] long.
+
+    Behaves as the readable, seekable file Werkzeug expects from a stream
+    factory; `size`, `sha256` and `head` (the first SNIFF_BYTES, for
+    `audio_formats.sniff`) describe what has been written so far. It is
+    written beside [path] under PARTIAL_SUFFIX and only appears at [path]
+    once `finish` says it is complete.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+        self._hash = hashlib.sha256()
+        self._partial = path + PARTIAL_SUFFIX
+        self._file = open(self._partial, "w+b")
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self._file.close()
+            os.remove(self._partial)
+            raise AudioTooLarge()
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[: SNIFF_BYTES - len(self.head)]
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def finish(self) -> None:
+        """Closes the received file and moves it to `path`."""
+        self._file.close()
+        os.replace(self._partial, self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Flask's request, able to stream one uploaded file to a chosen place."""
+
+    upload: Optional[AudioUpload] = None
+    _upload_dir: Optional[str] = None
+    _upload_max_bytes = 0
+
+    def stream_upload_to(self, directory: str, max_bytes: int) -> None:
+        """Writes the first file part of the body into [directory].
+
+        Must be called before the form is first touched. Any further file
+        parts are spooled as usual.
+        """
+        self._upload_dir = directory
+        self._upload_max_bytes = max_bytes
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None,
+    ) -> IO[bytes]:
+        if self._upload_dir is None or self.upload is not None:
+            return super()._get_file_stream(
+                total_content_length, content_type, filename, content_length
+            )
+
+        name = secure_filename(os.path.basename(filename or "")) or _DEFAULT_FILENAME
+        self.upload = AudioUpload(
+            os.path.join(self._upload_dir, name), self._upload_max_bytes
+        )
+        return self.upload
@@ -0,0 +1,197 @@
+"""Standalone transcription workers, separate from the gunicorn web tier.
+
+    python -m services.worker --processes 2 --threads 4
+
+Run alongside the web tier with TRANSCRIPTION_MODE=queue set for both. The web
+processes then only save audio and record a pending job; these processes claim
+pending jobs from the job store and run them. The default Procfile runs the web
+tier alone, in inline mode; to switch, set the mode and add
+
+    worker: python -m services.worker
+
+to the Procfile. Started in any other mode, a worker logs why and exits cleanly
+rather than polling for jobs nothing will queue. A long Sarvam wait no longer sits
+in the same process, and competes for the same GIL, as latency-sensitive
+rewrite and status requests, and each tier can be scaled on its own.
+
+Each worker process runs its own transcription pool and lease thread, so it
+also adopts jobs orphaned by a worker that died. The parent only supervises:
+a child that exits is restarted.
+
+    python -m services.worker --concurrency 200
+
+runs each process's jobs as tasks on one event loop rather than one thread
+each. A job spends nearly all its time waiting on a vendor, so one loop drives
+hundreds of them where threads would run to hundreds of stacks.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Before any services import: several read their configuration at import time.
+load_dotenv()
+
+logger = logging.getLogger("Worker")
+
+# Idle workers back off to this between claim attempts.
+_MAX_IDLE_SECONDS = 5.0
+_MIN_IDLE_SECONDS = 0.5
+
+# A child that dies this soon after starting is crash-looping; slow restarts down.
+_RESTART_BACKOFF_SECONDS = 5.0
+
+
+def _configure_logging() -> None:
+    logging.basicConfig(
+        level=getattr(logging, (os.getenv("LOG_LEVEL") or "INFO").upper(), logging.INFO),
+        format="%(asctime)s [%(levelname)s] %(process)d %(name)s: %(message)s",
+    )
+
+
+def run_worker(threads: int, concurrency: int = 0) -> None:
+    """One worker process: claim pending jobs whenever the pool has room.
+    Jobs run on [threads] threads or, given a [concurrency], that many at once
+    on one event loop."""
+    # A forked child inherits the supervisor's handlers, which would swallow
+    # the SIGTERM used to stop it.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    _configure_logging()
+
+    from services import ai_service, transcription_pool
+    from services.observability import init_sentry
+
+    init_sentry()
+    if concurrency > 0:
+        pool = transcription_pool.configure_loop(concurrency)
+        started = "Transcription worker started with %s jobs on one event loop."
+    else:
+        # No queue beyond the running threads: a job claimed here but not
+        # started is one another worker process could have been running.
+        pool = transcription_pool.configure(workers=threads, queue_size=0)
+        started = "Transcription worker started with %s threads."
+
+    if not ai_service.start_job_recovery(force=True):
+        logger.error("The job store is not configured; nothing to work on.")
+        sys.exit(1)
+
+    logger.info(started, pool.capacity)
+    idle = _MIN_IDLE_SECONDS
+    while True:
+        if pool.stats()["admitted"] >= pool.capacity:
+            time.sleep(_MIN_IDLE_SECONDS)
+            continue
+
+        try:
+            claimed = ai_service.claim_pending_jobs()
+        except Exception as exc:
+            logger.warning("Claiming pending jobs failed: %s", exc)
+            claimed = 0
+
+        if claimed:
+            idle = _MIN_IDLE_SECONDS
+            continue
+
+        time.sleep(idle)
+        idle = min(_MAX_IDLE_SECONDS, idle * 2)
+
+
+def supervise(processes: int, threads: int, concurrency: int = 0) -> None:
+    """Keeps [processes] worker children running until told to stop."""
+    _configure_logging()
+    children: dict = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    def _spawn(slot: int) -> None:
+        process = multiprocessing.Process(
+            target=run_worker, args=(threads, concurrency), name=f"worker-{slot}"
+        )
+        process.start()
+        children[slot] = (process, time.monotonic())
+        logger.info("Started worker %s (pid %s).", slot, process.pid)
+
+    for slot in range(processes):
+        _spawn(slot)
+
+    while not stopping:
+        time.sleep(1.0)
+        for slot, (process, started_at) in list(children.items()):
+            if process.is_alive() or stopping:
+                continue
+            logger.warning(
+                "Worker %s (pid %s) exited with %s; restarting.",
+                slot,
+                process.pid,
+                process.exitcode,
+            )
+            if time.monotonic() - started_at < _RESTART_BACKOFF_SECONDS:
+                time.sleep(_RESTART_BACKOFF_SECONDS)
+            _spawn(slot)
+
+    logger.info("Stopping workers.")
+    for process, _ in children.values():
+        process.terminate()
+    # Jobs still running are not lost: their leases lapse and another worker
+    # resumes them once this one is gone.
+    for process, _ in children.values():
+        process.join(timeout=10)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("TRANSCRIPTION_WORKER_PROCESSES") or 1),
+        help="worker processes to run (TRANSCRIPTION_WORKER_PROCESSES)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.getenv("TRANSCRIPTION_WORKERS") or 4),
+        help="concurrent jobs per process (TRANSCRIPTION_WORKERS)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("TRANSCRIPTION_WORKER_CONCURRENCY") or 0),
+        help="run this many jobs per process on one event loop instead of "
+        "--threads threads (TRANSCRIPTION_WORKER_CONCURRENCY)",
+    )
+    args = parser.parse_args(argv)
+
+    from services import ai_service
+
+    if not ai_service.queued_mode():
+        _configure_logging()
+        logger.info(
+            "TRANSCRIPTION_MODE is %r, so the web processes transcribe their own "
+            "jobs; no worker is needed. Set it to \"queue\" to use one.",
+            ai_service.TRANSCRIPTION_MODE,
+        )
+        return
+
+    if args.processes <= 1:
+        run_worker(args.threads, args.concurrency)
+    else:
+        supervise(args.processes, args.threads, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Buffers non-terminal job updates and writes them in bulk.
+
+Each job used to cost a blocking PATCH per transition, with a 15 second
+timeout, on the thread that should have been transcribing. Intermediate states
+such as `processing` do not need to be durable the instant they happen: the
+lease covers a worker dying, and a client seeing `pending` for another half
+second loses nothing. So they are merged per job here and flushed on a timer,
+with jobs whose merged fields are identical sharing one `id=in.(...)` PATCH.
+
+Terminal writes bypass the buffer (see `job_store.update_job`): a finished
+transcript must be stored before its worker moves on, and it takes any still
+buffered fields for the same job along with it.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("WriteBehind")
+
+# A buffered update is retried this many times before it is dropped.
+_MAX_ATTEMPTS = 3
+
+
+class WriteBehindBuffer:
+    """Merges field updates per key and hands them to [write] in groups.
+
+    write(keys, fields) -> bool is called once per distinct set of merged
+    fields, with every key that shares it, and returns False on failure.
+    [on_flushed] is called with the keys of each successful group.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[str], dict], bool],
+        interval: float,
+        on_flushed: Optional[Callable[[List[str], dict], None]] = None,
+    ):
+        self._write = write
+        self._on_flushed = on_flushed
+        self.interval = interval
+        self._lock = threading.Lock()
+        # key -> (merged fields, failed attempts so far)
+        self._pending: Dict[str, tuple] = {}
+        self._flusher_pid: Optional[int] = None
+        self._stats = {
+            "buffered": 0,
+            "merged": 0,
+            "flushes": 0,
+            "writes": 0,
+            "rows_written": 0,
+            "failed_writes": 0,
+            "dropped": 0,
+            "write_seconds": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def add(self, key: str, fields: dict) -> None:
+        with self._lock:
+            self._stats["buffered"] += 1
+            existing = self._pending.get(key)
+            if existing is not None:
+                self._stats["merged"] += 1
+                merged = {**existing[0], **fields}
+                self._pending[key] = (merged, existing[1])
+            else:
+                self._pending[key] = (dict(fields), 0)
+            self._ensure_flusher_locked()
+
+    def take(self, key: str) -> dict:
+        """Removes and returns whatever is buffered for [key], for a caller
+        about to write it synchronously."""
+        with self._lock:
+            entry = self._pending.pop(key, None)
+        return entry[0] if entry else {}
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if pending:
+                self._stats["flushes"] += 1
+        if not pending:
+            return
+
+        groups: Dict[str, tuple] = {}
+        for key, (fields, attempts) in pending.items():
+            signature = json.dumps(fields, sort_keys=True, default=str)
+            group = groups.setdefault(signature, (fields, []))
+            group[1].append((key, attempts))
+
+        for fields, members in groups.values():
+            keys = [key for key, _ in members]
+            started = time.monotonic()
+            try:
+                ok = self._write(keys, fields)
+            except Exception as exc:
+                logger.warning("Write-behind flush raised: %s", exc)
+                ok = False
+            with self._lock:
+                self._stats["write_seconds"] += time.monotonic() - started
+                self._stats["writes"] += 1
+                if ok:
+                    self._stats["rows_written"] += len(keys)
+                else:
+                    self._stats["failed_writes"] += 1
+                    self._requeue_locked(members, fields)
+
+            if ok and self._on_flushed is not None:
+                self._on_flushed(keys, fields)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "write_seconds": round(self._stats["write_seconds"], 3),
+                "pending": len(self._pending),
+                "interval_seconds": self.interval,
+            }
+
+    def _requeue_locked(self, members, fields) -> None:
+        for key, attempts in members:
+            if attempts + 1 >= _MAX_ATTEMPTS:
+                self._stats["dropped"] += 1
+                logger.error(
+                    "Dropping buffered update for %s after %s attempts", key, attempts + 1
+                )
+                continue
+            newer = self._pending.get(key)
+            # Anything written since takes precedence over the retried fields.
+            merged = {**fields, **newer[0]} if newer else dict(fields)
+            self._pending[key] = (merged, attempts + 1)
+
+    def _ensure_flusher_locked(self) -> None:
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        self._flusher_pid = pid
+        threading.Thread(target=self._run, name="job-write-behind", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover - the loop must survive
+                logger.exception("Write-behind flush failed.")
+
+
+def flush_at_exit(buffer: WriteBehindBuffer) -> None:
+    """Best effort: a clean shutdown should not lose buffered transitions."""
+    atexit.register(buffer.flush)
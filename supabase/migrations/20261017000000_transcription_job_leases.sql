@@ -0,0 +1,19 @@
+-- Leases on transcription jobs, so a job orphaned by a dead worker is resumed
+-- by a surviving one instead of sitting at "processing" forever.
+--
+-- lease_owner       process currently responsible for the job
+-- lease_expires_at  pushed forward by that process's heartbeat; once it lapses
+--                   any worker may claim the job
+-- attempts          claims so far; the job is failed after too many
+-- requested_locale  stored with requested_language so a resumed job routes to
+--                   the same STT provider as the original request
+
+alter table public.transcription_jobs
+    add column if not exists lease_owner text,
+    add column if not exists lease_expires_at timestamptz,
+    add column if not exists attempts integer not null default 0,
+    add column if not exists requested_locale text;
+
+create index if not exists transcription_jobs_unfinished_lease_idx
+    on public.transcription_jobs (lease_expires_at)
+    where status in ('pending', 'processing');
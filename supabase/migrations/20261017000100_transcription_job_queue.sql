@@ -0,0 +1,9 @@
+-- Lets standalone workers (python -m services.worker) find jobs queued by the
+-- web tier: pending rows with no lease, oldest first.
+
+alter table public.transcription_jobs
+    add column if not exists created_at timestamptz not null default now();
+
+create index if not exists transcription_jobs_unclaimed_idx
+    on public.transcription_jobs (created_at)
+    where status = 'pending' and lease_owner is null;
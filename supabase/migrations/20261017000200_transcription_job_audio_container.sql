@@ -0,0 +1,6 @@
+-- The audio container sniffed from a job's first bytes (mp4, ogg, webm, wav,
+-- mp3, ...). Recorded for diagnosis; the pipeline reads it from the scratch
+-- file's extension.
+
+alter table public.transcription_jobs
+    add column if not exists audio_container text;
@@ -0,0 +1,6 @@
+-- What the pipeline spent on a job beyond the provider call itself, e.g.
+-- {"normalise_bytes_saved": 41943040, "normalise_seconds": 1.8}. Recorded for
+-- diagnosis and capacity planning; nothing reads it back.
+
+alter table public.transcription_jobs
+    add column if not exists stt_stats jsonb;
@@ -6,6 +6,16 @@ import pytest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+@pytest.fixture(autouse=True)
+def isolated_provider_state(tmp_path, monkeypatch):
+    """Circuit breakers and call slots live on disk; a test's failures must not
+    open a breaker for the tests after it."""
+    from services.stt import breaker, limits
+
+    monkeypatch.setattr(breaker, "STATE_DIR", str(tmp_path / "stt_breakers"))
+    monkeypatch.setattr(limits, "LOCK_DIR", str(tmp_path / "stt_limits"))
+
+
 @pytest.fixture
 def anonymous_app(monkeypatch):
     """The Flask app with auth stubbed out, for exercising route behaviour."""
@@ -0,0 +1,65 @@
+"""Container sniffing: every format the apps record in is recognised, and
+the usual wrong inputs are not."""
+
+import pytest
+
+from services import audio_formats
+from services.audio_formats import Empty, NotAudio
+
+
+@pytest.mark.parametrize(
+    "head, container",
+    [
+        (b"\x00\x00\x00\x20ftypM4A \x00\x00\x00\x00", "mp4"),
+        (b"\x00\x00\x00\x18ftyp3gp4\x00\x00\x00\x00", "mp4"),
+        (b"OggS\x00\x02" + b"\x00" * 22 + b"OpusHead", "ogg"),
+        (b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x84webm", "webm"),
+        (b"RIFF\x24\x08\x00\x00WAVEfmt ", "wav"),
+        (b"ID3\x04\x00\x00\x00\x00\x00\x00", "mp3"),
+        (b"\xff\xfb\x90\x64\x00", "mp3"),
+        (b"\xff\xf1\x50\x80\x00", "aac"),
+        (b"fLaC\x00\x00\x00\x22", "flac"),
+        (b"#!AMR\n", "amr"),
+    ],
+)
+def test_audio_containers_are_recognised(head, container):
+    assert audio_formats.sniff(head) == container
+
+
+@pytest.mark.parametrize(
+    "head",
+    [
+        b"<!DOCTYPE html><html>",
+        b'{"error": "signature expired"}',
+        b"%PDF-1.7",
+        b"\x89PNG\r\n\x1a\n",
+        b"\xff\xd8\xff\xe0\x00\x10JFIF",
+    ],
+)
+def test_other_files_are_not_audio(head):
+    with pytest.raises(NotAudio):
+        audio_formats.require_audio(head)
+
+
+def test_nothing_at_all_is_empty_not_unrecognised():
+    with pytest.raises(Empty):
+        audio_formats.require_audio(b"")
+
+
+@pytest.mark.parametrize("content_type", ["text/html; charset=utf-8", "image/png"])
+def test_non_audio_content_types_are_refused(content_type):
+    with pytest.raises(NotAudio):
+        audio_formats.check_content_type(content_type)
+
+
+@pytest.mark.parametrize(
+    "content_type", [None, "", "audio/mp4", "video/webm", "application/octet-stream"]
+)
+def test_audio_and_generic_content_types_pass(content_type):
+    audio_formats.check_content_type(content_type)
+
+
+def test_the_container_round_trips_through_the_file_name():
+    extension = audio_formats.extension_for("ogg")
+
+    assert audio_formats.container_of(f"temp_jobs/job-1/audio{extension}") == "ogg"
@@ -0,0 +1,104 @@
+"""The dataloader-style batcher behind coalesced job-status reads."""
+
+import threading
+import time
+
+import pytest
+
+from services.batching import Batcher
+
+
+def _concurrently(batcher, keys):
+    results = {}
+    errors = {}
+
+    def load(key):
+        try:
+            results[key] = batcher.load(key)
+        except Exception as exc:
+            errors[key] = exc
+
+    threads = [threading.Thread(target=load, args=(key,)) for key in keys]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_concurrent_loads_share_one_fetch():
+    calls = []
+
+    def fetch(keys):
+        calls.append(sorted(keys))
+        return {key: key.upper() for key in keys}
+
+    batcher = Batcher(fetch, window=0.2)
+    results, _ = _concurrently(batcher, ["a", "b", "c"])
+
+    assert results == {"a": "A", "b": "B", "c": "C"}
+    assert calls == [["a", "b", "c"]]
+
+
+def test_keys_are_fetched_in_arrival_order():
+    """So the bulk query for a given set of readers is the same every time."""
+    calls = []
+
+    def fetch(keys):
+        calls.append(list(keys))
+        return {}
+
+    batcher = Batcher(fetch, window=0.2)
+    threads = [threading.Thread(target=batcher.load, args=(key,)) for key in "cab"]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [["c", "a", "b"]]
+
+
+def test_a_missing_key_loads_as_none():
+    batcher = Batcher(lambda keys: {}, window=0.01)
+
+    assert batcher.load("ghost") is None
+
+
+def test_a_fetch_error_reaches_every_caller_in_the_batch():
+    def fetch(keys):
+        raise RuntimeError("supabase down")
+
+    batcher = Batcher(fetch, window=0.2)
+    results, errors = _concurrently(batcher, ["a", "b"])
+
+    assert results == {}
+    assert set(errors) == {"a", "b"}
+
+
+def test_a_full_batch_is_sent_without_waiting_out_the_window():
+    calls = []
+
+    def fetch(keys):
+        calls.append(len(keys))
+        return {}
+
+    batcher = Batcher(fetch, window=30, max_size=2)
+    _concurrently(batcher, ["a", "b"])
+
+    assert calls == [2]
+
+
+@pytest.mark.parametrize("window", [0, -1])
+def test_a_zero_window_disables_batching(window):
+    calls = []
+
+    def fetch(keys):
+        calls.append(list(keys))
+        return {}
+
+    batcher = Batcher(fetch, window=window)
+    batcher.load("a")
+    batcher.load("b")
+
+    assert calls == [["a"], ["b"]]
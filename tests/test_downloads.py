@@ -0,0 +1,206 @@
+"""Ranged, resumable downloads of Storage objects, against a mocked server."""
+
+import hashlib
+import re
+import threading
+import time
+
+import httpx
+import pytest
+import respx
+
+from services import downloads
+from services.audio_formats import NotAudio
+
+URL = "https://project.supabase.co/storage/v1/object/sign/audio/note.m4a?token=t"
+# An m4a header, then filler: 10 KB in all.
+AUDIO = b"\x00\x00\x00\x18ftypM4A " + bytes(range(256)) * 40
+
+
+class _DroppedStream(httpx.SyncByteStream):
+    """A body that stops with a connection error after [data]."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __iter__(self):
+        yield self.data
+        raise httpx.ReadError("connection reset")
+
+
+def _ranged(body, requests, drop_once=None):
+    """A side effect answering Range requests for [body], recording each range.
+
+    [drop_once] is the first byte of a range whose first response is cut off
+    halfway through.
+    """
+
+    def respond(request):
+        match = re.match(r"bytes=(\d+)-(\d+)", request.headers["range"])
+        first, last = int(match.group(1)), min(int(match.group(2)), len(body) - 1)
+        requests.append((first, last))
+        headers = {"Content-Range": f"bytes {first}-{last}/{len(body)}", "ETag": '"v1"'}
+        part = body[first : last + 1]
+        if first == drop_once and requests.count((first, last)) == 1:
+            return httpx.Response(206, headers=headers, stream=_DroppedStream(part[: len(part) // 2]))
+        return httpx.Response(206, headers=headers, content=part)
+
+    return respond
+
+
+@pytest.fixture
+def small_ranges(monkeypatch):
+    monkeypatch.setattr(downloads, "MIN_RANGE_BYTES", 1024)
+
+
+class TestRangedDownload:
+    @respx.mock
+    def test_ranges_reassemble_the_file(self, tmp_path, small_ranges):
+        requests = []
+        respx.get(URL).mock(side_effect=_ranged(AUDIO, requests))
+        destination = tmp_path / "audio.m4a"
+
+        fetched = downloads.download(URL, str(destination), max_bytes=1 << 20, connections=4)
+
+        assert destination.read_bytes() == AUDIO
+        assert fetched.sha256 == hashlib.sha256(AUDIO).hexdigest()
+        assert fetched.container == "mp4"
+        # The probe plus one range per remaining connection.
+        assert len(requests) == 4
+        assert requests[0] == (0, 1023)
+
+    @respx.mock
+    def test_a_dropped_range_resumes_where_it_stopped(self, tmp_path, small_ranges):
+        requests = []
+        respx.get(URL).mock(side_effect=_ranged(AUDIO, requests, drop_once=1024))
+        destination = tmp_path / "audio.m4a"
+
+        fetched = downloads.download(URL, str(destination), max_bytes=1 << 20, connections=2)
+
+        assert destination.read_bytes() == AUDIO
+        assert fetched.sha256 == hashlib.sha256(AUDIO).hexdigest()
+        resumed = [first for first, _ in requests if 1024 < first]
+        assert resumed == [1024 + (len(AUDIO) - 1024) // 2]
+
+    @respx.mock
+    def test_an_oversized_recording_is_refused_after_the_probe(self, tmp_path, small_ranges):
+        requests = []
+        respx.get(URL).mock(side_effect=_ranged(AUDIO, requests))
+
+        with pytest.raises(downloads.TooLarge):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=len(AUDIO) - 1)
+
+        assert len(requests) == 1
+
+    @respx.mock
+    def test_an_empty_recording_is_refused(self, tmp_path):
+        respx.get(URL).mock(return_value=httpx.Response(416))
+
+        with pytest.raises(ValueError, match="empty"):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=1 << 20)
+
+
+    @respx.mock
+    def test_a_failed_range_fails_the_download_without_waiting_for_the_rest(
+        self, tmp_path, small_ranges
+    ):
+        requests = []
+        serve = _ranged(AUDIO, requests)
+        release = threading.Event()
+
+        def respond(request):
+            if request.headers["range"].startswith("bytes=1024-"):
+                return httpx.Response(500)
+            if not request.headers["range"].startswith("bytes=0-"):
+                release.wait(5)  # a range on a slow connection
+            return serve(request)
+
+        respx.get(URL).mock(side_effect=respond)
+
+        started = time.monotonic()
+        with pytest.raises(httpx.HTTPStatusError):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=1 << 20, connections=3)
+        elapsed = time.monotonic() - started
+        release.set()
+
+        assert elapsed < 2
+
+
+class TestWithoutRangeSupport:
+    @respx.mock
+    def test_a_plain_200_is_streamed_in_one_piece(self, tmp_path, small_ranges):
+        route = respx.get(URL).mock(return_value=httpx.Response(200, content=AUDIO))
+        destination = tmp_path / "audio.m4a"
+
+        fetched = downloads.download(URL, str(destination), max_bytes=1 << 20)
+
+        assert route.call_count == 1
+        assert destination.read_bytes() == AUDIO
+        assert fetched.sha256 == hashlib.sha256(AUDIO).hexdigest()
+
+    @respx.mock
+    def test_a_range_of_unknown_total_is_fetched_again_whole(self, tmp_path, small_ranges):
+        """The probe's body is only its first range; without a total there is
+        nothing to plan the others from."""
+
+        def respond(request):
+            if "range" in request.headers:
+                return httpx.Response(
+                    206, headers={"Content-Range": "bytes 0-1023/*"}, content=AUDIO[:1024]
+                )
+            return httpx.Response(200, content=AUDIO)
+
+        route = respx.get(URL).mock(side_effect=respond)
+        destination = tmp_path / "audio.m4a"
+
+        fetched = downloads.download(URL, str(destination), max_bytes=1 << 20)
+
+        assert route.call_count == 2
+        assert destination.read_bytes() == AUDIO
+        assert fetched.sha256 == hashlib.sha256(AUDIO).hexdigest()
+
+    @respx.mock
+    def test_the_byte_cap_still_applies(self, tmp_path):
+        respx.get(URL).mock(return_value=httpx.Response(200, content=AUDIO))
+
+        with pytest.raises(downloads.TooLarge):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=100)
+
+
+class TestPreflight:
+    """Input that is obviously not a recording fails before it is fetched."""
+
+    @respx.mock
+    def test_a_declared_oversize_is_refused_without_reading_the_body(self, tmp_path):
+        respx.get(URL).mock(
+            return_value=httpx.Response(
+                200, headers={"Content-Length": str(1 << 30)}, stream=_DroppedStream(b"")
+            )
+        )
+
+        with pytest.raises(downloads.TooLarge):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=1 << 20)
+
+    @respx.mock
+    def test_a_non_audio_content_type_is_refused(self, tmp_path):
+        respx.get(URL).mock(
+            return_value=httpx.Response(
+                200, headers={"Content-Type": "text/html"}, content=b"<html>denied</html>"
+            )
+        )
+
+        with pytest.raises(NotAudio):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=1 << 20)
+
+    @respx.mock
+    def test_bytes_that_are_not_audio_are_refused_after_the_probe(
+        self, tmp_path, small_ranges
+    ):
+        requests = []
+        pdf = b"%PDF-1.7" + bytes(10_000)
+        respx.get(URL).mock(side_effect=_ranged(pdf, requests))
+
+        with pytest.raises(NotAudio):
+            downloads.download(URL, str(tmp_path / "audio.m4a"), max_bytes=1 << 20)
+
+        assert len(requests) == 1
@@ -0,0 +1,62 @@
+"""Bounds and expiry of the in-process job row cache."""
+
+import time
+
+from services.job_cache import JobCache
+
+
+def _row(status, transcript=""):
+    return {"user_id": "alice", "status": status, "transcript": transcript}
+
+
+def test_the_cache_is_bounded_by_bytes_not_entries():
+    cache = JobCache(max_bytes=20_000, unfinished_ttl=1)
+    for i in range(10):
+        cache.put(f"job-{i}", _row("complete", "x" * 3_000))
+
+    stats = cache.stats()
+
+    assert stats["bytes"] <= 20_000
+    assert stats["evictions"] > 0
+    # Least recently used goes first.
+    assert cache.get("job-0") is None
+    assert cache.get("job-9") is not None
+
+
+def test_a_read_keeps_an_entry_from_eviction():
+    cache = JobCache(max_bytes=7_000, unfinished_ttl=1)
+    for job_id in ("old", "b", "c", "d"):
+        cache.put(job_id, _row("complete", "x" * 1_000))
+
+    cache.get("old")
+    cache.put("e", _row("complete", "x" * 1_000))
+
+    assert cache.get("old") is not None
+    assert cache.get("b") is None
+
+
+def test_one_huge_transcript_is_not_cached():
+    """Caching it would evict everything else for the sake of one entry."""
+    cache = JobCache(max_bytes=10_000, unfinished_ttl=1)
+    cache.put("small", _row("complete", "hi"))
+    cache.put("huge", _row("complete", "x" * 9_000))
+
+    assert cache.get("huge") is None
+    assert cache.get("small") is not None
+
+
+def test_unfinished_rows_expire():
+    cache = JobCache(max_bytes=10_000, unfinished_ttl=0.02)
+    cache.put("job-1", _row("pending"))
+
+    assert cache.get("job-1") is not None
+    time.sleep(0.03)
+    assert cache.get("job-1") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_a_zero_ttl_disables_caching_unfinished_rows():
+    cache = JobCache(max_bytes=10_000, unfinished_ttl=0)
+    cache.put("job-1", _row("processing"))
+
+    assert cache.get("job-1") is None
@@ -0,0 +1,99 @@
+"""Waking parked status requests, locally and through the shared watcher."""
+
+import threading
+import time
+
+import pytest
+
+from services import ai_service, job_events
+
+
+@pytest.fixture(autouse=True)
+def fast_watcher(monkeypatch):
+    monkeypatch.setattr(job_events, "WATCH_INTERVAL_SECONDS", 0.01)
+
+
+def _no_change(status):
+    return lambda job_ids: {job_id: status for job_id in job_ids}
+
+
+class TestWaitForChange:
+    def test_a_local_status_write_wakes_the_waiter(self):
+        woke = []
+        thread = threading.Thread(
+            target=lambda: woke.append(
+                job_events.wait_for_change("job-1", "pending", 5, _no_change("pending"))
+            )
+        )
+        thread.start()
+        while job_events.stats()["waiting_requests"] == 0:
+            time.sleep(0.005)
+
+        job_events.notify("job-1")
+        thread.join(5)
+
+        assert woke == [True]
+
+    def test_the_watcher_notices_a_change_made_elsewhere(self):
+        """Another process finished the job; only the bulk read can tell."""
+        changed = job_events.wait_for_change(
+            "job-2", "processing", 5, _no_change("complete")
+        )
+
+        assert changed is True
+
+    def test_times_out_when_nothing_changes(self):
+        changed = job_events.wait_for_change(
+            "job-3", "processing", 0.1, _no_change("processing")
+        )
+
+        assert changed is False
+        assert job_events.stats()["watched_jobs"] == 0
+
+    def test_the_watcher_reads_every_watched_job_in_one_call(self):
+        calls = []
+
+        def fetch(job_ids):
+            calls.append(sorted(job_ids))
+            return {job_id: "pending" for job_id in job_ids}
+
+        threads = [
+            threading.Thread(
+                target=job_events.wait_for_change, args=(f"job-{i}", "pending", 0.3, fetch)
+            )
+            for i in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        assert max(len(ids) for ids in calls) == 5
+
+
+class TestWaitForTranscriptionJob:
+    def test_a_finished_job_returns_without_waiting(self, monkeypatch):
+        def fail(*args):
+            raise AssertionError("should not wait")
+
+        monkeypatch.setattr(job_events, "wait_for_change", fail)
+        job = {"status": "complete"}
+
+        assert ai_service.wait_for_transcription_job("job-1", "u", job, 30) is job
+
+    def test_a_change_is_re_read_scoped_to_the_user(self, monkeypatch):
+        captured = {}
+        monkeypatch.setattr(job_events, "wait_for_change", lambda *a: True)
+
+        def fake_get(job_id, user_id):
+            captured.update(job_id=job_id, user_id=user_id)
+            return {"status": "complete"}
+
+        monkeypatch.setattr(ai_service, "get_job", fake_get)
+
+        job = ai_service.wait_for_transcription_job(
+            "job-1", "user-1", {"status": "pending"}, 30
+        )
+
+        assert job == {"status": "complete"}
+        assert captured == {"job_id": "job-1", "user_id": "user-1"}
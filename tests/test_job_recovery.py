@@ -0,0 +1,297 @@
+"""Claiming jobs from the store: orphans of a worker that died mid-transcription,
+and jobs the web tier queued for `services.worker` to run."""
+
+import io
+import os
+import runpy
+import threading
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from services import ai_service, downloads, job_store, transcription_pool
+from services.stt import TranscriptionResult, TranscriptSegment
+from services.uploads import AudioUpload
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_service, "JOB_SCRATCH_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Fakes the job store calls the sweep makes, recording what it does."""
+    state = {
+        "expired": [],
+        "unclaimed": [],
+        "claimable": set(),
+        "created": [],
+        "updates": [],
+        "submitted": [],
+        "released": [],
+    }
+
+    def fake_create(user_id, **kwargs):
+        state["created"].append(kwargs)
+        return kwargs.get("job_id") or "job-new"
+
+    monkeypatch.setattr(ai_service, "create_job", fake_create)
+    monkeypatch.setattr(ai_service, "list_expired_jobs", lambda: state["expired"])
+    monkeypatch.setattr(
+        ai_service, "list_unclaimed_jobs", lambda: state["unclaimed"]
+    )
+    monkeypatch.setattr(
+        ai_service, "claim_job", lambda job, owner: job["id"] in state["claimable"]
+    )
+    monkeypatch.setattr(
+        ai_service,
+        "update_job",
+        lambda job_id, **fields: state["updates"].append((job_id, fields)),
+    )
+    monkeypatch.setattr(
+        ai_service,
+        "release_job",
+        lambda job_id, owner: state["released"].append(job_id),
+    )
+    monkeypatch.setattr(
+        ai_service,
+        "_run_transcription_job",
+        lambda *args: state["submitted"].append(args),
+    )
+    return state
+
+
+def _save_audio(scratch, job_id):
+    job_dir = scratch / job_id
+    job_dir.mkdir()
+    (job_dir / "note.m4a").write_bytes(b"audio")
+    return str(job_dir / "note.m4a")
+
+
+def _drain():
+    ai_service.get_pool().join(5)
+
+
+def test_an_orphan_with_its_audio_is_resumed(scratch, store):
+    audio_path = _save_audio(scratch, "job-1")
+    store["expired"] = [
+        {
+            "id": "job-1",
+            "attempts": 1,
+            "requested_language": "hi",
+            "requested_locale": "en_IN",
+        }
+    ]
+    store["claimable"] = {"job-1"}
+
+    assert ai_service.recover_orphaned_jobs() == 1
+    _drain()
+
+    assert store["submitted"] == [
+        ("job-1", audio_path, str(scratch / "job-1"), "hi", "en_IN")
+    ]
+
+
+def test_an_orphan_claimed_by_someone_else_is_left_alone(scratch, store):
+    _save_audio(scratch, "job-1")
+    store["expired"] = [{"id": "job-1", "attempts": 1}]
+
+    assert ai_service.recover_orphaned_jobs() == 0
+    _drain()
+
+    assert store["submitted"] == []
+    assert store["updates"] == []
+
+
+def test_an_orphan_whose_audio_is_gone_is_failed(scratch, store):
+    """Without the recording there is nothing to retry; say so instead of
+    leaving the client polling."""
+    store["expired"] = [{"id": "job-1", "attempts": 1}]
+    store["claimable"] = {"job-1"}
+
+    ai_service.recover_orphaned_jobs()
+
+    job_id, fields = store["updates"][0]
+    assert job_id == "job-1"
+    assert fields["status"] == "failed"
+
+
+def test_an_orphan_whose_audio_never_finished_arriving_is_failed(scratch, store):
+    """A download or upload cut short by the worker dying is not a recording
+    to transcribe."""
+    job_dir = scratch / "job-1"
+    job_dir.mkdir()
+    partial = job_dir / "audio.part"
+    partial.write_bytes(b"\0" * 1024)
+    stale = time.time() - job_store.LEASE_SECONDS - 1
+    os.utime(partial, (stale, stale))
+    store["expired"] = [{"id": "job-1", "attempts": 1}]
+    store["claimable"] = {"job-1"}
+
+    ai_service.recover_orphaned_jobs()
+
+    assert store["updates"][0][1]["status"] == "failed"
+    assert store["submitted"] == []
+    assert not job_dir.exists()
+
+
+def test_an_orphan_whose_audio_is_still_arriving_is_left_alone(scratch, store):
+    """A slow upload outlives the lease its web process never renews; the
+    recording is still coming, so neither run the job nor fail it."""
+    job_dir = scratch / "job-1"
+    job_dir.mkdir()
+    (job_dir / "audio.part").write_bytes(b"\0" * 1024)
+    store["expired"] = [{"id": "job-1", "attempts": 1}]
+    store["claimable"] = {"job-1"}
+
+    assert ai_service.recover_orphaned_jobs() == 0
+
+    assert store["updates"] == []
+    assert (job_dir / "audio.part").exists()
+
+
+def test_a_worker_started_in_inline_mode_exits_cleanly(monkeypatch):
+    """Rather than crash-looping, or polling for jobs nothing will queue."""
+    from services import worker
+
+    monkeypatch.setattr(ai_service, "TRANSCRIPTION_MODE", "inline")
+    monkeypatch.setattr(worker, "run_worker", lambda *args: pytest.fail("worker ran"))
+
+    assert worker.main([]) is None
+
+
+def test_the_app_re_imported_in_a_spawned_process_adopts_no_jobs(monkeypatch):
+    """Under `python app.py`, each of `normalise`'s encoder processes imports
+    app.py again, as __mp_main__."""
+    monkeypatch.setenv("ALLOW_ANONYMOUS", "1")
+    monkeypatch.setattr(
+        ai_service, "start_job_recovery", lambda: pytest.fail("recovery started")
+    )
+    app_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app.py")
+
+    runpy.run_path(app_path, run_name="__mp_main__")
+
+
+def test_a_job_that_keeps_killing_workers_is_failed(scratch, store):
+    _save_audio(scratch, "job-1")
+    store["expired"] = [{"id": "job-1", "attempts": ai_service.MAX_JOB_ATTEMPTS}]
+    store["claimable"] = {"job-1"}
+
+    ai_service.recover_orphaned_jobs()
+
+    assert store["updates"][0][1]["status"] == "failed"
+    assert store["submitted"] == []
+    assert not (scratch / "job-1").exists()
+
+
+class TestQueueMode:
+    @pytest.fixture(autouse=True)
+    def queue_mode(self, monkeypatch):
+        monkeypatch.setattr(ai_service, "TRANSCRIPTION_MODE", "queue")
+
+    def test_the_web_tier_only_saves_and_records_the_job(self, scratch, store):
+        upload = FileStorage(stream=io.BytesIO(b"audio"), filename="note.m4a")
+
+        job_id = ai_service.create_transcription_job("user-1", upload, "hi", "en_IN")
+        _drain()
+
+        assert job_id == "job-new"
+        assert (scratch / "job-new" / "note.m4a").read_bytes() == b"audio"
+        # Released, once the audio is saved, is what makes the job visible to
+        # the workers.
+        assert store["released"] == ["job-new"]
+        assert store["submitted"] == []
+
+    def test_a_worker_polling_mid_download_leaves_the_job_alone(
+        self, scratch, store, monkeypatch
+    ):
+        """The row exists before its audio does. Only once the audio is in
+        place is it released to the workers."""
+        def unclaimed():
+            created = store["created"][0]
+            if created["lease_owner"] is None or "job-new" in store["released"]:
+                return [{"id": "job-new", "attempts": 0}]
+            return []
+
+        monkeypatch.setattr(ai_service, "list_unclaimed_jobs", unclaimed)
+        store["claimable"] = {"job-new"}
+        claimed_mid_download = []
+
+        def slow_download(url, destination, max_bytes):
+            with open(destination, "wb") as partial:
+                partial.write(b"audio")
+            claimed_mid_download.append(ai_service.claim_pending_jobs())
+            return downloads.Downloaded("0" * 64, 5, "mp3")
+
+        monkeypatch.setattr(downloads, "download", slow_download)
+
+        job_id = ai_service.create_transcription_job_from_url("user-1", "https://x/a")
+
+        assert claimed_mid_download == [0]
+        assert all("status" not in fields for _, fields in store["updates"])
+        assert store["released"] == [job_id]
+        assert (scratch / job_id / "audio.mp3").read_bytes() == b"audio"
+        assert ai_service.claim_pending_jobs() == 1
+
+    def test_an_upload_received_in_place_is_not_copied(self, scratch, store):
+        job_id, upload_dir = ai_service.reserve_upload_dir()
+        received = AudioUpload(os.path.join(upload_dir, "note.m4a"), max_bytes=100)
+        received.write(b"audio")
+        received.seek(0)
+        upload = FileStorage(stream=received, filename="note.m4a")
+        # Not the recording until it has all arrived.
+        assert ai_service._find_job_audio(job_id) is None
+
+        assert ai_service.create_transcription_job("user-1", upload, job_id=job_id) == job_id
+
+        assert store["created"][0]["job_id"] == job_id
+        assert os.listdir(upload_dir) == ["note.m4a"]
+        assert received.closed
+
+    def test_a_worker_claims_and_runs_queued_jobs(self, scratch, store):
+        audio_path = _save_audio(scratch, "job-1")
+        store["unclaimed"] = [{"id": "job-1", "attempts": 0}]
+        store["claimable"] = {"job-1"}
+
+        assert ai_service.claim_pending_jobs() == 1
+        _drain()
+
+        assert store["submitted"][0][:2] == ("job-1", audio_path)
+
+    def test_an_asyncio_worker_runs_claimed_jobs_on_its_loop(
+        self, scratch, store, monkeypatch
+    ):
+        monkeypatch.setattr(transcription_pool, "_pool", None)
+        pool = transcription_pool.configure_loop(concurrency=10)
+        for job_id in ("job-1", "job-2"):
+            _save_audio(scratch, job_id)
+        store["unclaimed"] = [{"id": "job-1"}, {"id": "job-2"}]
+        store["claimable"] = {"job-1", "job-2"}
+        threads = []
+
+        async def fake_transcribe(path, language=None, locale=None):
+            threads.append(threading.current_thread().name)
+            return TranscriptionResult(
+                segments=[TranscriptSegment(text="namaste")], provider="sarvam"
+            )
+
+        monkeypatch.setattr(ai_service.stt, "transcribe_async", fake_transcribe)
+
+        assert ai_service.claim_pending_jobs() == 2
+        assert pool.join(5)
+
+        assert threads == ["transcription-loop"] * 2
+        completed = {
+            job_id
+            for job_id, fields in store["updates"]
+            if fields["status"] == "complete"
+        }
+        assert completed == {"job-1", "job-2"}
+        assert store["submitted"] == []
+        assert not (scratch / "job-1").exists()
+
+    def test_queue_mode_web_processes_do_not_adopt_orphans(self):
+        assert ai_service.start_job_recovery() is False
@@ -0,0 +1,410 @@
+"""PostgREST calls made by the job store, against a mocked Supabase.
+
+Lease claims are the subtle part: two workers racing for the same orphaned job
+must not both win, and that rests entirely on the filters sent with the PATCH.
+"""
+
+import importlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import httpx
+import pytest
+import respx
+
+SUPABASE_URL = "https://project.supabase.co"
+JOBS_URL = f"{SUPABASE_URL}/rest/v1/transcription_jobs"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """services.job_store reloaded so its import-time env globals are re-read."""
+    monkeypatch.setenv("SUPABASE_URL", SUPABASE_URL)
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "service-key")
+
+    import services.job_store as module
+
+    importlib.reload(module)
+    yield module
+
+    # Leave an unconfigured store behind, or the next app reload would start
+    # lease threads against the fake project URL.
+    monkeypatch.undo()
+    importlib.reload(module)
+
+
+class TestCreateJob:
+    @respx.mock
+    def test_a_leased_job_is_owned_from_the_start(self, store, monkeypatch):
+        monkeypatch.setattr(store, "ASYNC_CREATE", False)
+        route = respx.post(JOBS_URL).mock(return_value=httpx.Response(201))
+
+        job_id = store.create_job(
+            "user-1", requested_language="hi", requested_locale="en_IN",
+            lease_owner="host:1:abc",
+        )
+
+        payload = json.loads(route.calls.last.request.content)
+        assert payload["id"] == job_id
+        assert payload["lease_owner"] == "host:1:abc"
+        assert payload["requested_locale"] == "en_IN"
+        assert payload["attempts"] == 1
+        assert "lease_expires_at" in payload
+
+
+class TestJobIds:
+    def test_ids_are_uuid7_and_time_ordered(self, store):
+        first = store.new_job_id()
+        time.sleep(0.002)
+        second = store.new_job_id()
+
+        assert uuid.UUID(first).version == 7
+        assert uuid.UUID(first).variant == uuid.RFC_4122
+        assert first < second
+
+    def test_the_issue_time_is_read_back_from_the_id(self, store):
+        issued_at = store._issued_at(store.new_job_id())
+
+        assert abs(issued_at - time.time()) < 1
+        assert store._issued_at(str(uuid.uuid4())) is None
+        assert store._issued_at("not-a-uuid") is None
+
+
+class TestBackgroundCreate:
+    """The upload request gets its job id without waiting for the insert."""
+
+    @pytest.fixture
+    def slow_insert(self):
+        release = threading.Event()
+
+        def insert(request):
+            release.wait(5)
+            return httpx.Response(201)
+
+        with respx.mock:
+            route = respx.post(JOBS_URL).mock(side_effect=insert)
+            yield route, release
+            release.set()
+
+    def test_a_status_read_before_the_insert_lands_is_pending(self, store, slow_insert):
+        _, release = slow_insert
+
+        job_id = store.create_job("alice")
+
+        assert store.get_job(job_id, "alice") == {
+            "status": "pending", "transcript": None, "error": None,
+        }
+        assert store.get_job(job_id, "mallory") is None
+        release.set()
+
+    def test_an_update_waits_for_the_insert(self, store, slow_insert):
+        post, release = slow_insert
+        order = []
+
+        def insert(request):
+            release.wait(5)
+            order.append("insert")
+            return httpx.Response(201)
+
+        def update(request):
+            order.append("update")
+            return httpx.Response(204)
+
+        post.side_effect = insert
+        respx.patch(JOBS_URL).mock(side_effect=update)
+
+        job_id = store.create_job("alice")
+        updater = threading.Thread(
+            target=store.update_job, args=(job_id,), kwargs={"status": "failed"}
+        )
+        updater.start()
+        time.sleep(0.05)
+        release.set()
+        updater.join(5)
+
+        assert order == ["insert", "update"]
+
+    def test_a_job_whose_insert_is_given_up_on_is_not_written_to(
+        self, store, monkeypatch
+    ):
+        """Its updates would match no row, and a client polling it would see
+        pending until the grace ran out; say it is gone at once instead."""
+        monkeypatch.setattr(store.time, "sleep", lambda seconds: None)
+        with respx.mock:
+            post = respx.post(JOBS_URL).mock(return_value=httpx.Response(500))
+            patch = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+            respx.get(JOBS_URL).mock(return_value=httpx.Response(200, json=[]))
+
+            job_id = store.create_job("alice")
+
+            assert store.job_inserted(job_id) is False
+            assert post.call_count == store._INSERT_ATTEMPTS
+            store.update_job(job_id, status="failed")
+            assert patch.call_count == 0
+            assert store.get_job(job_id, "alice") is None
+
+    @respx.mock
+    def test_another_processes_new_job_reads_as_pending_until_the_grace_ends(
+        self, store, monkeypatch
+    ):
+        respx.get(JOBS_URL).mock(return_value=httpx.Response(200, json=[]))
+        fresh = store.new_job_id()
+
+        assert store.get_job(fresh, "alice")["status"] == "pending"
+
+        monkeypatch.setattr(store, "INSERT_GRACE_SECONDS", 0)
+        assert store.get_job(fresh, "alice") is None
+
+
+class TestClaimJob:
+    @respx.mock
+    def test_the_claim_is_conditional_on_what_was_read(self, store):
+        route = respx.patch(JOBS_URL).mock(
+            return_value=httpx.Response(200, json=[{"id": "job-1"}])
+        )
+
+        claimed = store.claim_job(
+            {"id": "job-1", "lease_owner": "dead:1:abc", "attempts": 1}, "me"
+        )
+
+        params = route.calls.last.request.url.params
+        payload = json.loads(route.calls.last.request.content)
+        assert claimed is True
+        assert params["id"] == "eq.job-1"
+        assert params["lease_owner"] == "eq.dead:1:abc"
+        assert params["attempts"] == "eq.1"
+        assert params["lease_expires_at"].startswith("lt.")
+        assert payload["lease_owner"] == "me"
+        assert payload["attempts"] == 2
+
+    @respx.mock
+    def test_losing_the_race_is_reported(self, store):
+        """No rows back means another worker claimed or renewed it first."""
+        respx.patch(JOBS_URL).mock(return_value=httpx.Response(200, json=[]))
+
+        assert store.claim_job({"id": "job-1", "attempts": 0}, "me") is False
+
+    @respx.mock
+    def test_an_unowned_job_is_matched_on_a_null_owner(self, store):
+        route = respx.patch(JOBS_URL).mock(
+            return_value=httpx.Response(200, json=[{"id": "job-1"}])
+        )
+
+        store.claim_job({"id": "job-1", "lease_owner": None, "attempts": 0}, "me")
+
+        assert route.calls.last.request.url.params["lease_owner"] == "is.null"
+
+
+    @respx.mock
+    def test_a_release_only_undoes_our_own_lease(self, store):
+        """A worker that adopted the job after our lease lapsed keeps it."""
+        route = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.release_job("job-1", "me")
+
+        params = route.calls.last.request.url.params
+        payload = json.loads(route.calls.last.request.content)
+        assert params["lease_owner"] == "eq.me"
+        assert params["status"] == "eq.pending"
+        assert payload["lease_owner"] is None
+        assert payload["attempts"] == 0
+
+
+class TestTimeouts:
+    @respx.mock
+    def test_requests_use_the_configured_timeout(self, store, monkeypatch):
+        """SUPABASE_HTTP_TIMEOUT, not a timeout of the store's own."""
+        from services import supabase_http
+
+        monkeypatch.setattr(supabase_http, "TIMEOUT_SECONDS", 42.0)
+        monkeypatch.setattr(supabase_http, "_client", supabase_http.build_client())
+        monkeypatch.setattr(supabase_http, "_client_pid", os.getpid())
+        route = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.renew_leases("me")
+
+        assert route.calls.last.request.extensions["timeout"]["read"] == 42.0
+
+
+class TestRenewLeases:
+    @respx.mock
+    def test_one_request_renews_every_unfinished_job_of_the_owner(self, store):
+        route = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.renew_leases("me")
+
+        params = route.calls.last.request.url.params
+        assert route.call_count == 1
+        assert params["lease_owner"] == "eq.me"
+        assert params["status"] == "in.(pending,processing)"
+
+
+class TestGetJob:
+    @respx.mock
+    def test_concurrent_reads_share_one_query(self, store, monkeypatch):
+        monkeypatch.setattr(store._job_reads, "window", 0.2)
+        route = respx.get(JOBS_URL).mock(
+            return_value=httpx.Response(
+                200,
+                json=[
+                    {"id": "job-1", "user_id": "alice", "status": "pending"},
+                    {"id": "job-2", "user_id": "bob", "status": "complete",
+                     "transcript": "hi"},
+                ],
+            )
+        )
+        results = {}
+
+        def read(job_id, user_id):
+            results[job_id] = store.get_job(job_id, user_id)
+
+        threads = [
+            threading.Thread(target=read, args=("job-1", "alice")),
+            threading.Thread(target=read, args=("job-2", "bob")),
+        ]
+        for thread in threads:
+            thread.start()
+            # Well inside the window, and enough that job-1 is there first.
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join(5)
+
+        assert route.call_count == 1
+        assert route.calls.last.request.url.params["id"] == 'in.("job-1","job-2")'
+        assert results["job-1"] == {"status": "pending", "transcript": None, "error": None}
+        assert results["job-2"]["transcript"] == "hi"
+
+    @respx.mock
+    def test_another_users_job_reads_as_missing(self, store):
+        """The batched query is not filtered by user, so the check on the way
+        out is the only thing keeping one user out of another's transcript."""
+        respx.get(JOBS_URL).mock(
+            return_value=httpx.Response(
+                200, json=[{"id": "job-1", "user_id": "alice", "status": "complete"}]
+            )
+        )
+
+        assert store.get_job("job-1", "mallory") is None
+
+    @respx.mock
+    def test_a_failed_read_raises(self, store):
+        respx.get(JOBS_URL).mock(return_value=httpx.Response(500))
+
+        with pytest.raises(store.JobStoreError):
+            store.get_job("job-1", "alice")
+
+
+class TestReadThroughCache:
+    def _mock_row(self, status, transcript=None):
+        return respx.get(JOBS_URL).mock(
+            return_value=httpx.Response(
+                200,
+                json=[{"id": "job-1", "user_id": "alice", "status": status,
+                       "transcript": transcript}],
+            )
+        )
+
+    @respx.mock
+    def test_a_finished_job_is_read_once(self, store):
+        route = self._mock_row("complete", "hello")
+
+        for _ in range(3):
+            assert store.get_job("job-1", "alice")["transcript"] == "hello"
+
+        assert route.call_count == 1
+        assert store._job_cache.stats()["hits"] == 2
+
+    @respx.mock
+    def test_a_cached_job_is_still_scoped_to_its_user(self, store):
+        self._mock_row("complete", "private")
+        store.get_job("job-1", "alice")
+
+        assert store.get_job("job-1", "mallory") is None
+
+    @respx.mock
+    def test_an_unfinished_job_is_only_cached_briefly(self, store, monkeypatch):
+        route = self._mock_row("processing")
+        monkeypatch.setattr(store._job_cache, "unfinished_ttl", 0.05)
+
+        store.get_job("job-1", "alice")
+        store.get_job("job-1", "alice")
+        assert route.call_count == 1
+
+        time.sleep(0.06)
+        store.get_job("job-1", "alice")
+        assert route.call_count == 2
+
+    @respx.mock
+    def test_a_local_status_write_invalidates_the_entry(self, store):
+        route = self._mock_row("processing")
+        respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.get_job("job-1", "alice")
+        store.update_job("job-1", status="complete")
+        store.get_job("job-1", "alice")
+
+        assert route.call_count == 2
+
+
+class TestWriteBehind:
+    """Intermediate transitions are buffered; terminal ones are written at once."""
+
+    @pytest.fixture(autouse=True)
+    def _no_background_flush(self, store, monkeypatch):
+        # Flushes happen when the test says so, not on the flusher's timer.
+        monkeypatch.setattr(store._write_behind, "interval", 3600)
+        yield
+        # Nothing left over for the exit-time flush to send to the fake project.
+        store._write_behind._pending.clear()
+
+    @respx.mock
+    def test_a_processing_update_is_not_written_immediately(self, store):
+        route = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.update_job("job-1", status="processing")
+
+        assert route.call_count == 0
+
+    @respx.mock
+    def test_a_terminal_write_carries_the_buffered_fields(self, store):
+        route = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.update_job("job-1", status="processing", provider="sarvam")
+        store.update_job("job-1", status="complete", transcript="hi")
+        store.flush_updates()
+
+        payload = json.loads(route.calls.last.request.content)
+        assert route.call_count == 1
+        assert route.calls.last.request.url.params["id"] == "eq.job-1"
+        assert payload["status"] == "complete"
+        assert payload["provider"] == "sarvam"
+
+    @respx.mock
+    def test_identical_updates_share_one_request(self, store):
+        route = respx.patch(JOBS_URL).mock(return_value=httpx.Response(204))
+
+        store.update_job("job-1", status="processing")
+        store.update_job("job-2", status="processing")
+        store.flush_updates()
+
+        params = route.calls.last.request.url.params
+        assert route.call_count == 1
+        assert params["id"] in ('in.("job-1","job-2")', 'in.("job-2","job-1")')
+        # A late flush must never reopen a job finished in the meantime.
+        assert params["status"] == "not.in.(complete,failed)"
+
+    @respx.mock
+    def test_a_failed_flush_is_retried(self, store):
+        route = respx.patch(JOBS_URL).mock(
+            side_effect=[httpx.Response(503), httpx.Response(204)]
+        )
+
+        store.update_job("job-1", status="processing")
+        store.flush_updates()
+        store.flush_updates()
+
+        assert route.call_count == 2
+        assert json.loads(route.calls.last.request.content)["status"] == "processing"
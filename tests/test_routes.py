@@ -4,7 +4,10 @@ Every test runs against the anonymous_app fixture, which stubs auth out; the
 authentication rules themselves live in test_auth.py.
 """
 
+import hashlib
 import io
+import os
+import threading
 
 import pytest
 
@@ -17,8 +20,21 @@ def app_module(anonymous_app):
     return module
 
 
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    """Uploads are received into the job scratch directory; keep it in tmp."""
+    import services.ai_service as ai_service
+
+    monkeypatch.setattr(ai_service, "JOB_SCRATCH_DIR", str(tmp_path))
+    return tmp_path
+
+
+# Starts like an m4a, which is all the upload path checks.
+AUDIO = b"\x00\x00\x00\x18ftypM4A fake audio bytes"
+
+
 def _audio_upload(**fields):
-    data = {"file": (io.BytesIO(b"fake audio bytes"), "note.m4a")}
+    data = {"file": (io.BytesIO(AUDIO), "note.m4a")}
     data.update(fields)
     return data
 
@@ -49,7 +65,9 @@ class TestTranscribeUpload:
         the app silently falls back to auto-detect and nobody notices."""
         captured = {}
 
-        def fake_create(user_id, file_storage, language=None, locale=None):
+        def fake_create(
+            user_id, file_storage, language=None, locale=None, job_id=None, ticket=None
+        ):
             captured.update(
                 user_id=user_id, language=language, locale=locale
             )
@@ -84,6 +102,136 @@ class TestTranscribeUpload:
         assert response.status_code == 500
         assert "SARVAM_API_KEY" not in response.get_data(as_text=True)
 
+    def test_a_full_queue_is_503_with_retry_after(
+        self, client, monkeypatch, app_module
+    ):
+        """Clients back off on Retry-After; a 500 would read as a hard failure."""
+
+        def refuse(*args, **kwargs):
+            raise app_module.QueueFullError(retry_after=42)
+
+        monkeypatch.setattr(app_module, "create_transcription_job", refuse)
+
+        response = client.post(
+            "/transcribe", data=_audio_upload(), content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "42"
+
+
+class TestStreamedUpload:
+    """The upload is written once, into the job's own directory."""
+
+    def test_the_file_is_received_into_the_job_directory(
+        self, client, monkeypatch, app_module, scratch
+    ):
+        received = {}
+
+        def fake_create(
+            user_id, file_storage, language=None, locale=None, job_id=None, ticket=None
+        ):
+            received.update(job_id=job_id, stream=file_storage.stream)
+            return job_id
+
+        monkeypatch.setattr(app_module, "create_transcription_job", fake_create)
+
+        response = client.post(
+            "/transcribe", data=_audio_upload(), content_type="multipart/form-data"
+        )
+
+        stream = received["stream"]
+        assert response.get_json()["job_id"] == received["job_id"]
+        assert stream.path == os.path.join(scratch, received["job_id"], "note.m4a")
+        assert stream.size == len(AUDIO)
+        assert stream.sha256 == hashlib.sha256(AUDIO).hexdigest()
+
+    def test_a_full_pool_refuses_before_any_audio_is_written(
+        self, client, monkeypatch, app_module, scratch
+    ):
+        def refuse(user_id):
+            raise app_module.QueueFullError(retry_after=42)
+
+        monkeypatch.setattr(app_module, "admit_transcription", refuse)
+        monkeypatch.setattr(
+            app_module, "create_transcription_job", lambda *a, **k: pytest.fail("created")
+        )
+
+        response = client.post(
+            "/transcribe", data=_audio_upload(), content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 503
+        assert os.listdir(scratch) == []
+
+    def test_an_upload_that_breaks_off_leaves_nothing_behind(
+        self, client, monkeypatch, app_module, scratch
+    ):
+        cancelled = []
+        ticket = type("Ticket", (), {"cancel": lambda self: cancelled.append(True)})()
+        monkeypatch.setattr(app_module, "admit_transcription", lambda user_id: ticket)
+
+        def disconnect(head):
+            raise ConnectionResetError("client went away")
+
+        monkeypatch.setattr(app_module, "require_audio", disconnect)
+
+        with pytest.raises(ConnectionResetError):
+            client.post(
+                "/transcribe", data=_audio_upload(), content_type="multipart/form-data"
+            )
+
+        assert os.listdir(scratch) == []
+        assert cancelled == [True]
+
+    def test_an_oversized_upload_is_413_and_leaves_nothing_behind(
+        self, client, monkeypatch, app_module, scratch
+    ):
+        monkeypatch.setattr(app_module, "MAX_AUDIO_BYTES", 4)
+        monkeypatch.setattr(
+            app_module, "create_transcription_job", lambda *a, **k: "job-1"
+        )
+
+        response = client.post(
+            "/transcribe", data=_audio_upload(), content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 413
+        assert os.listdir(scratch) == []
+
+    def test_a_file_that_is_not_audio_is_415(self, client, monkeypatch, app_module, scratch):
+        monkeypatch.setattr(
+            app_module, "create_transcription_job", lambda *a, **k: "job-1"
+        )
+
+        response = client.post(
+            "/transcribe",
+            data={"file": (io.BytesIO(b"%PDF-1.7 not a recording"), "note.m4a")},
+            content_type="multipart/form-data",
+        )
+
+        assert response.status_code == 415
+        assert "audio" in response.get_json()["error"]
+        assert os.listdir(scratch) == []
+
+    def test_a_declared_oversize_is_413_before_the_body_is_read(
+        self, client, monkeypatch, app_module, scratch
+    ):
+        monkeypatch.setattr(app_module, "MAX_AUDIO_BYTES", 4)
+        monkeypatch.setattr(app_module, "MAX_FORM_OVERHEAD_BYTES", 0)
+
+        response = client.post(
+            "/transcribe", data=_audio_upload(), content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 413
+        assert os.listdir(scratch) == []
+
+    def test_a_request_without_a_file_leaves_nothing_behind(self, client, scratch):
+        client.post("/transcribe", data={})
+
+        assert os.listdir(scratch) == []
+
 
 class TestTranscribeUrl:
     @pytest.mark.parametrize(
@@ -134,6 +282,23 @@ class TestTranscribeUrl:
         assert captured["language"] == "de"
         assert captured["locale"] == "de_DE"
 
+    def test_a_url_that_is_not_audio_is_422_with_the_reason(
+        self, client, monkeypatch, app_module
+    ):
+        from services.audio_formats import NotAudio
+
+        def reject(*args, **kwargs):
+            raise NotAudio()
+
+        monkeypatch.setattr(app_module, "create_transcription_job_from_url", reject)
+
+        response = client.post(
+            "/transcribe_url", json={"audio_url": "https://storage.example.com/a.pdf"}
+        )
+
+        assert response.status_code == 422
+        assert response.get_json()["error"] == str(NotAudio())
+
 
 class TestTranscribeStatus:
     def test_a_missing_job_is_404(self, client, monkeypatch, app_module):
@@ -189,6 +354,140 @@ class TestTranscribeStatus:
 
         assert response.status_code == 503
 
+    def test_wait_holds_for_a_change(self, client, monkeypatch, app_module):
+        captured = {}
+        pending = {"status": "pending"}
+        done = {"status": "complete", "transcript": "hello"}
+
+        def fake_wait(job_id, user_id, job, timeout):
+            captured.update(job=job, timeout=timeout)
+            return done
+
+        monkeypatch.setattr(app_module, "get_transcription_job", lambda *a: pending)
+        monkeypatch.setattr(app_module, "wait_for_transcription_job", fake_wait)
+
+        response = client.get("/transcribe/status/job-1?wait=10")
+
+        assert response.get_json() == done
+        assert captured == {"job": pending, "timeout": 10.0}
+
+    def test_wait_is_capped(self, client, monkeypatch, app_module):
+        """Past ~60s idle, proxies cut the connection and the client sees an
+        error instead of a status."""
+        captured = {}
+
+        def fake_wait(job_id, user_id, job, timeout):
+            captured["timeout"] = timeout
+            return job
+
+        monkeypatch.setattr(
+            app_module, "get_transcription_job", lambda *a: {"status": "pending"}
+        )
+        monkeypatch.setattr(app_module, "wait_for_transcription_job", fake_wait)
+
+        client.get("/transcribe/status/job-1?wait=3600")
+
+        assert captured["timeout"] == app_module.MAX_STATUS_WAIT_SECONDS
+
+    def test_waits_past_the_cap_are_answered_at_once(
+        self, client, monkeypatch, app_module
+    ):
+        """Each held request holds a worker thread, as an SSE stream does."""
+        waited = []
+
+        def fake_wait(job_id, user_id, job, timeout):
+            waited.append(timeout)
+            return job
+
+        monkeypatch.setattr(
+            app_module, "get_transcription_job", lambda *a: {"status": "pending"}
+        )
+        monkeypatch.setattr(app_module, "wait_for_transcription_job", fake_wait)
+        monkeypatch.setattr(app_module, "_status_waits", threading.BoundedSemaphore(1))
+
+        app_module._status_waits.acquire()
+        response = client.get("/transcribe/status/job-1?wait=10")
+        app_module._status_waits.release()
+
+        assert response.get_json() == {"status": "pending"}
+        assert waited == []
+        # Finished waits give their place back.
+        for _ in range(3):
+            client.get("/transcribe/status/job-1?wait=10")
+        assert waited == [10.0] * 3
+
+    def test_a_non_numeric_wait_is_a_400(self, client, monkeypatch, app_module):
+        monkeypatch.setattr(
+            app_module, "get_transcription_job", lambda *a: {"status": "pending"}
+        )
+
+        assert client.get("/transcribe/status/job-1?wait=soon").status_code == 400
+
+
+class TestTranscribeStatusEvents:
+    def test_streams_each_state_until_the_job_finishes(
+        self, client, monkeypatch, app_module
+    ):
+        states = [{"status": "processing"}, None, {"status": "complete"}]
+        monkeypatch.setattr(
+            app_module, "get_transcription_job", lambda *a: {"status": "pending"}
+        )
+        monkeypatch.setattr(
+            app_module,
+            "stream_transcription_job",
+            lambda job_id, user_id, job, *a: iter([job] + states),
+        )
+
+        response = client.get("/transcribe/status/job-1/events")
+        body = response.get_data(as_text=True)
+
+        assert response.mimetype == "text/event-stream"
+        assert body.count("event: status") == 3
+        assert ": keep-alive" in body
+        assert '"status": "complete"' in body
+
+    def test_streams_past_the_cap_are_sent_to_long_polling(
+        self, client, monkeypatch, app_module
+    ):
+        """Each open stream holds a worker thread; a few dozen must not starve
+        uploads and rewrites."""
+        monkeypatch.setattr(
+            app_module, "get_transcription_job", lambda *a: {"status": "pending"}
+        )
+        monkeypatch.setattr(
+            app_module,
+            "stream_transcription_job",
+            lambda job_id, user_id, job, *a: iter([job]),
+        )
+        monkeypatch.setattr(app_module, "_status_streams", threading.BoundedSemaphore(1))
+
+        app_module._status_streams.acquire()
+        refused = client.get("/transcribe/status/job-1/events")
+        app_module._status_streams.release()
+
+        assert refused.status_code == 503
+        assert "?wait=" in refused.get_json()["error"]
+        assert refused.headers["Retry-After"]
+        # Finished streams give their place back.
+        for _ in range(3):
+            with client.get("/transcribe/status/job-1/events") as response:
+                assert response.status_code == 200
+
+    def test_a_missing_job_is_404_not_an_empty_stream(
+        self, client, monkeypatch, app_module
+    ):
+        monkeypatch.setattr(app_module, "get_transcription_job", lambda *a: None)
+
+        assert client.get("/transcribe/status/nope/events").status_code == 404
+
+
+class TestMetrics:
+    def test_reports_the_transcription_pool(self, client):
+        body = client.get("/metrics").get_json()
+
+        assert "pid" in body
+        assert {"active", "queued", "workers"} <= set(body["transcription_pool"])
+
 
 class TestSummarize:
     def test_missing_text_is_rejected(self, client):
@@ -0,0 +1,194 @@
+"""Several recordings in one Sarvam job, each getting its own transcript back.
+
+The per-job overhead is what batching saves; mixing up whose transcript is
+whose is what it must never do.
+"""
+
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import respx
+
+from services.stt import sarvam_poller, sarvam_provider
+from services.stt.types import TranscriptionError
+
+
+OUTPUTS = "https://outputs.sarvam.test/"
+
+
+class FakeJob:
+    def __init__(self, client, settings):
+        self.client = client
+        self.settings = settings
+        self.job_id = f"job-{len(client.jobs)}"
+        self.names = []
+
+    def upload_files(self, paths):
+        # Like the SDK, key everything by file name, and read the files.
+        self.names = [os.path.basename(path) for path in paths]
+        self.contents = {os.path.basename(p): open(p, encoding="utf-8").read() for p in paths}
+
+    def start(self):
+        pass
+
+    def get_status(self):
+        # Like Sarvam, outputs are numbered rather than named after inputs.
+        details = [
+            SimpleNamespace(
+                inputs=[SimpleNamespace(file_name=name)],
+                outputs=[SimpleNamespace(file_name=f"{index}.json")],
+                state="Failed" if self.contents[name] in self.client.unprocessable else "Success",
+            )
+            for index, name in enumerate(self.names)
+        ]
+        return SimpleNamespace(
+            job_state="Failed" if self.client.fail_job else "Completed", job_details=details
+        )
+
+    def output(self, file_name):
+        name = self.names[int(file_name.split(".")[0])]
+        return {"transcript": f"heard {self.contents[name]}"}
+
+
+class FakeClient:
+    def __init__(self):
+        self.jobs = []
+        self.fail_job = False
+        self.unprocessable = set()
+        self.speech_to_text_job = SimpleNamespace(
+            create_job=self._create, get_download_links=self._links
+        )
+
+    def _create(self, **settings):
+        job = FakeJob(self, settings)
+        self.jobs.append(job)
+        return job
+
+    def _links(self, job_id, files):
+        urls = {
+            name: SimpleNamespace(file_url=f"{OUTPUTS}{job_id}/{name}") for name in files
+        }
+        return SimpleNamespace(download_urls=urls)
+
+    def serve(self, request):
+        job_id, name = request.url.path.strip("/").split("/")
+        job = next(job for job in self.jobs if job.job_id == job_id)
+        return httpx.Response(200, content=json.dumps(job.output(name)).encode())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(sarvam_provider, "_get_client", lambda: fake)
+    monkeypatch.setattr(sarvam_provider, "BATCH", True)
+    monkeypatch.setattr(sarvam_provider, "BATCH_WINDOW_SECONDS", 0.3)
+    monkeypatch.setattr(sarvam_poller, "POLL_MIN_SECONDS", 0.01)
+    with respx.mock:
+        respx.get(url__startswith=OUTPUTS).mock(side_effect=fake.serve)
+        yield fake
+
+
+def _recordings(tmp_path, names):
+    """One "audio.wav" per job directory, as the app lays them out."""
+    paths = []
+    for name in names:
+        job_dir = tmp_path / name
+        job_dir.mkdir()
+        path = job_dir / "audio.wav"
+        path.write_text(name, encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def _transcribe_all(jobs):
+    """Runs (path, language) pairs concurrently; each result or exception."""
+    outcomes = [None] * len(jobs)
+
+    def run(index, path, language):
+        try:
+            outcomes[index] = sarvam_provider.SarvamProvider().transcribe(path, language)
+        except Exception as exc:
+            outcomes[index] = exc
+
+    threads = [threading.Thread(target=run, args=(i, *job)) for i, job in enumerate(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+class TestBatching:
+    def test_compatible_recordings_share_one_job_and_keep_their_transcripts(
+        self, tmp_path, client
+    ):
+        paths = _recordings(tmp_path, ["one", "two", "three"])
+
+        results = _transcribe_all([(path, "hi") for path in paths])
+
+        assert len(client.jobs) == 1
+        assert [result.to_text() for result in results] == [
+            "heard one", "heard two", "heard three",
+        ]
+
+    def test_different_languages_get_different_jobs(self, tmp_path, client):
+        hindi, tamil = _recordings(tmp_path, ["hindi", "tamil"])
+
+        results = _transcribe_all([(hindi, "hi"), (tamil, "ta")])
+
+        assert len(client.jobs) == 2
+        assert {job.settings["language_code"] for job in client.jobs} == {"hi-IN", "ta-IN"}
+        assert [result.to_text() for result in results] == ["heard hindi", "heard tamil"]
+
+    def test_a_full_batch_starts_without_waiting_out_the_window(
+        self, tmp_path, client, monkeypatch
+    ):
+        monkeypatch.setattr(sarvam_provider, "BATCH_MAX_FILES", 2)
+        monkeypatch.setattr(sarvam_provider, "BATCH_WINDOW_SECONDS", 30)
+        paths = _recordings(tmp_path, ["one", "two"])
+
+        results = _transcribe_all([(path, "hi") for path in paths])
+
+        assert [result.to_text() for result in results] == ["heard one", "heard two"]
+
+    def test_one_unprocessable_recording_fails_alone(self, tmp_path, client):
+        client.unprocessable = {"bad"}
+        good, bad = _recordings(tmp_path, ["good", "bad"])
+
+        results = _transcribe_all([(good, "hi"), (bad, "hi")])
+
+        assert results[0].to_text() == "heard good"
+        assert isinstance(results[1], TranscriptionError)
+
+    def test_a_failed_job_fails_every_recording_in_it(self, tmp_path, client):
+        client.fail_job = True
+        paths = _recordings(tmp_path, ["one", "two"])
+
+        results = _transcribe_all([(path, "hi") for path in paths])
+
+        assert all(isinstance(result, TranscriptionError) for result in results)
+
+    def test_staged_links_are_cleaned_up(self, tmp_path, client, monkeypatch):
+        staging = tmp_path / "staging"
+        staging.mkdir()
+        monkeypatch.setattr(sarvam_provider.tempfile, "tempdir", str(staging))
+        paths = _recordings(tmp_path, ["one"])
+
+        _transcribe_all([(paths[0], "hi")])
+
+        assert os.listdir(staging) == []
+
+
+def test_without_batching_each_recording_is_its_own_job(tmp_path, client, monkeypatch):
+    monkeypatch.setattr(sarvam_provider, "BATCH", False)
+    paths = _recordings(tmp_path, ["one", "two"])
+
+    results = _transcribe_all([(path, "hi") for path in paths])
+
+    assert len(client.jobs) == 2
+    assert [result.to_text() for result in results] == ["heard one", "heard two"]
+    assert not os.path.exists(os.path.join(os.path.dirname(paths[0]), "sarvam_out"))
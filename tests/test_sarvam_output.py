@@ -0,0 +1,115 @@
+"""Sarvam job output parsed straight off the download.
+
+Whatever the chunking, the streamed output must come out of `_parse` exactly
+as the loaded dict does; and it must actually stream, or the point is lost.
+"""
+
+import json
+
+import pytest
+
+from services.stt.sarvam_output import SarvamOutput
+from services.stt.sarvam_provider import _PARSED_KEYS, _parse
+
+
+def _entry(speaker_id, transcript="", english=None):
+    transcriptions = {"en-IN": {"text": english}} if english is not None else {}
+    return {
+        "speaker_id": speaker_id,
+        "transcript": transcript,
+        "transcription_output": {"transcriptions": transcriptions},
+    }
+
+
+PAYLOADS = {
+    "diarized": {
+        "request_id": "r-1",
+        "transcript": "नमस्ते, shall we start? Yes.",
+        "diarized_transcript": {
+            "entries": [
+                _entry("SPEAKER_00", "नमस्ते, shall we start?"),
+                _entry("SPEAKER_01", english="Yes."),
+                _entry("SPEAKER_00", "   "),
+            ]
+        },
+        "language_code": "hi-IN",
+        "duration": 12345.678,
+    },
+    "transcript_after_entries": {
+        "diarized_transcript": {"entries": [_entry("SPEAKER_00", "வணக்கம்")], "x": 1},
+        "transcript": "வணக்கம்",
+    },
+    "flat": {"transcript": "  a single speaker recording  "},
+    "empty_entries": {"transcript": "fallback", "diarized_transcript": {"entries": []}},
+    "blank_entries": {"transcript": "unused", "diarized_transcript": {"entries": [_entry("S", " ")]}},
+    "null_diarization": {"transcript": "plain", "diarized_transcript": None},
+    "null_entries": {"transcript": "plain", "diarized_transcript": {"entries": None}},
+    "empty": {},
+    "word_timestamps": {
+        "timestamps": {"words": ["a [b", 'say "}"', "back\\slash"], "start_time_seconds": [0, 1.5, 3]},
+        "diarized_transcript": {"entries": [_entry("SPEAKER_00", "a [b say } back\\slash")]},
+        "transcript": "a [b say } back\\slash",
+    },
+}
+
+
+def _chunks(payload, size, indent=None):
+    data = json.dumps(payload, ensure_ascii=False, indent=indent).encode("utf-8")
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("name", sorted(PAYLOADS))
+@pytest.mark.parametrize("size", [1, 5, 64, 1 << 20])
+def test_streamed_output_parses_like_the_loaded_dict(name, size):
+    """Size 1 splits every multi-byte character across chunks."""
+    payload = PAYLOADS[name]
+
+    streamed = _parse(SarvamOutput(_chunks(payload, size, indent=2)), "hi")
+
+    assert streamed == _parse(payload, "hi")
+    assert _parse(SarvamOutput(_chunks(payload, size), _PARSED_KEYS), "hi") == streamed
+
+
+def test_entries_are_read_as_they_are_iterated():
+    entries = [_entry(f"SPEAKER_{n:02d}", "x" * 100) for n in range(5000)]
+    payload = {"diarized_transcript": {"entries": entries}}
+    chunks = _chunks(payload, 256)
+    read = []
+
+    def feed():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+
+    entries = SarvamOutput(feed()).get("diarized_transcript").get("entries")
+    first = next(iter(entries))
+
+    assert first["speaker_id"] == "SPEAKER_00"
+    # About 1 MB in all; the first entry needs well under a tenth of it.
+    assert len(read) < len(chunks) // 10
+
+
+def test_fields_asked_for_out_of_order_are_still_right():
+    output = SarvamOutput(_chunks(PAYLOADS["diarized"], 7))
+
+    assert output.get("language_code") == "hi-IN"
+    entries = list(output.get("diarized_transcript").get("entries"))
+
+    assert entries == PAYLOADS["diarized"]["diarized_transcript"]["entries"]
+    assert output.get("request_id") == "r-1"
+    assert output.get("missing", "default") == "default"
+
+
+def test_unwanted_fields_are_passed_over():
+    output = SarvamOutput(_chunks(PAYLOADS["word_timestamps"], 3), ["transcript"])
+
+    assert output.get("transcript") == "a [b say } back\\slash"
+    assert output.get("timestamps") is None
+    assert output.get("diarized_transcript") is None
+
+
+def test_a_truncated_output_raises():
+    data = json.dumps(PAYLOADS["diarized"]).encode("utf-8")[:-40]
+
+    with pytest.raises(ValueError):
+        SarvamOutput([data]).get("nothing")
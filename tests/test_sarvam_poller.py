@@ -0,0 +1,99 @@
+"""One shared loop waiting on every Sarvam job.
+
+It replaced a thread per job sleeping in `wait_until_complete`, so it has to
+settle each job on its own and never stop watching the others.
+"""
+
+import time
+from concurrent.futures import CancelledError
+from types import SimpleNamespace
+
+import pytest
+
+from services.stt import sarvam_poller
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(sarvam_poller, "POLL_MIN_SECONDS", 0.01)
+    monkeypatch.setattr(sarvam_poller, "POLL_MAX_SECONDS", 0.2)
+
+
+class Job:
+    """Finishes in state [final] after [checks] status requests."""
+
+    def __init__(self, checks=1, final="Completed", error=None):
+        self.job_id = "job"
+        self.checks = checks
+        self.final = final
+        self.error = error
+        self.times = []
+
+    def get_status(self):
+        self.times.append(time.monotonic())
+        if self.error is not None:
+            raise self.error
+        done = len(self.times) >= self.checks
+        return SimpleNamespace(job_state=self.final if done else "Running")
+
+
+def test_many_jobs_share_one_poller():
+    poller = sarvam_poller.SarvamPoller()
+    jobs = [Job(checks=n % 3 + 1) for n in range(30)]
+
+    futures = [poller.watch(job) for job in jobs]
+
+    assert all(future.result(5).job_state == "Completed" for future in futures)
+    stats = poller.stats()
+    assert stats["completed"] == 30
+    assert stats["in_flight"] == 0
+
+
+def test_a_failed_job_is_reported_not_raised():
+    """Whether "failed" is an error is the provider's call, not the poller's."""
+    poller = sarvam_poller.SarvamPoller()
+
+    status = poller.watch(Job(final="Failed")).result(5)
+
+    assert status.job_state == "Failed"
+
+
+def test_checks_back_off():
+    poller = sarvam_poller.SarvamPoller()
+    job = Job(checks=5)
+
+    poller.watch(job).result(5)
+
+    gaps = [later - earlier for earlier, later in zip(job.times, job.times[1:])]
+    assert gaps[-1] > gaps[0]
+
+
+def test_a_job_that_never_finishes_times_out():
+    poller = sarvam_poller.SarvamPoller()
+
+    with pytest.raises(TimeoutError):
+        poller.watch(Job(checks=10**6), timeout=0.1).result(5)
+    assert poller.stats()["timed_out"] == 1
+
+
+def test_repeated_status_errors_give_up():
+    poller = sarvam_poller.SarvamPoller()
+
+    with pytest.raises(ConnectionError):
+        poller.watch(Job(error=ConnectionError("down"))).result(5)
+
+
+def test_a_cancelled_watch_stops_polling():
+    poller = sarvam_poller.SarvamPoller()
+    job = Job(checks=10**6)
+    future = poller.watch(job)
+    time.sleep(0.05)
+
+    future.cancel()
+    time.sleep(0.3)
+    checks = len(job.times)
+    time.sleep(0.3)
+
+    assert len(job.times) == checks
+    with pytest.raises(CancelledError):
+        future.result()
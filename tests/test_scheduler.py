@@ -0,0 +1,94 @@
+"""Ordering and fairness of queued transcriptions.
+
+Driven through `get`/`done` directly rather than through a pool, so the order
+the scheduler chooses is observable without racing worker threads.
+"""
+
+import pytest
+
+from services import scheduler as scheduler_module
+from services.scheduler import FairShareScheduler, ScheduledTask, size_class
+
+MB = 1024 * 1024
+
+
+def _task(name, cost, user_id=None):
+    return ScheduledTask(fn=lambda: None, args=(name,), kwargs={}, cost=cost, user_id=user_id)
+
+
+def _order(scheduler, count):
+    names = []
+    for _ in range(count):
+        task = scheduler.get()
+        names.append(task.args[0])
+        scheduler.done(task)
+    return names
+
+
+class TestShortestFirst:
+    def test_a_voice_note_overtakes_queued_lectures(self):
+        scheduler = FairShareScheduler(max_running_per_user=10)
+        scheduler.put(_task("lecture-1", 90 * MB))
+        scheduler.put(_task("lecture-2", 80 * MB))
+        scheduler.put(_task("note", 0.2 * MB))
+
+        assert _order(scheduler, 3) == ["note", "lecture-2", "lecture-1"]
+
+    def test_equal_costs_keep_arrival_order(self):
+        scheduler = FairShareScheduler(max_running_per_user=10)
+        for name in ("a", "b", "c"):
+            scheduler.put(_task(name, MB))
+
+        assert _order(scheduler, 3) == ["a", "b", "c"]
+
+    def test_a_long_wait_lets_a_lecture_overtake_fresh_notes(self, monkeypatch):
+        """Ageing is what stops SJF starving long recordings outright."""
+        scheduler = FairShareScheduler(max_running_per_user=10)
+        scheduler.put(_task("lecture", 50 * MB))
+        scheduler.put(_task("note", 0.1 * MB))
+        # Backdate the lecture well past the time it needs to age to zero.
+        scheduler._tasks[0].enqueued_at -= (
+            50 * MB / scheduler_module.AGING_BYTES_PER_SECOND + 1
+        )
+
+        assert _order(scheduler, 2) == ["lecture", "note"]
+
+
+class TestFairShare:
+    def test_a_user_at_the_cap_waits_while_others_run(self):
+        scheduler = FairShareScheduler(max_running_per_user=1)
+        scheduler.put(_task("heavy-1", MB, user_id="heavy"))
+        scheduler.put(_task("heavy-2", MB, user_id="heavy"))
+        scheduler.put(_task("light", 5 * MB, user_id="light"))
+
+        first = scheduler.get()
+        second = scheduler.get()
+
+        assert first.args[0] == "heavy-1"
+        # heavy-2 is cheaper, but heavy already has its one running slot.
+        assert second.args[0] == "light"
+        assert scheduler.running_for("heavy") == 1
+
+        scheduler.done(first)
+        assert scheduler.get().args[0] == "heavy-2"
+
+
+class TestStats:
+    @pytest.mark.parametrize(
+        "cost, expected",
+        [(0, "short"), (1 * MB, "short"), (5 * MB, "medium"), (200 * MB, "long")],
+    )
+    def test_size_classes(self, cost, expected):
+        assert size_class(cost) == expected
+
+    def test_queue_wait_is_reported_per_class(self):
+        scheduler = FairShareScheduler()
+        scheduler.put(_task("note", MB))
+        scheduler.put(_task("lecture", 100 * MB))
+        _order(scheduler, 2)
+
+        waits = scheduler.stats()["queue_wait"]
+
+        assert waits["short"]["count"] == 1
+        assert waits["long"]["count"] == 1
+        assert waits["medium"]["count"] == 0
@@ -0,0 +1,252 @@
+"""The asyncio pipeline: many recordings on one event loop, without a thread each.
+
+`transcribe` is now a wrapper around it, so the fallback, hedging and limits
+tests elsewhere cover the shared behaviour; these pin what only the async
+path does: await providers, cancel a race's loser, and time calls out.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import respx
+
+from services.stt import (
+    breaker,
+    limits,
+    openai_provider,
+    pipeline,
+    sarvam_poller,
+    sarvam_provider,
+    telemetry,
+)
+from services.stt.clients import PerLoop
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import TranscriptionError, TranscriptionResult, TranscriptSegment
+
+
+class AsyncProvider:
+    """Answers [text] after [seconds], or raises [raises]."""
+
+    def __init__(self, name, text="hello", seconds=0.0, raises=None):
+        self.name = name
+        self.text = text
+        self.seconds = seconds
+        self.raises = raises
+        self.calls = 0
+        self.cancelled = 0
+        self.threads = set()
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        raise AssertionError("the async pipeline should not call transcribe")
+
+    async def transcribe_async(self, audio_path, language=None):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.raises is not None:
+            raise self.raises
+        return TranscriptionResult([TranscriptSegment(self.text)], self.name, language)
+
+
+@pytest.fixture
+def install(monkeypatch):
+    monkeypatch.setitem(limits.MAX_CALLS, SARVAM, 0)
+    monkeypatch.setitem(limits.MAX_CALLS, OPENAI, 0)
+
+    def _install(sarvam, openai):
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+        monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+        return sarvam, openai
+
+    return _install
+
+
+class TestPipeline:
+    def test_falls_back_like_the_sync_pipeline(self, install):
+        sarvam, openai = install(
+            AsyncProvider(SARVAM, raises=TranscriptionError("down")), AsyncProvider(OPENAI)
+        )
+
+        result = asyncio.run(pipeline.transcribe_async("/tmp/a.m4a", locale="en_IN"))
+
+        assert result.provider == OPENAI
+        assert (sarvam.calls, openai.calls) == (1, 1)
+
+    def test_one_loop_carries_hundreds_of_recordings(self, install):
+        sarvam, _ = install(AsyncProvider(SARVAM, seconds=0.2), AsyncProvider(OPENAI))
+
+        async def many():
+            return await asyncio.gather(*(
+                pipeline.transcribe_async(f"/tmp/{n}.m4a", locale="en_IN") for n in range(300)
+            ))
+
+        started = time.monotonic()
+        results = asyncio.run(many())
+
+        assert len(results) == 300
+        assert all(result.provider == SARVAM for result in results)
+        # Concurrently, on the loop's thread alone.
+        assert time.monotonic() - started < 5
+        assert len(sarvam.threads) == 1
+
+    def test_a_hung_call_times_out_and_falls_back(self, install, monkeypatch):
+        monkeypatch.setattr(pipeline, "CALL_TIMEOUT_SECONDS", 0.1)
+        sarvam, _ = install(AsyncProvider(SARVAM, seconds=30), AsyncProvider(OPENAI))
+
+        result = asyncio.run(pipeline.transcribe_async("/tmp/a.m4a", locale="en_IN"))
+
+        assert result.provider == OPENAI
+        assert sarvam.cancelled == 1
+        assert breaker.stats()[SARVAM]["recent_failures"] == 1
+
+    def test_the_sync_wrapper_drives_async_providers(self, install):
+        install(AsyncProvider(SARVAM), AsyncProvider(OPENAI))
+
+        assert pipeline.transcribe("/tmp/a.m4a", locale="en_IN").provider == SARVAM
+
+
+class TestHedging:
+    @pytest.fixture(autouse=True)
+    def hedging(self, monkeypatch):
+        telemetry.reset()
+        monkeypatch.setattr(pipeline, "HEDGE_ENABLED", True)
+        monkeypatch.setattr(pipeline, "HEDGE_MIN_SECONDS", 0.05)
+        monkeypatch.setattr(telemetry, "MIN_SAMPLES", 3)
+        for _ in range(3):
+            telemetry.record(SARVAM, 0, 0.01, ok=True)
+        yield
+        telemetry.reset()
+
+    def test_the_loser_is_cancelled_and_not_held_against_it(self, install):
+        sarvam, openai = install(
+            AsyncProvider(SARVAM, seconds=30), AsyncProvider(OPENAI, text="from openai")
+        )
+
+        result = asyncio.run(pipeline.transcribe_async("/tmp/a.m4a", locale="en_IN"))
+
+        assert result.provider == OPENAI
+        assert result.stats == {"hedges_fired": 1, "hedges_won": 1}
+        assert sarvam.cancelled == 1
+        assert breaker.stats().get(SARVAM, {}).get("recent_failures", 0) == 0
+
+
+class TestClients:
+    def test_one_client_per_event_loop(self):
+        clients = PerLoop(object)
+
+        async def twice():
+            return clients.get(), clients.get()
+
+        first, again = asyncio.run(twice())
+        other, _ = asyncio.run(twice())
+
+        assert first is again
+        assert other is not first
+
+    def test_the_sync_wrapper_closes_its_loops_clients(self):
+        """Each `transcribe` gets a loop of its own; its clients' sockets must
+        not outlive it."""
+        closed = []
+
+        async def close(client):
+            closed.append(client)
+
+        clients = PerLoop(object, close=close)
+
+        async def use():
+            return clients.get()
+
+        made = pipeline._run(use())
+
+        assert closed == [made]
+
+
+class TestOpenAI:
+    def test_uploads_through_the_async_client(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "key")
+        sent = {}
+
+        async def create(**kwargs):
+            sent.update(kwargs)
+            return SimpleNamespace(text="", segments=[SimpleNamespace(speaker="A", text="hi")])
+
+        client = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(openai_provider, "_get_async_client", lambda: client)
+        path = tmp_path / "audio.m4a"
+        path.write_bytes(b"audio")
+
+        result = asyncio.run(openai_provider.OpenAIProvider().transcribe_async(str(path), "de"))
+
+        assert result.to_text() == "Speaker A: hi"
+        assert sent["file"] == ("audio.m4a", b"audio")
+        assert sent["language"] == "de"
+
+
+class TestSarvam:
+    OUTPUTS = "https://outputs.sarvam.test/"
+
+    def test_a_job_runs_on_the_async_client(self, tmp_path, monkeypatch):
+        """Created, uploaded and started by awaiting the SDK; waited on by the
+        shared poller; its output fetched from the download link."""
+        monkeypatch.setattr(sarvam_poller, "POLL_MIN_SECONDS", 0.01)
+        monkeypatch.setattr(sarvam_provider, "BATCH", False)
+        states = iter(["Running", "Completed"])
+        detail = SimpleNamespace(
+            inputs=[SimpleNamespace(file_name="audio.wav")],
+            outputs=[SimpleNamespace(file_name="0.json")],
+            state="Success",
+        )
+
+        class Job:
+            job_id = "job-1"
+
+            async def upload_files(self, paths):
+                self.uploaded = paths
+
+            async def start(self):
+                pass
+
+        job = Job()
+
+        async def create_job(**settings):
+            return job
+
+        async def get_download_links(job_id, files):
+            return SimpleNamespace(
+                download_urls={name: SimpleNamespace(file_url=self.OUTPUTS + name) for name in files}
+            )
+
+        async_client = SimpleNamespace(speech_to_text_job=SimpleNamespace(
+            create_job=create_job, get_download_links=get_download_links
+        ))
+        sync_client = SimpleNamespace(speech_to_text_job=SimpleNamespace(
+            get_status=lambda job_id: SimpleNamespace(job_state=next(states), job_details=[detail])
+        ))
+        monkeypatch.setattr(sarvam_provider, "_get_async_client", lambda: async_client)
+        monkeypatch.setattr(sarvam_provider, "_get_client", lambda: sync_client)
+        path = tmp_path / "audio.wav"
+        path.write_bytes(b"audio")
+
+        with respx.mock:
+            respx.get(self.OUTPUTS + "0.json").mock(return_value=httpx.Response(
+                200, content=json.dumps({"transcript": "namaste"}).encode()
+            ))
+            result = asyncio.run(
+                sarvam_provider.SarvamProvider().transcribe_async(str(path), "hi")
+            )
+
+        assert result.to_text() == "namaste"
+        assert result.language == "hi"
+        assert job.uploaded == [str(path)]
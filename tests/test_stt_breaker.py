@@ -0,0 +1,298 @@
+"""Per-provider circuit breakers shared through a state file.
+
+A vendor outage should cost each user one fast fallback, not the full failure
+latency of the broken vendor, and the breaker must let the vendor back in once
+it recovers.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+
+import pytest
+
+from services.stt import breaker, pipeline, telemetry
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import TranscriptionError, TranscriptionResult, TranscriptSegment
+
+
+class Flaky:
+    def __init__(self, name, fail=False, error=None):
+        self.name = name
+        self.fail = fail
+        self.error = error
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        if self.fail:
+            raise TranscriptionError(f"{self.name} is down")
+        return TranscriptionResult([TranscriptSegment("hello")], self.name)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for the breaker."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(breaker.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def tight(monkeypatch):
+    monkeypatch.setattr(breaker, "MIN_CALLS", 3)
+    monkeypatch.setattr(breaker, "ERROR_RATE", 0.5)
+    monkeypatch.setattr(breaker, "COOLDOWN_SECONDS", 60)
+
+
+def _fail(times, provider=SARVAM):
+    for _ in range(times):
+        breaker.record(provider, ok=False, seconds=1)
+
+
+class TestBreaker:
+    def test_opens_once_enough_recent_calls_fail(self, clock, tight):
+        breaker.record(SARVAM, ok=True, seconds=1)
+        _fail(1)
+        assert not breaker.is_open(SARVAM)
+
+        _fail(1)
+
+        assert breaker.is_open(SARVAM)
+        assert breaker.stats()[SARVAM]["state"] == breaker.OPEN
+
+    def test_old_failures_age_out_of_the_window(self, clock, tight):
+        _fail(2)
+        clock[0] += breaker.WINDOW_SECONDS + 1
+        breaker.record(SARVAM, ok=True, seconds=1)
+        _fail(1)
+
+        assert not breaker.is_open(SARVAM)
+
+    def test_a_very_slow_call_counts_as_a_failure(self, clock, tight):
+        for _ in range(3):
+            breaker.record(SARVAM, ok=True, seconds=breaker.SLOW_SECONDS + 1)
+
+        assert breaker.is_open(SARVAM)
+
+    def test_one_probe_after_the_cooldown_closes_it(self, clock, tight):
+        _fail(3)
+        clock[0] += 61
+        assert not breaker.is_open(SARVAM)  # half-open: a probe may go
+
+        assert breaker.try_acquire(SARVAM)
+        assert breaker.is_open(SARVAM)  # nobody else while it probes
+        assert not breaker.try_acquire(SARVAM)
+
+        breaker.record(SARVAM, ok=True, seconds=1)
+
+        assert not breaker.is_open(SARVAM)
+        assert breaker.stats()[SARVAM]["state"] == breaker.CLOSED
+        assert breaker.stats()[SARVAM]["closed"] == 1
+
+    def test_a_failed_probe_reopens_it(self, clock, tight):
+        _fail(3)
+        clock[0] += 61
+        assert breaker.try_acquire(SARVAM)
+
+        breaker.record(SARVAM, ok=False, seconds=1)
+
+        assert breaker.is_open(SARVAM)
+        clock[0] += 61
+        assert not breaker.is_open(SARVAM)
+
+    def test_callers_arriving_together_get_one_probe_between_them(self, clock, tight):
+        _fail(3)
+        clock[0] += 61
+        barrier = threading.Barrier(8)
+        claimed = []
+
+        def claim():
+            barrier.wait(5)
+            claimed.append(breaker.try_acquire(SARVAM))
+
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        assert sorted(claimed) == [False] * 7 + [True]
+
+    def test_a_probe_handed_back_goes_to_the_next_caller(self, clock, tight):
+        _fail(3)
+        clock[0] += 61
+        probe = breaker.claim(SARVAM)
+        assert probe
+
+        breaker.release_probe(SARVAM, probe)
+
+        clock[0] += 1
+        newer = breaker.claim(SARVAM)
+        assert newer
+        # A stale hand-back must not free someone else's probe.
+        breaker.release_probe(SARVAM, probe)
+        assert not breaker.try_acquire(SARVAM)
+
+    def test_a_closed_breaker_lets_everyone_through(self, tight):
+        assert all(breaker.try_acquire(SARVAM) for _ in range(3))
+
+    def test_calls_already_running_when_it_opened_do_not_close_it(self, clock, tight):
+        _fail(3)
+
+        breaker.record(SARVAM, ok=True, seconds=1)
+
+        assert breaker.is_open(SARVAM)
+
+    def test_state_is_shared_with_other_processes(self, tight):
+        _fail(3)
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(1) as pool:
+            seen = pool.apply(_is_open_elsewhere, (breaker.STATE_DIR, SARVAM))
+
+        assert seen is True
+
+
+def _is_open_elsewhere(state_dir, provider):
+    from services.stt import breaker as other
+
+    other.STATE_DIR = state_dir
+    return other.is_open(provider)
+
+
+class TestPipeline:
+    def _install(self, monkeypatch, sarvam, openai):
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+        monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+
+    def test_an_open_provider_is_skipped_straight_to_the_fallback(self, tight, monkeypatch):
+        sarvam, openai = Flaky(SARVAM, fail=True), Flaky(OPENAI)
+        self._install(monkeypatch, sarvam, openai)
+        for _ in range(3):
+            pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+        assert sarvam.calls == 3
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == OPENAI
+        assert sarvam.calls == 3
+
+    def test_a_half_open_provider_sees_one_probe_among_many_recordings(
+        self, clock, tight, monkeypatch
+    ):
+        sarvam, openai = Flaky(SARVAM), Flaky(OPENAI)
+        self._install(monkeypatch, sarvam, openai)
+        _fail(3)
+        clock[0] += 61
+
+        async def many():
+            return await asyncio.gather(*(
+                pipeline.transcribe_async("/tmp/a.m4a", locale="en_IN") for _ in range(10)
+            ))
+
+        results = asyncio.run(many())
+
+        assert sarvam.calls == 1
+        assert sorted(result.provider for result in results) == [OPENAI] * 9 + [SARVAM]
+
+    def test_with_every_circuit_open_the_chain_is_tried_anyway(self, tight, monkeypatch):
+        sarvam, openai = Flaky(SARVAM), Flaky(OPENAI)
+        self._install(monkeypatch, sarvam, openai)
+        _fail(3, SARVAM)
+        _fail(3, OPENAI)
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == SARVAM
+
+    def test_disabled_breakers_never_skip(self, tight, monkeypatch):
+        _fail(3)
+        monkeypatch.setattr(breaker, "ENABLED", False)
+        sarvam, openai = Flaky(SARVAM), Flaky(OPENAI)
+        self._install(monkeypatch, sarvam, openai)
+
+        assert pipeline.transcribe("/tmp/a.m4a", locale="en_IN").provider == SARVAM
+
+    def test_recordings_the_provider_refused_do_not_open_it(self, tight, monkeypatch):
+        """Five oversized uploads are no reason to turn OpenAI away for
+        everyone else on the host."""
+        telemetry.reset()
+        too_large = TranscriptionError("too long", provider_fault=False)
+        openai = Flaky(OPENAI, error=too_large)
+        self._install(monkeypatch, Flaky(SARVAM), openai)
+
+        for _ in range(5):
+            with pytest.raises(TranscriptionError):
+                pipeline.transcribe("/tmp/a.m4a", language="fr")
+
+        assert openai.calls == 5
+        assert not breaker.is_open(OPENAI)
+        assert breaker.stats()[OPENAI]["recent_calls"] == 0
+        assert OPENAI not in telemetry.stats()
+
+
+class TestRaces:
+    """Hedged races follow the same breaker rules as the plain chain."""
+
+    @pytest.fixture
+    def hedging(self, monkeypatch):
+        telemetry.reset()
+        monkeypatch.setattr(pipeline, "HEDGE_ENABLED", True)
+        monkeypatch.setattr(pipeline, "HEDGE_MIN_SECONDS", 0.05)
+        monkeypatch.setattr(telemetry, "MIN_SAMPLES", 3)
+        for _ in range(3):
+            telemetry.record(SARVAM, 0, 0.01, ok=True)
+        yield
+        telemetry.reset()
+
+    def _install(self, monkeypatch, sarvam, openai):
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+        monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+
+    def test_the_last_provider_goes_ahead_past_a_probe_held_elsewhere(
+        self, clock, tight, hedging, monkeypatch
+    ):
+        class FailsWhileOpenAIProbes(Flaky):
+            def transcribe(self, audio_path, language=None):
+                # Meanwhile OpenAI's circuit opened and another recording
+                # took its probe.
+                _fail(3, OPENAI)
+                clock[0] += 61
+                assert breaker.try_acquire(OPENAI)
+                return super().transcribe(audio_path, language)
+
+        self._install(monkeypatch, FailsWhileOpenAIProbes(SARVAM, fail=True), Flaky(OPENAI))
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == OPENAI
+
+    def test_a_cancelled_loser_hands_its_probe_back(
+        self, clock, tight, hedging, monkeypatch
+    ):
+        """Or the circuit would stay half-open, turning everyone away, until
+        the probe lapsed on its own."""
+        gate = threading.Event()
+
+        class Stuck(Flaky):
+            def transcribe(self, audio_path, language=None):
+                self.calls += 1
+                gate.wait(5)
+                return super().transcribe(audio_path, language)
+
+        self._install(monkeypatch, Stuck(SARVAM), Flaky(OPENAI))
+        _fail(3, SARVAM)
+        clock[0] += 61
+        try:
+            result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+        finally:
+            gate.set()
+
+        assert result.provider == OPENAI
+        assert breaker.try_acquire(SARVAM)
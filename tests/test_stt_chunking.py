@@ -0,0 +1,233 @@
+"""Silence-aware chunking of long recordings, on synthetic audio.
+
+A lecture must not be rejected for its size, no word may be cut in half, and
+the same person must keep the same speaker label from one piece to the next.
+"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from services.stt import audio, chunking, pipeline
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import (
+    TranscriptionError,
+    TranscriptionResult,
+    TranscriptSegment,
+)
+
+RATE = audio.SAMPLE_RATE
+
+
+def _speech(seconds, rate=RATE):
+    """A loud tone standing in for speech."""
+    t = np.arange(int(seconds * rate)) / rate
+    return (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def _silence(seconds, rate=RATE):
+    return np.zeros(int(seconds * rate), dtype=np.int16)
+
+
+def _write(path, samples, rate=RATE, channels=1):
+    with wave.open(str(path), "wb") as handle:
+        handle.setnchannels(channels)
+        handle.setsampwidth(2)
+        handle.setframerate(rate)
+        handle.writeframes(samples.astype("<i2").tobytes())
+    return str(path)
+
+
+class TestSilences:
+    def test_pauses_are_found_where_they_are(self):
+        samples = np.concatenate([_speech(2), _silence(1), _speech(2)])
+
+        silences = chunking.find_silences(samples)
+
+        assert len(silences) == 1
+        start, end = silences[0]
+        assert abs(start - 2 * RATE) < 0.05 * RATE
+        assert abs(end - 3 * RATE) < 0.05 * RATE
+
+    def test_a_breath_is_not_a_pause(self):
+        samples = np.concatenate([_speech(2), _silence(0.1), _speech(2)])
+
+        assert chunking.find_silences(samples) == []
+
+    def test_cuts_land_in_the_pause_nearest_each_mark(self):
+        silences = [(95 * RATE, 97 * RATE), (130 * RATE, 131 * RATE)]
+
+        cuts = chunking.plan_cuts(250 * RATE, silences, chunk_seconds=100, search_seconds=10)
+
+        # The pause at 96 s is within reach of the 100 s mark; there is no
+        # pause near 196 s, so that cut is made at the mark.
+        assert cuts == [96 * RATE, 196 * RATE]
+
+    def test_a_short_recording_is_not_cut(self):
+        assert chunking.plan_cuts(100 * RATE, [], chunk_seconds=100, search_seconds=10) == []
+
+
+class TestDecode:
+    def test_stereo_44k_wav_becomes_16k_mono(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(audio, "ffmpeg_path", lambda: None)
+        stereo = np.repeat(_speech(1, rate=44100), 2)
+        source = _write(tmp_path / "in.wav", stereo, rate=44100, channels=2)
+
+        samples = audio.decode(source, str(tmp_path / "out.pcm"))
+
+        assert abs(len(samples) - RATE) <= 2
+        assert np.abs(samples).max() > 7000
+
+    def test_without_ffmpeg_compressed_audio_is_not_decodable(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(audio, "ffmpeg_path", lambda: None)
+        path = tmp_path / "a.m4a"
+        path.write_bytes(b"\x00\x00\x00\x18ftypM4A " + bytes(100))
+
+        assert not audio.can_decode(str(path))
+        with pytest.raises(audio.DecodeError):
+            audio.decode(str(path), str(tmp_path / "out.pcm"))
+
+
+class TestStitch:
+    def test_speakers_keep_their_labels_across_pieces(self):
+        # The lecturer is "Speaker 1" in the first piece and "Speaker 2" in
+        # the second, as each request numbers speakers from scratch.
+        first = TranscriptionResult(
+            segments=[
+                TranscriptSegment("a long lecture passage", "Speaker 1"),
+                TranscriptSegment("question?", "Speaker 2"),
+            ],
+            provider=SARVAM,
+        )
+        second = TranscriptionResult(
+            segments=[
+                TranscriptSegment("ok", "Speaker 1"),
+                TranscriptSegment("the lecture goes on and on", "Speaker 2"),
+            ],
+            provider=SARVAM,
+        )
+
+        stitched = chunking.stitch([first, second], [SARVAM, OPENAI])
+
+        assert [s.speaker for s in stitched.segments] == [
+            "Speaker 1", "Speaker 2", "Speaker 2", "Speaker 1",
+        ]
+        assert stitched.provider == SARVAM
+
+    def test_a_new_voice_never_takes_a_label_in_use(self):
+        first = TranscriptionResult(
+            [TranscriptSegment("hello there", "Speaker A"), TranscriptSegment("hi", "Speaker B")],
+            OPENAI,
+        )
+        # Three voices now; the quietest is new and its own "Speaker A" is taken.
+        second = TranscriptionResult(
+            [
+                TranscriptSegment("a long answer", "Speaker B"),
+                TranscriptSegment("hi again", "Speaker C"),
+                TranscriptSegment("me", "Speaker A"),
+            ],
+            OPENAI,
+        )
+
+        stitched = chunking.stitch([first, second], [OPENAI])
+
+        assert [s.speaker for s in stitched.segments] == [
+            "Speaker A", "Speaker B", "Speaker A", "Speaker B", "Speaker 3",
+        ]
+
+    def test_mixed_providers_are_all_named(self):
+        results = [
+            TranscriptionResult([TranscriptSegment("one")], OPENAI),
+            TranscriptionResult([TranscriptSegment("two")], SARVAM),
+        ]
+
+        assert chunking.stitch(results, [SARVAM, OPENAI]).provider == "sarvam+openai"
+
+
+class PieceProvider:
+    """Transcribes a piece as its length in seconds, to one decimal place."""
+
+    def __init__(self, name, fail_on=()):
+        self.name = name
+        self.fail_on = fail_on
+        self.paths = []
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        self.paths.append(audio_path)
+        with wave.open(audio_path, "rb") as handle:
+            seconds = round(handle.getnframes() / handle.getframerate(), 1)
+        if any(abs(seconds - failing) < 0.15 for failing in self.fail_on):
+            raise TranscriptionError("down")
+        return TranscriptionResult(
+            segments=[TranscriptSegment(str(seconds), "Speaker 1")], provider=self.name
+        )
+
+
+@pytest.fixture
+def long_recording(tmp_path, monkeypatch):
+    """A 25 s recording with pauses at 9-10 s and 19-20 s, chunked at ~10 s."""
+    monkeypatch.setattr(audio, "ffmpeg_path", lambda: None)
+    monkeypatch.setattr(pipeline, "CHUNK_MIN_BYTES", 1)
+    monkeypatch.setattr(chunking, "CHUNK_SECONDS", 10)
+    monkeypatch.setattr(chunking, "SEARCH_SECONDS", 2)
+    samples = np.concatenate(
+        [_speech(9), _silence(1), _speech(9), _silence(1), _speech(5)]
+    )
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    return _write(job_dir / "audio.wav", samples)
+
+
+class TestChunkedTranscription:
+    def test_pieces_are_transcribed_and_stitched_in_order(self, long_recording, monkeypatch):
+        sarvam = PieceProvider(SARVAM)
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+
+        result = pipeline.transcribe(long_recording, locale="en_IN")
+
+        # Cut in the middle of each pause, at about 9.5 s and 19.5 s.
+        lengths = [float(segment.text) for segment in result.segments]
+        assert lengths == pytest.approx([9.5, 10.0, 5.5], abs=0.1)
+        assert {segment.speaker for segment in result.segments} == {"Speaker 1"}
+        assert len(sarvam.paths) == 3
+
+    def test_a_failed_piece_falls_back_on_its_own(self, long_recording, monkeypatch):
+        sarvam = PieceProvider(SARVAM, fail_on={5.5})
+        openai = PieceProvider(OPENAI)
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+        monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+
+        result = pipeline.transcribe(long_recording, locale="en_IN")
+
+        assert result.provider == "sarvam+openai"
+        assert len(openai.paths) == 1
+
+    def test_scratch_pieces_are_removed(self, long_recording, monkeypatch):
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: PieceProvider(SARVAM))
+
+        pipeline.transcribe(long_recording, locale="en_IN")
+
+        assert not (pipeline.os.path.exists(pipeline.os.path.join(
+            pipeline.os.path.dirname(long_recording), "analysis")))
+
+    def test_undecodable_audio_is_sent_whole(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(audio, "ffmpeg_path", lambda: None)
+        monkeypatch.setattr(pipeline, "CHUNK_MIN_BYTES", 1)
+        path = tmp_path / "a.m4a"
+        path.write_bytes(b"\x00\x00\x00\x18ftypM4A " + bytes(100))
+        calls = []
+
+        class Whole(PieceProvider):
+            def transcribe(self, audio_path, language=None):
+                calls.append(audio_path)
+                return TranscriptionResult([TranscriptSegment("all")], SARVAM)
+
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: Whole(SARVAM))
+
+        pipeline.transcribe(str(path), locale="en_IN")
+
+        assert calls == [str(path)]
@@ -0,0 +1,153 @@
+"""Hedged requests: a slow primary races the fallback instead of blocking it.
+
+Hedging spends a second vendor call to cut the latency tail, so it must fire
+only when the primary is genuinely late, only where a fallback is allowed, and
+it must be accounted for per job.
+"""
+
+import threading
+
+import pytest
+
+from services.stt import pipeline, telemetry
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import TranscriptionError, TranscriptionResult, TranscriptSegment
+
+
+class Gated:
+    """A provider that answers [text] once [gate] opens (at once without one)."""
+
+    def __init__(self, name, text="hello", gate=None, raises=None):
+        self.name = name
+        self.text = text
+        self.gate = gate
+        self.raises = raises
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.raises is not None:
+            raise self.raises
+        segments = [TranscriptSegment(self.text)] if self.text else []
+        return TranscriptionResult(segments, self.name)
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """Hedging on, with Sarvam known to finish in about 10 ms."""
+    telemetry.reset()
+    monkeypatch.setattr(pipeline, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(pipeline, "HEDGE_MIN_SECONDS", 0.05)
+    monkeypatch.setattr(telemetry, "MIN_SAMPLES", 3)
+    for _ in range(3):
+        telemetry.record(SARVAM, 0, 0.01, ok=True)
+    gate = threading.Event()
+    yield gate
+    gate.set()
+    telemetry.reset()
+
+
+def _install(monkeypatch, sarvam, openai):
+    monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+    monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+
+
+class TestHedging:
+    def test_a_late_primary_is_raced_and_the_fallback_wins(self, hedging, monkeypatch):
+        sarvam = Gated(SARVAM, gate=hedging)
+        openai = Gated(OPENAI, text="from openai")
+        _install(monkeypatch, sarvam, openai)
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == OPENAI
+        assert result.stats == {"hedges_fired": 1, "hedges_won": 1}
+        assert telemetry.stats()[OPENAI]["hedges_won"] == 1
+
+    def test_a_primary_that_finishes_first_still_wins(self, hedging, monkeypatch):
+        # The hedge fires, but the fallback is slower still.
+        sarvam_gate, openai_gate = threading.Event(), hedging
+        sarvam = Gated(SARVAM, gate=sarvam_gate)
+        openai = Gated(OPENAI, gate=openai_gate)
+        _install(monkeypatch, sarvam, openai)
+        threading.Timer(0.2, sarvam_gate.set).start()
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == SARVAM
+        assert result.stats == {"hedges_fired": 1, "hedges_won": 0}
+        assert openai.calls == 1
+
+    def test_an_empty_winner_waits_for_the_other(self, hedging, monkeypatch):
+        sarvam_gate = threading.Event()
+        sarvam = Gated(SARVAM, gate=sarvam_gate)
+        openai = Gated(OPENAI, text="")
+        _install(monkeypatch, sarvam, openai)
+        threading.Timer(0.2, sarvam_gate.set).start()
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == SARVAM
+
+    def test_a_prompt_primary_is_not_hedged(self, hedging, monkeypatch):
+        sarvam, openai = Gated(SARVAM), Gated(OPENAI)
+        _install(monkeypatch, sarvam, openai)
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == SARVAM
+        assert result.stats == {}
+        assert openai.calls == 0
+
+    def test_an_early_failure_falls_back_without_a_hedge(self, hedging, monkeypatch):
+        sarvam = Gated(SARVAM, raises=TranscriptionError("down"))
+        openai = Gated(OPENAI)
+        _install(monkeypatch, sarvam, openai)
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == OPENAI
+        assert result.stats == {}
+
+    def test_no_hedge_where_there_is_no_fallback(self, hedging, monkeypatch):
+        for _ in range(3):
+            telemetry.record(OPENAI, 0, 0.01, ok=True)
+        openai_gate = threading.Event()
+        sarvam, openai = Gated(SARVAM), Gated(OPENAI, gate=openai_gate)
+        _install(monkeypatch, sarvam, openai)
+        threading.Timer(0.2, openai_gate.set).start()
+
+        result = pipeline.transcribe("/tmp/a.m4a", language="auto", locale="de_DE")
+
+        assert result.provider == OPENAI
+        assert sarvam.calls == 0
+
+    def test_no_hedge_until_the_primary_latency_is_known(self, hedging, monkeypatch):
+        telemetry.reset()
+        sarvam_gate = threading.Event()
+        sarvam, openai = Gated(SARVAM, gate=sarvam_gate), Gated(OPENAI)
+        _install(monkeypatch, sarvam, openai)
+        threading.Timer(0.2, sarvam_gate.set).start()
+
+        assert pipeline.transcribe("/tmp/a.m4a", locale="en_IN").provider == SARVAM
+        assert openai.calls == 0
+
+
+class TestTelemetry:
+    def test_percentiles_are_kept_per_size_band(self):
+        telemetry.reset()
+        try:
+            for seconds in range(1, 21):
+                telemetry.record(SARVAM, 1024, float(seconds), ok=True)
+            telemetry.record(SARVAM, 1024, 999.0, ok=False)
+
+            assert telemetry.latency_percentile(SARVAM, 1024, 50) == pytest.approx(10.5)
+            assert telemetry.latency_percentile(SARVAM, 100 * 1024 * 1024, 50) is None
+            assert telemetry.error_rate(SARVAM, 1024) == pytest.approx(1 / 21)
+        finally:
+            telemetry.reset()
@@ -0,0 +1,107 @@
+"""Per-provider concurrency slots, and spilling over when they run out.
+
+A provider at its vendor quota should make jobs queue briefly and then use the
+fallback, rather than fire requests that fail and trigger fallbacks anyway.
+"""
+
+import threading
+
+import pytest
+
+from services.stt import limits, pipeline
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import TranscriptionResult, TranscriptSegment
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    monkeypatch.setitem(limits.MAX_CALLS, SARVAM, 1)
+    monkeypatch.setitem(limits.MAX_CALLS, OPENAI, 1)
+    monkeypatch.setattr(limits, "WAIT_SECONDS", 0.1)
+
+
+class Instant:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        self.calls += 1
+        return TranscriptionResult([TranscriptSegment("hello")], self.name)
+
+
+class TestSlots:
+    def test_a_full_provider_times_out(self, one_slot):
+        held = limits.acquire(SARVAM, timeout=None)
+
+        assert limits.acquire(SARVAM, timeout=0.1) is None
+        assert limits.stats()[SARVAM]["timeouts"] == 1
+        held.release()
+
+    def test_a_released_slot_goes_to_the_waiter(self, one_slot):
+        held = limits.acquire(SARVAM, timeout=None)
+        threading.Timer(0.2, held.release).start()
+
+        slot = limits.acquire(SARVAM, timeout=5)
+
+        assert slot is not None
+        assert slot.waited >= 0.15
+        slot.release()
+
+    def test_providers_have_separate_slots(self, one_slot):
+        with limits.acquire(SARVAM, timeout=None):
+            with limits.acquire(OPENAI, timeout=0) as other:
+                assert other is not None
+
+    def test_a_cancelled_wait_gives_up(self, one_slot):
+        held = limits.acquire(SARVAM, timeout=None)
+        cancelled = threading.Event()
+        threading.Timer(0.1, cancelled.set).start()
+
+        assert limits.acquire(SARVAM, timeout=None, cancelled=cancelled) is None
+        held.release()
+
+    def test_an_unlimited_provider_never_waits(self, monkeypatch):
+        monkeypatch.setitem(limits.MAX_CALLS, SARVAM, 0)
+
+        slots = [limits.acquire(SARVAM, timeout=0) for _ in range(50)]
+
+        assert all(slot is not None and slot.waited == 0 for slot in slots)
+
+
+class TestPipeline:
+    def _install(self, monkeypatch):
+        sarvam, openai = Instant(SARVAM), Instant(OPENAI)
+        monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+        monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+        return sarvam, openai
+
+    def test_a_saturated_primary_spills_to_the_fallback(self, one_slot, monkeypatch):
+        sarvam, openai = self._install(monkeypatch)
+
+        with limits.acquire(SARVAM, timeout=None):
+            result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.provider == OPENAI
+        assert sarvam.calls == 0
+        assert result.stats["provider_wait_seconds"] >= 0.1
+
+    def test_without_a_fallback_the_call_waits_its_turn(self, one_slot, monkeypatch):
+        _, openai = self._install(monkeypatch)
+        held = limits.acquire(OPENAI, timeout=None)
+        threading.Timer(0.3, held.release).start()
+
+        result = pipeline.transcribe("/tmp/a.m4a", language="auto", locale="de_DE")
+
+        assert result.provider == OPENAI
+        assert result.stats["provider_wait_seconds"] >= 0.2
+
+    def test_an_uncontended_call_records_no_wait(self, one_slot, monkeypatch):
+        self._install(monkeypatch)
+
+        result = pipeline.transcribe("/tmp/a.m4a", locale="en_IN")
+
+        assert result.stats == {}
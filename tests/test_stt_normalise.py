@@ -0,0 +1,115 @@
+"""Shrinking recordings to 16 kHz mono before upload.
+
+A 48 kHz stereo upload is six times the audio either vendor listens to; a file
+that is already compact must be sent untouched.
+"""
+
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from services.stt import audio, normalise, pipeline
+from services.stt.router import SARVAM
+from services.stt.types import TranscriptionResult, TranscriptSegment
+
+
+def _wav(path, seconds, rate, channels):
+    t = np.arange(int(seconds * rate)) / rate
+    tone = (8000 * np.sin(2 * np.pi * 220 * t)).astype("<i2")
+    with wave.open(str(path), "wb") as handle:
+        handle.setnchannels(channels)
+        handle.setsampwidth(2)
+        handle.setframerate(rate)
+        handle.writeframes(np.repeat(tone, channels).tobytes())
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(audio, "ffmpeg_path", lambda: None)
+    monkeypatch.setattr(normalise, "MIN_BYTES", 1)
+    monkeypatch.setattr(normalise, "WORKERS", 0)
+
+
+class TestNormalise:
+    def test_a_48k_stereo_wav_is_replaced_by_16k_mono(self, tmp_path):
+        source = _wav(tmp_path / "audio.wav", 2, 48000, 2)
+
+        result = normalise.normalise(source)
+
+        assert result.replaced
+        assert result.path != source
+        with wave.open(result.path, "rb") as handle:
+            assert (handle.getnchannels(), handle.getframerate()) == (1, 16000)
+        assert result.bytes_saved == os.path.getsize(source) - os.path.getsize(result.path)
+        assert result.bytes_saved > os.path.getsize(source) * 0.8
+
+        normalise.discard(result)
+        assert not os.path.exists(result.path)
+        assert os.path.exists(source)
+
+    def test_a_recording_already_in_speech_format_is_left_alone(self, tmp_path):
+        source = _wav(tmp_path / "audio.wav", 2, 16000, 1)
+
+        assert normalise.normalise(source) == normalise.Normalised(source)
+
+    def test_a_small_saving_keeps_the_original(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(normalise, "MIN_SAVING", 0.9)
+        source = _wav(tmp_path / "audio.wav", 2, 22050, 1)
+
+        result = normalise.normalise(source)
+
+        assert result.path == source
+        assert not os.listdir(tmp_path / "normalised")
+
+    def test_undecodable_audio_is_sent_as_is(self, tmp_path):
+        path = tmp_path / "audio.m4a"
+        path.write_bytes(b"\x00\x00\x00\x18ftypM4A " + bytes(100))
+
+        assert normalise.normalise(str(path)).path == str(path)
+
+    def test_encoding_runs_in_the_process_pool(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(normalise, "WORKERS", 1)
+        monkeypatch.setattr(normalise, "_pool", None)
+        source = _wav(tmp_path / "audio.wav", 1, 48000, 2)
+
+        try:
+            result = normalise.normalise(source)
+            assert result.replaced
+            assert normalise._pool is not None
+        finally:
+            if normalise._pool is not None:
+                normalise._pool.shutdown()
+
+
+class Recorder:
+    name = SARVAM
+
+    def __init__(self):
+        self.uploads = []
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        with wave.open(audio_path, "rb") as handle:
+            self.uploads.append((audio_path, handle.getframerate(), handle.getnchannels()))
+        return TranscriptionResult([TranscriptSegment("hello")], SARVAM)
+
+
+def test_the_provider_receives_the_normalised_file_and_the_job_its_stats(
+    tmp_path, monkeypatch
+):
+    recorder = Recorder()
+    monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: recorder)
+    source = _wav(tmp_path / "audio.wav", 2, 48000, 2)
+
+    result = pipeline.transcribe(source, locale="en_IN")
+
+    (uploaded, rate, channels), = recorder.uploads
+    assert (rate, channels) == (16000, 1)
+    assert not os.path.exists(uploaded)
+    assert result.stats["normalise_bytes_saved"] > 0
+    assert result.stats["normalise_seconds"] >= 0
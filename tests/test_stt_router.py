@@ -17,7 +17,14 @@ from services.stt.languages import (
     to_sarvam_code,
     to_sarvam_mode,
 )
-from services.stt.router import OPENAI, SARVAM, provider_chain, select_fallback, select_provider
+from services.stt.router import (
+    OPENAI,
+    SARVAM,
+    is_interchangeable,
+    provider_chain,
+    select_fallback,
+    select_provider,
+)
 
 
 class TestExplicitLanguage:
@@ -158,6 +165,31 @@ class TestProviderChain:
         assert provider_chain(language="ta") == [SARVAM, OPENAI]
 
 
+class TestInterchangeable:
+    """Where recent performance may overrule the rules; nowhere else."""
+
+    @pytest.mark.parametrize(
+        "language, locale",
+        [(None, None), ("auto", ""), ("en-IN", None), ("en_in", "de_DE"), ("EN-IN", "en_IN")],
+    )
+    def test_unlocalised_auto_detect_and_indian_english(self, language, locale):
+        assert is_interchangeable(language, locale)
+
+    @pytest.mark.parametrize(
+        "language, locale",
+        [
+            (None, "en_IN"),  # Hinglish speakers, whose accuracy depends on Sarvam
+            (None, "de_DE"),
+            ("hi", None),
+            ("en", None),
+            ("ur", "ur_IN"),
+            ("fr", "en_IN"),
+        ],
+    )
+    def test_everything_else_follows_the_rules(self, language, locale):
+        assert not is_interchangeable(language, locale)
+
+
 class TestLanguageNormalisation:
     @pytest.mark.parametrize("value", [None, "", "  ", "auto", "AUTO", " auto "])
     def test_absent_and_auto_collapse_to_none(self, value):
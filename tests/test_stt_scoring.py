@@ -0,0 +1,180 @@
+"""Telemetry-driven routing on top of the rules.
+
+Scoring may only move recordings either provider would serve, may only lead
+with OpenAI when the numbers clearly say so, and must never buy speed by
+retrying OpenAI on Sarvam.
+"""
+
+import asyncio
+import logging
+
+import pytest
+
+from services.stt import breaker, pipeline, scoring, telemetry
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import TranscriptionResult, TranscriptSegment
+
+
+@pytest.fixture(autouse=True)
+def scored(monkeypatch):
+    telemetry.reset()
+    monkeypatch.setattr(scoring, "ENABLED", True)
+    monkeypatch.setattr(telemetry, "MIN_SAMPLES", 5)
+    yield
+    telemetry.reset()
+
+
+def _observe(provider, seconds, failures=0, calls=10):
+    for n in range(calls):
+        telemetry.record(provider, 0, seconds, ok=n >= failures)
+
+
+class TestChoice:
+    def test_a_much_faster_openai_leads_alone(self):
+        _observe(SARVAM, 30)
+        _observe(OPENAI, 10)
+
+        assert scoring.provider_chain(size=0) == [OPENAI]
+
+    def test_a_slightly_faster_openai_does_not(self):
+        """Leading with OpenAI gives up the fallback, so speed alone must be
+        worth it."""
+        _observe(SARVAM, 12)
+        _observe(OPENAI, 10)
+
+        assert scoring.provider_chain(size=0) == [SARVAM, OPENAI]
+
+    def test_a_failing_sarvam_hands_over(self):
+        _observe(SARVAM, 5, failures=5)
+        _observe(OPENAI, 10)
+
+        assert scoring.provider_chain(language="en-IN") == [OPENAI]
+
+    def test_an_open_sarvam_circuit_hands_over(self, monkeypatch):
+        monkeypatch.setattr(breaker, "is_open", lambda provider: provider == SARVAM)
+        _observe(OPENAI, 10)
+
+        assert scoring.provider_chain() == [OPENAI]
+
+    def test_a_failing_openai_is_never_preferred(self):
+        _observe(SARVAM, 30, failures=5)
+        _observe(OPENAI, 1, failures=3)
+
+        assert scoring.provider_chain() == [SARVAM, OPENAI]
+
+    def test_without_enough_calls_the_rules_stand(self):
+        _observe(SARVAM, 30, calls=4)
+        _observe(OPENAI, 1)
+
+        assert scoring.provider_chain() == [SARVAM, OPENAI]
+
+    def test_stats_are_per_size_band(self):
+        _observe(SARVAM, 30)
+        _observe(OPENAI, 10)
+
+        assert scoring.provider_chain(size=20 * 1024 * 1024) == [SARVAM, OPENAI]
+
+
+class TestScope:
+    @pytest.fixture(autouse=True)
+    def openai_far_faster(self):
+        _observe(SARVAM, 60)
+        _observe(OPENAI, 1)
+
+    @pytest.mark.parametrize(
+        "language, locale, chain",
+        [
+            (None, "en_IN", [SARVAM, OPENAI]),
+            ("hi", None, [SARVAM, OPENAI]),
+            ("ta", "en_IN", [SARVAM, OPENAI]),
+            (None, "de_DE", [OPENAI]),
+            ("fr", None, [OPENAI]),
+        ],
+    )
+    def test_rules_stand_wherever_they_follow_a_real_difference(self, language, locale, chain):
+        assert scoring.provider_chain(language, locale) == chain
+
+    def test_off_by_default(self, monkeypatch):
+        monkeypatch.setattr(scoring, "ENABLED", False)
+
+        assert scoring.provider_chain() == [SARVAM, OPENAI]
+
+
+def test_decisions_are_logged_with_their_stats(caplog):
+    _observe(SARVAM, 30)
+    _observe(OPENAI, 10)
+
+    with caplog.at_level(logging.INFO, logger="STT.Scoring"):
+        scoring.provider_chain(size=0)
+
+    message = caplog.records[-1].getMessage()
+    assert "to openai: sarvam is over 1.5x slower" in message
+    assert "sarvam p95 30.0s, errors 0%" in message
+    assert "openai p95 10.0s, errors 0%" in message
+    assert telemetry.stats()[OPENAI]["scored_routes"] == 1
+
+
+class Answers:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        self.calls += 1
+        return TranscriptionResult([TranscriptSegment("hello")], self.name)
+
+
+def test_the_pipeline_follows_the_score(monkeypatch):
+    sarvam, openai = Answers(SARVAM), Answers(OPENAI)
+    monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+    monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+    _observe(SARVAM, 30)
+    _observe(OPENAI, 10)
+
+    result = asyncio.run(pipeline.transcribe_async("/tmp/missing.m4a"))
+
+    assert result.provider == OPENAI
+    assert (sarvam.calls, openai.calls) == (0, 1)
+
+
+def test_a_normalised_recording_is_scored_on_the_size_it_is_recorded_under(
+    tmp_path, monkeypatch
+):
+    """The band the scoring reads must be the one the calls feed, or a large
+    upload shrunk before sending would be judged by numbers it never adds to."""
+    original = tmp_path / "note.wav"
+    original.write_bytes(b"\0" * 30 * 1024 * 1024)
+    shrunk = tmp_path / "note.ogg"
+    shrunk.write_bytes(b"\0" * 1024)
+    monkeypatch.setattr(
+        pipeline.normalise,
+        "normalise",
+        lambda path: pipeline.normalise.Normalised(str(shrunk), bytes_saved=1),
+    )
+    monkeypatch.setattr(pipeline, "_should_analyse", lambda path: False)
+    sarvam, openai = Answers(SARVAM), Answers(OPENAI)
+    monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+    monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+    scored_sizes = []
+    real_chain = scoring.provider_chain
+
+    def chain(language=None, locale=None, size=0):
+        scored_sizes.append(size)
+        return real_chain(language, locale, size)
+
+    monkeypatch.setattr(scoring, "provider_chain", chain)
+    recorded_sizes = []
+    real_record = telemetry.record
+
+    def record(provider, size, seconds, ok):
+        recorded_sizes.append(size)
+        real_record(provider, size, seconds, ok)
+
+    monkeypatch.setattr(telemetry, "record", record)
+
+    asyncio.run(pipeline.transcribe_async(str(original)))
+
+    assert scored_sizes == recorded_sizes == [1024]
@@ -0,0 +1,110 @@
+"""The local silence check: recordings nobody speaks in never reach a vendor.
+
+Getting this wrong in the other direction loses a user's transcript, so a
+recording with even a little speech in it must still be sent.
+"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from services.stt import audio, pipeline, vad
+from services.stt.router import OPENAI, SARVAM
+from services.stt.types import TranscriptionResult, TranscriptSegment
+
+RATE = audio.SAMPLE_RATE
+
+
+def _wav(path, samples):
+    with wave.open(str(path), "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(RATE)
+        handle.writeframes(samples.astype("<i2").tobytes())
+    return str(path)
+
+
+def _noise(seconds, level):
+    rng = np.random.default_rng(0)
+    return rng.normal(0, level, int(seconds * RATE)).astype(np.int16)
+
+
+def _speech(seconds):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+class Counting:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def transcribe(self, audio_path, language=None):
+        self.calls += 1
+        return TranscriptionResult([TranscriptSegment("hello")], self.name)
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    monkeypatch.setattr(audio, "ffmpeg_path", lambda: None)
+    sarvam, openai = Counting(SARVAM), Counting(OPENAI)
+    monkeypatch.setitem(pipeline._PROVIDERS, SARVAM, lambda: sarvam)
+    monkeypatch.setitem(pipeline._PROVIDERS, OPENAI, lambda: openai)
+    return sarvam, openai
+
+
+class TestMeasure:
+    def test_digital_silence_has_no_speech(self):
+        activity = vad.measure(np.zeros(10 * RATE, dtype=np.int16))
+
+        assert activity.voiced_seconds == 0
+        assert not activity.has_speech
+
+    def test_a_few_seconds_of_speech_in_a_long_silence_is_speech(self):
+        samples = np.concatenate([_noise(60, 20), _speech(2), _noise(60, 20)])
+
+        activity = vad.measure(samples)
+
+        assert activity.has_speech
+        assert activity.ratio == pytest.approx(2 / 122, abs=0.005)
+
+
+class TestPipeline:
+    def test_a_silent_recording_never_reaches_either_vendor(self, tmp_path, providers):
+        sarvam, openai = providers
+        path = _wav(tmp_path / "audio.wav", _noise(30, 30))
+
+        result = pipeline.transcribe(path, locale="en_IN")
+
+        assert result.is_empty
+        assert result.provider == pipeline.NO_SPEECH
+        assert (sarvam.calls, openai.calls) == (0, 0)
+
+    def test_a_recording_with_speech_is_sent(self, tmp_path, providers):
+        sarvam, _ = providers
+        path = _wav(tmp_path / "audio.wav", np.concatenate([_noise(5, 30), _speech(1)]))
+
+        assert pipeline.transcribe(path, locale="en_IN").provider == SARVAM
+        assert sarvam.calls == 1
+
+    def test_the_check_can_be_turned_off(self, tmp_path, providers, monkeypatch):
+        monkeypatch.setattr(vad, "ENABLED", False)
+        sarvam, _ = providers
+        path = _wav(tmp_path / "audio.wav", np.zeros(RATE, dtype=np.int16))
+
+        pipeline.transcribe(path, locale="en_IN")
+
+        assert sarvam.calls == 1
+
+    def test_audio_that_cannot_be_decoded_is_sent(self, tmp_path, providers):
+        sarvam, _ = providers
+        path = tmp_path / "audio.m4a"
+        path.write_bytes(b"\x00\x00\x00\x18ftypM4A " + bytes(1000))
+
+        pipeline.transcribe(str(path), locale="en_IN")
+
+        assert sarvam.calls == 1
@@ -0,0 +1,44 @@
+"""Lifetime of the shared Supabase client across calls and across fork."""
+
+import os
+
+import pytest
+
+from services import supabase_http
+
+
+def test_calls_share_one_client():
+    assert supabase_http.get_client() is supabase_http.get_client()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_a_forked_child_gets_its_own_client():
+    """A gunicorn worker must never reuse its master's pooled sockets."""
+    parent_client = supabase_http.get_client()
+    read_end, write_end = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - runs in the child
+        try:
+            fresh = supabase_http.get_client() is not parent_client
+            os.write(write_end, b"1" if fresh else b"0")
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 1) == b"1"
+    os.close(read_end)
+    assert supabase_http.get_client() is parent_client
+
+
+def test_configured_limits_reach_the_client(monkeypatch):
+    monkeypatch.setattr(supabase_http, "MAX_CONNECTIONS", 7)
+    monkeypatch.setattr(supabase_http, "MAX_KEEPALIVE_CONNECTIONS", 3)
+
+    client = supabase_http.build_client()
+    pool = client._transport._pool
+
+    assert pool._max_connections == 7
+    assert pool._max_keepalive_connections == 3
+    client.close()
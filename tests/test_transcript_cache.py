@@ -0,0 +1,245 @@
+"""The content-addressed transcript cache, and how jobs use it.
+
+What matters: a repeat of the same audio with the same settings is never paid
+for twice, and anything that would change the transcript changes the key.
+"""
+
+import os
+
+import pytest
+
+from services import ai_service, transcript_cache
+from services.stt import TranscriptSegment, TranscriptionResult
+from services.transcript_cache import InFlight, TranscriptCache, cache_key
+
+AUDIO = "a" * 64
+
+
+def _result(text="namaste", provider="sarvam"):
+    return TranscriptionResult(
+        segments=[TranscriptSegment(text=text, speaker="Speaker 1")],
+        provider=provider,
+        language="hi",
+    )
+
+
+class TestCacheKey:
+    def test_the_same_request_gets_the_same_key(self):
+        assert cache_key(AUDIO, "hi", "en_IN") == cache_key(AUDIO, "HI", "en_IN")
+
+    @pytest.mark.parametrize(
+        "other",
+        [
+            ("b" * 64, "hi", "en_IN"),  # different audio
+            (AUDIO, "ta", "en_IN"),  # different language and Sarvam mode
+            (AUDIO, None, "en_US"),  # auto-detect routed to OpenAI instead
+        ],
+    )
+    def test_anything_that_changes_the_transcript_changes_the_key(self, other):
+        assert cache_key(*other) != cache_key(AUDIO, "hi", "en_IN")
+
+    def test_a_model_upgrade_changes_the_key(self, monkeypatch):
+        from services.stt.sarvam_provider import SarvamProvider
+
+        before = cache_key(AUDIO, "hi", "en_IN")
+        monkeypatch.setattr(SarvamProvider, "model", "saaras:v4")
+
+        assert cache_key(AUDIO, "hi", "en_IN") != before
+
+
+class TestTranscriptCache:
+    def test_a_stored_result_comes_back_whole(self, tmp_path):
+        cache = TranscriptCache(str(tmp_path), max_bytes=1_000_000)
+
+        cache.put("key", _result())
+
+        assert cache.get("key") == _result()
+        assert cache.get("other") is None
+
+    def test_the_least_recently_used_entries_are_evicted(self, tmp_path):
+        cache = TranscriptCache(str(tmp_path), max_bytes=1_800)
+        for index in range(4):
+            cache.put(f"key-{index}", _result("x" * 300))
+            # mtime resolution is coarse on some filesystems; space them out.
+            os.utime(tmp_path / f"key-{index}.json", (index, index))
+        cache.get("key-0")
+
+        cache.put("key-4", _result("x" * 300))
+
+        assert cache.get("key-0") is not None
+        assert cache.get("key-1") is None
+        assert cache.get("key-4") is not None
+        assert sum(p.stat().st_size for p in tmp_path.iterdir()) <= 1_800
+
+    def test_a_zero_budget_disables_it(self, tmp_path):
+        cache = TranscriptCache(str(tmp_path), max_bytes=0)
+
+        cache.put("key", _result())
+
+        assert cache.get("key") is None
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestInFlight:
+    def test_the_first_job_leads_and_repeats_attach_to_it(self):
+        in_flight = InFlight()
+
+        assert in_flight.join("key", "job-1") is False
+        assert in_flight.join("key", "job-2") is True
+        assert in_flight.join("key", "job-3") is True
+
+        assert in_flight.finish("key") == ["job-2", "job-3"]
+        assert in_flight.join("key", "job-4") is False
+
+
+class TestJobs:
+    """How `ai_service` settles jobs from the cache and from jobs in flight."""
+
+    @pytest.fixture
+    def jobs(self, tmp_path, monkeypatch):
+        updates = []
+        monkeypatch.setattr(
+            ai_service, "update_job", lambda job_id, **fields: updates.append((job_id, fields))
+        )
+        monkeypatch.setattr(
+            ai_service, "transcripts", TranscriptCache(str(tmp_path / "cache"), 1_000_000)
+        )
+        monkeypatch.setattr(ai_service, "in_flight", InFlight())
+        return updates
+
+    def _job_dir(self, tmp_path, job_id):
+        job_dir = tmp_path / job_id
+        job_dir.mkdir()
+        (job_dir / "note.m4a").write_bytes(b"audio")
+        return str(job_dir)
+
+    def test_a_repeat_is_completed_from_the_cache_without_a_worker(
+        self, tmp_path, jobs, monkeypatch
+    ):
+        key = cache_key(AUDIO, "hi", "en_IN")
+        ai_service.transcripts.put(key, _result())
+        job_dir = self._job_dir(tmp_path, "job-1")
+
+        class Ticket:
+            cancelled = False
+
+            def cancel(self):
+                self.cancelled = True
+
+            def submit(self, *args, **kwargs):
+                raise AssertionError("a cached transcript must not be re-transcribed")
+
+        ticket = Ticket()
+        ai_service._dispatch(
+            ticket, "job-1", os.path.join(job_dir, "note.m4a"), job_dir, "hi", "en_IN", AUDIO
+        )
+
+        assert ticket.cancelled
+        assert jobs[-1] == (
+            "job-1",
+            {"status": "complete", "transcript": "Speaker 1: namaste", "provider": "sarvam"},
+        )
+        assert not os.path.exists(job_dir)
+
+    def test_an_attached_job_gets_the_first_jobs_transcript(
+        self, tmp_path, jobs, monkeypatch
+    ):
+        monkeypatch.setattr(ai_service.stt, "transcribe", lambda *a, **k: _result())
+        key = cache_key(AUDIO, "hi", "en_IN")
+        ai_service.in_flight.join(key, "job-1")
+        ai_service.in_flight.join(key, "job-2")
+
+        first_dir = self._job_dir(tmp_path, "job-1")
+        ai_service._run_transcription_job(
+            "job-1", os.path.join(first_dir, "note.m4a"), first_dir, "hi", "en_IN", key
+        )
+
+        completed = [job_id for job_id, fields in jobs if fields["status"] == "complete"]
+        assert completed == ["job-1", "job-2"]
+        assert ai_service.transcripts.get(key) == _result()
+
+    def test_an_attached_job_keeps_its_audio_until_it_is_settled(
+        self, tmp_path, jobs, monkeypatch
+    ):
+        """If the first job's process dies, the repeat is recovered and
+        retried from its own copy rather than failed as lost."""
+        monkeypatch.setattr(ai_service, "JOB_SCRATCH_DIR", str(tmp_path))
+        monkeypatch.setattr(ai_service.stt, "transcribe", lambda *a, **k: _result())
+        key = cache_key(AUDIO, "hi", "en_IN")
+        ai_service.in_flight.join(key, "job-1")
+        first_dir = self._job_dir(tmp_path, "job-1")
+        repeat_dir = self._job_dir(tmp_path, "job-2")
+
+        class Ticket:
+            def cancel(self):
+                pass
+
+        ai_service._dispatch(
+            Ticket(), "job-2", os.path.join(repeat_dir, "note.m4a"), repeat_dir,
+            "hi", "en_IN", AUDIO,
+        )
+
+        assert ai_service._find_job_audio("job-2") == os.path.join(repeat_dir, "note.m4a")
+
+        ai_service._run_transcription_job(
+            "job-1", os.path.join(first_dir, "note.m4a"), first_dir, "hi", "en_IN", key
+        )
+
+        assert ("job-2", "complete") in [(job_id, f.get("status")) for job_id, f in jobs]
+        assert not os.path.exists(repeat_dir)
+
+    def test_a_fallback_transcript_is_not_pinned(self, tmp_path, jobs, monkeypatch):
+        monkeypatch.setattr(
+            ai_service.stt, "transcribe", lambda *a, **k: _result(provider="openai")
+        )
+        key = cache_key(AUDIO, "hi", "en_IN")
+        ai_service.in_flight.join(key, "job-1")
+        job_dir = self._job_dir(tmp_path, "job-1")
+
+        ai_service._run_transcription_job(
+            "job-1", os.path.join(job_dir, "note.m4a"), job_dir, "hi", "en_IN", key
+        )
+
+        assert ai_service.transcripts.get(key) is None
+
+    def test_attached_jobs_share_a_failure(self, tmp_path, jobs, monkeypatch):
+        def fail(*args, **kwargs):
+            raise ai_service.TranscriptionError("Transcription failed.")
+
+        monkeypatch.setattr(ai_service.stt, "transcribe", fail)
+        key = cache_key(AUDIO, "hi", "en_IN")
+        ai_service.in_flight.join(key, "job-1")
+        ai_service.in_flight.join(key, "job-2")
+        job_dir = self._job_dir(tmp_path, "job-1")
+
+        ai_service._run_transcription_job(
+            "job-1", os.path.join(job_dir, "note.m4a"), job_dir, "hi", "en_IN", key
+        )
+
+        failed = [job_id for job_id, fields in jobs if fields["status"] == "failed"]
+        assert failed == ["job-1", "job-2"]
+        assert ai_service.in_flight.join(key, "job-3") is False
+
+    def test_a_job_whose_row_was_never_created_is_not_transcribed(
+        self, tmp_path, jobs, monkeypatch
+    ):
+        """Nothing could read its transcript; jobs attached to it are failed so
+        their clients can retry."""
+        monkeypatch.setattr(ai_service, "job_inserted", lambda job_id: job_id != "job-1")
+        monkeypatch.setattr(
+            ai_service.stt, "transcribe", lambda *a, **k: pytest.fail("transcribed")
+        )
+        key = cache_key(AUDIO, "hi", "en_IN")
+        ai_service.in_flight.join(key, "job-1")
+        ai_service.in_flight.join(key, "job-2")
+        job_dir = self._job_dir(tmp_path, "job-1")
+
+        ai_service._run_transcription_job(
+            "job-1", os.path.join(job_dir, "note.m4a"), job_dir, "hi", "en_IN", key
+        )
+
+        assert ("job-2", "failed") in [(job_id, f["status"]) for job_id, f in jobs]
+
+
+def test_the_cache_reports_to_metrics():
+    assert "hit_rate" in transcript_cache.stats()
@@ -0,0 +1,234 @@
+"""Admission control and bookkeeping for the transcription executor.
+
+The pool exists so a burst of uploads queues up instead of launching a thread
+per job. These tests pin the refusal behaviour the routes rely on.
+"""
+
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from services.transcription_pool import (
+    LoopPool,
+    QueueFullError,
+    TranscriptionPool,
+    parked,
+)
+
+
+def _blocked_pool(workers, queue_size):
+    """A pool whose tasks all wait on the returned event."""
+    pool = TranscriptionPool(workers=workers, queue_size=queue_size)
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def task():
+        started.release()
+        release.wait(5)
+
+    return pool, task, release, started
+
+
+class TestAdmission:
+    def test_refuses_once_workers_and_queue_are_full(self):
+        pool, task, release, started = _blocked_pool(workers=1, queue_size=1)
+        try:
+            pool.admit().submit(task)
+            pool.admit().submit(task)
+
+            with pytest.raises(QueueFullError) as exc:
+                pool.admit()
+
+            assert exc.value.retry_after > 0
+            assert pool.stats()["rejected"] == 1
+        finally:
+            release.set()
+
+    def test_a_cancelled_ticket_frees_its_place(self):
+        """A request that fails after admission (bad upload, Supabase down)
+        must not leak capacity, or the pool would slowly refuse everything."""
+        pool = TranscriptionPool(workers=1, queue_size=0)
+
+        pool.admit().cancel()
+
+        pool.admit().cancel()
+
+    def test_finished_jobs_free_their_place(self):
+        pool = TranscriptionPool(workers=1, queue_size=0)
+        done = threading.Event()
+
+        pool.admit().submit(done.set)
+        assert done.wait(5)
+        pool.join(5)
+
+        pool.admit().cancel()
+        assert pool.stats()["completed"] == 1
+
+    def test_a_raising_task_does_not_kill_the_worker(self):
+        pool = TranscriptionPool(workers=1, queue_size=1)
+        done = threading.Event()
+
+        def explode():
+            raise RuntimeError("boom")
+
+        pool.admit().submit(explode)
+        pool.admit().submit(done.set)
+
+        assert done.wait(5)
+        pool.join(5)
+        assert pool.stats()["failed"] == 1
+
+
+class TestStats:
+    def test_reports_active_and_queued_work(self):
+        pool, task, release, started = _blocked_pool(workers=1, queue_size=2)
+        try:
+            for _ in range(3):
+                pool.admit().submit(task)
+            assert started.acquire(timeout=5)
+
+            stats = pool.stats()
+
+            assert stats["active"] == 1
+            assert stats["queued"] == 2
+            assert stats["workers"] == 1
+        finally:
+            release.set()
+
+
+class TestParking:
+    def test_a_parked_task_lends_its_slot_to_the_next_job(self):
+        """A job waiting on Sarvam must not hold the only worker while uploads
+        queue behind it."""
+        pool = TranscriptionPool(workers=1, queue_size=1)
+        release = threading.Event()
+        second_ran = threading.Event()
+
+        def waits_on_vendor():
+            with parked():
+                release.wait(5)
+
+        try:
+            pool.admit().submit(waits_on_vendor)
+            pool.admit().submit(second_ran.set)
+
+            assert second_ran.wait(5)
+            assert pool.stats()["parked"] == 1
+            assert pool.capacity == 3
+        finally:
+            release.set()
+        pool.join(5)
+
+    def test_stand_in_threads_retire_once_nothing_is_parked(self):
+        pool = TranscriptionPool(workers=1, queue_size=1)
+        release = threading.Event()
+
+        def waits_on_vendor():
+            with parked():
+                release.wait(5)
+
+        pool.admit().submit(waits_on_vendor)
+        pool.admit().submit(lambda: None)
+        release.set()
+        pool.join(5)
+        # The next task through lets the surplus thread notice and exit.
+        pool.admit().submit(lambda: None)
+        pool.admit().submit(lambda: None)
+        pool.join(5)
+
+        stats = pool.stats()
+        assert stats["parked"] == 0
+        assert stats["threads"] == 1
+
+    def test_helper_threads_park_their_task_once(self):
+        """Chunks and hedges wait on the task's behalf; however many of them
+        wait, the task only frees one slot."""
+        pool = TranscriptionPool(workers=1, queue_size=0)
+        release = threading.Event()
+        all_parked = threading.Barrier(5)
+
+        def fans_out():
+            def helper():
+                with parked():
+                    all_parked.wait(5)
+                    release.wait(5)
+
+            threads = [
+                threading.Thread(target=contextvars.copy_context().run, args=(helper,))
+                for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            all_parked.wait(5)
+            for thread in threads:
+                thread.join(5)
+
+        try:
+            pool.admit().submit(fans_out)
+            all_parked.wait(5)
+            assert pool.stats()["parked"] == 1
+            assert pool.stats()["threads"] == 2
+        finally:
+            release.set()
+        pool.join(5)
+
+    def test_parking_off_the_pool_does_nothing(self):
+        with parked():
+            pass
+
+
+class TestLoopPool:
+    def test_hundreds_of_jobs_wait_at_once_on_one_thread(self):
+        """The point of the asyncio worker: a job waiting on a vendor costs a
+        task, not a thread."""
+        pool = LoopPool(concurrency=300)
+        threads = set()
+        waiting = 0
+        peak = 0
+
+        async def job():
+            nonlocal waiting, peak
+            threads.add(threading.current_thread().name)
+            waiting += 1
+            peak = max(peak, waiting)
+            await asyncio.sleep(0.2)
+            waiting -= 1
+
+        for _ in range(300):
+            pool.admit().submit(job)
+
+        assert pool.join(5)
+        assert peak == 300
+        assert threads == {"transcription-loop"}
+        assert pool.stats()["completed"] == 300
+
+    def test_refuses_past_its_concurrency_until_a_job_finishes(self):
+        pool = LoopPool(concurrency=1)
+        release = threading.Event()
+
+        async def job():
+            await asyncio.to_thread(release.wait, 5)
+
+        pool.admit("user-1").submit(job)
+        assert pool.running_for("user-1") == 1
+        with pytest.raises(QueueFullError):
+            pool.admit()
+
+        release.set()
+        assert pool.join(5)
+        assert pool.running_for("user-1") == 0
+        pool.admit().cancel()
+
+    def test_a_raising_job_is_counted_and_frees_its_place(self):
+        pool = LoopPool(concurrency=1)
+
+        async def job():
+            raise RuntimeError("boom")
+
+        pool.admit().submit(job)
+
+        assert pool.join(5)
+        assert pool.stats()["failed"] == 1
+        pool.admit().cancel()